@@ -0,0 +1,765 @@
+"""Computer players for Connect More.
+
+The players search ahead by calling play() and undo() on the game they're
+given (so they never copy it), and always leave it exactly as they found it.
+Each takes a time limit in seconds and returns the best column it found in
+that time, so it can be used inside a web request without keeping the player
+waiting.
+
+There are players for 2 player games (AlphaBetaPlayer) and for 3 to 6 player
+games (ParanoidPlayer and BestReplyPlayer). choose_move() picks the right one
+for a game.
+"""
+import random
+import time
+
+import endgame
+import game_logic as gl
+import opening_book
+import search_api
+import transposition
+
+#transposition table entries say whether the stored value is exact, or only a
+#bound because the search was cut off by alpha-beta
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+INFINITY = float("inf")
+
+
+class _SearchTimeout(Exception):
+    """Raised from deep inside a search when the time limit is up."""
+    pass
+
+
+class _SearchPlayer:
+    """The parts common to all the players: iterative deepening, checking
+    the clock, move ordering and search stats.
+
+    Subclasses implement _search_root(game, depth), which returns the best
+    value and column searching depth moves ahead, and set self._root_best to
+    the best column so far as they go (so there's something to return if the
+    time runs out part way through).
+
+    The search uses:
+      iterative deepening: searches 1 move ahead, then 2, then 3... until the
+        time runs out, so there's always a best move ready
+      a transposition table: remembers the value and best move of positions
+        already searched (keyed by canonical_key(), so a position and its
+        mirror image share an entry) so they're not searched again when
+        reached by a different order of moves, and so each iteration tries
+        the previous iteration's best moves first
+      move ordering: best move from the transposition table first, then moves
+        that caused cut-offs before (the 'history heuristic'), then the
+        columns closest to the centre
+    """
+
+    #how many nodes to search between checks of the clock
+    CHECK_TIME_EVERY = 256
+
+    def __init__(self, table_mb=16):
+        #position key -> (depth, value, EXACT/LOWER_BOUND/UPPER_BOUND, move),
+        #in a fixed amount of memory (table_mb megabytes)
+        self.transpositions = transposition.TranspositionTable(table_mb)
+
+        #optional function that returns True when the search should stop
+        #early, e.g. because another process already found the answer
+        self.cancelled = None
+
+        #optional limit on the nodes searched (checked along with the clock,
+        #so the search can go up to CHECK_TIME_EVERY nodes over)
+        self.max_nodes = None
+
+        #iterative deepening normally starts at depth 1, but parallel
+        #searches start some of their workers deeper (see ai_smp.py)
+        self.depth_offset = 0
+
+        #solves the last few moves of the game exactly instead of searching
+        #(set to None to always search)
+        self.endgame = endgame.EndgameSolver()
+
+        #optional opening book (see opening_book.py), for moves that were
+        #worked out ahead of time
+        self.book = None
+
+        #stats from the last search
+        self.nodes = 0
+        self.depth = 0
+        self.value = 0
+        self.elapsed = 0.0
+        #seconds from the start of the search until each depth was finished
+        self.depth_times = []
+        #the line of play the search expects, starting with its best move
+        self.pv = []
+
+    @property
+    def nodes_per_second(self):
+        """How fast the last search went."""
+        if self.elapsed <= 0:
+            return 0
+        return self.nodes / self.elapsed
+
+    def _check_game(self, game):
+        """Raises a ValueError if this player can't play the game."""
+        pass
+
+    def choose_move(self, game, time_limit=1.0, max_depth=None):
+        """Returns the best column (1 to width) for the current player, found
+        by searching for up to time_limit seconds (or until max_depth moves
+        ahead have been searched, if that's sooner).
+        """
+        self._check_game(game)
+        if game.empty_squares <= 0:
+            raise gl.GameOverError()
+
+        start = time.perf_counter()
+        if self.book is not None:
+            entry = self.book.lookup(game)
+            if entry is not None:
+                col, self.value = entry
+                self.nodes = 0
+                self.depth = 0
+                self.depth_times = []
+                self.pv = [col]
+                self.elapsed = time.perf_counter() - start
+                return col
+
+        if self.endgame is not None and self.endgame.can_solve(game):
+            col, scores = self.endgame.solve(game)
+            self.nodes = self.endgame.nodes
+            self.depth = game.empty_squares
+            self.value = endgame.final_value(scores, game.current_player)
+            self.depth_times = [time.perf_counter() - start]
+            self.pv = [col]
+            self.elapsed = self.depth_times[0]
+            return col
+
+        self._deadline = start + time_limit
+        self._centre_order = _centre_order(game.width)
+        self._history = [[0] * (game.width + 1)
+                         for player in range(game.num_players + 1)]
+        self._root_player = game.current_player
+        self.nodes = 0
+        self.depth = 0
+        self.depth_times = []
+
+        last_depth = game.empty_squares
+        if max_depth is not None:
+            last_depth = min(last_depth, max_depth)
+
+        best_col = self._centre_order_moves(game)[0]
+        self.value = 0
+
+        #searching plays and undoes moves, which would leave the game with
+        #a different redo list than it started with, so put it back after
+        saved_redo = game._redo
+        try:
+            for depth in range(1 + self.depth_offset, last_depth + 1):
+                self._root_best = None
+                try:
+                    value, col = self._search_root(game, depth)
+                except _SearchTimeout:
+                    #part of the way through an iteration, the best move so
+                    #far is at least as good as the last iteration's since
+                    #that was searched first
+                    if self._root_best is not None:
+                        best_col = self._root_best
+                    break
+
+                best_col = col
+                self.value = value
+                self.depth = depth
+                self.depth_times.append(time.perf_counter() - start)
+            self.pv = self._principal_variation(game, best_col)
+        finally:
+            game._redo = saved_redo
+            self.elapsed = time.perf_counter() - start
+
+        return best_col
+
+    def search(self, request):
+        """Searches the request's position until its deadline, node limit
+        or depth limit, or until it's cancelled (see search_api.py). Returns
+        a SearchResult.
+        """
+        table = self.transpositions
+        hits = table.hits
+        probes = table.hits + table.misses
+        saved_cancelled = self.cancelled
+        self.max_nodes = request.max_nodes
+        self.cancelled = request.cancelled
+        try:
+            col = self.choose_move(request.game, request.time_left(),
+                                   request.max_depth)
+        finally:
+            self.max_nodes = None
+            self.cancelled = saved_cancelled
+        return search_api.SearchResult(
+            col, self.value, self.pv, self.depth, self.nodes, self.elapsed,
+            table.hits - hits, table.hits + table.misses - probes)
+
+    def _tick(self):
+        """Counts a node, and stops the search if the time is up."""
+        self.nodes += 1
+        if self.nodes % self.CHECK_TIME_EVERY == 0:
+            if time.perf_counter() > self._deadline:
+                raise _SearchTimeout()
+            if self.cancelled is not None and self.cancelled():
+                raise _SearchTimeout()
+            if self.max_nodes is not None and self.nodes >= self.max_nodes:
+                raise _SearchTimeout()
+
+    def _centre_order_moves(self, game):
+        return [col for col in self._centre_order
+                if game._heights[col-1] < game.height]
+
+    def _ordered_moves(self, game, first_col):
+        """Returns the legal columns in the order they should be searched."""
+        history = self._history[game.current_player]
+        moves = sorted(self._centre_order_moves(game),
+                       key=lambda col: -history[col])
+        if first_col is not None and first_col in moves:
+            moves.remove(first_col)
+            moves.insert(0, first_col)
+        return moves
+
+    def _lookup(self, game, key):
+        """Returns the transposition table entry stored under key for the
+        game's position (None if there isn't one), with the best move
+        flipped back if the entry is for the position's mirror image.
+        """
+        entry = self.transpositions.get(key)
+        if entry is not None and entry[3] is not None and game.is_mirrored():
+            depth, value, bound, move = entry
+            entry = (depth, value, bound, _mirror_move(game, move))
+        return entry
+
+    def _save(self, game, key, entry):
+        """Stores a transposition table entry for the game's position under
+        key, flipping the best move if the key is for its mirror image.
+        """
+        if entry[3] is not None and game.is_mirrored():
+            depth, value, bound, move = entry
+            entry = (depth, value, bound, _mirror_move(game, move))
+        self.transpositions[key] = entry
+
+    def _pv_key(self, game):
+        """Returns the transposition table key the search used for the
+        game's position, when it's reached in the principal variation.
+        """
+        return game.canonical_key()
+
+    def _principal_variation(self, game, col):
+        """Returns the line of play the search expects: col, then the best
+        moves stored in the transposition table, up to the depth searched.
+        """
+        pv = [col]
+        game.play(col)
+        try:
+            while len(pv) < self.depth and game.empty_squares > 0:
+                entry = self._lookup(game, self._pv_key(game))
+                move = entry[3] if entry else None
+                if isinstance(move, tuple):
+                    #a best reply (see BestReplyPlayer) only fits the line
+                    #if it's by the player whose turn it really is
+                    move = move[1] if move[0] == game.current_player else None
+                if move is None or game._heights[move-1] >= game.height:
+                    break
+                game.play(move)
+                pv.append(move)
+        finally:
+            for each_move in pv:
+                game.undo()
+        return pv
+
+    def _evaluate(self, game):
+        """Returns how good the position is for the player the search is for:
+        their score minus the best of the other players' scores.
+        """
+        scores = game.scores
+        root_score = scores[self._root_player-1]
+        best_other = max([score for player, score in enumerate(scores)
+                          if player != self._root_player-1])
+        return root_score - best_other
+
+
+class AlphaBetaPlayer(_SearchPlayer):
+    """Negamax alpha-beta search for 2 player games.
+
+    Positions are evaluated by the difference between the current player's
+    score and the other player's score.
+    """
+
+    def _check_game(self, game):
+        if game.num_players != 2:
+            raise ValueError("AlphaBetaPlayer only plays 2 player games")
+
+    def _search_root(self, game, depth):
+        """Searches every move from the current position to the given depth.
+        Returns the best value and column.
+        """
+        key = game.canonical_key()
+        entry = self._lookup(game, key)
+        first_col = entry[3] if entry else None
+
+        alpha = -INFINITY
+        best_col = None
+        for col in self._ordered_moves(game, first_col):
+            game.play(col)
+            try:
+                value = -self._negamax(game, depth - 1, -INFINITY, -alpha)
+            finally:
+                game.undo()
+
+            if best_col is None or value > alpha:
+                alpha = value
+                best_col = col
+                self._root_best = col
+
+        self._save(game, key, (depth, alpha, EXACT, best_col))
+        return alpha, best_col
+
+    def _negamax(self, game, depth, alpha, beta):
+        """Returns the value of the position for the current player, searching
+        depth moves ahead.
+
+        Values between alpha and beta are exact, anything outside is only a
+        bound (since it won't change the move chosen further up the tree).
+        """
+        self._tick()
+
+        player = game.current_player
+        value = game.scores[player-1] - game.scores[2-player]
+        if depth == 0 or game.empty_squares == 0:
+            return value
+
+        #neither player can score more than max_gain() in the next depth
+        #moves, so if that can't bring the value inside the window, the
+        #position doesn't need searching
+        upper = value + game.max_gain(player, depth)
+        if upper <= alpha:
+            return upper
+        lower = value - game.max_gain(3 - player, depth)
+        if lower >= beta:
+            return lower
+
+        key = game.canonical_key()
+        entry = self._lookup(game, key)
+        first_col = None
+        if entry is not None:
+            entry_depth, value, bound, first_col = entry
+            if entry_depth >= depth:
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        original_alpha = alpha
+        best_value = -INFINITY
+        best_col = None
+        for col in self._ordered_moves(game, first_col):
+            game.play(col)
+            try:
+                value = -self._negamax(game, depth - 1, -beta, -alpha)
+            finally:
+                game.undo()
+
+            if value > best_value:
+                best_value = value
+                best_col = col
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                #remember moves that cause cut-offs so they get tried first
+                #in other positions too
+                self._history[player][col] += depth * depth
+                break
+
+        if best_value <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._save(game, key, (depth, best_value, bound, best_col))
+        return best_value
+
+
+class _MultiPlayerSearch(_SearchPlayer):
+    """Base for the 3 to 6 player searches, which both turn the game into a
+    2 sided one: the player the search is for (the 'root' player) against
+    all the others, with positions valued by _evaluate().
+
+    Values are always from the root player's point of view, so unlike the
+    2 player search, transposition table keys are mixed with a key for the
+    root player to keep each player's values apart.
+    """
+
+    #a random 64 bit key for each player, to mix into the position keys
+    _ROOT_KEYS = [random.Random("root " + str(player)).getrandbits(64)
+                  for player in range(7)]
+
+    def _check_game(self, game):
+        if game.num_players < 3:
+            raise ValueError(type(self).__name__ +
+                             " only plays 3 to 6 player games")
+
+    def _search_root(self, game, depth):
+        """Searches every move from the current position to the given depth.
+        Returns the best value and column.
+        """
+        key = self._key(game, True)
+        entry = self._lookup(game, key)
+        first_col = entry[3] if entry else None
+
+        alpha = -INFINITY
+        best_col = None
+        for col in self._ordered_moves(game, first_col):
+            game.play(col)
+            try:
+                value = self._search(game, depth - 1, alpha, INFINITY, False)
+            finally:
+                game.undo()
+
+            if best_col is None or value > alpha:
+                alpha = value
+                best_col = col
+                self._root_best = col
+
+        self._save(game, key, (depth, alpha, EXACT, best_col))
+        return alpha, best_col
+
+    def _key(self, game, maximizing):
+        return game.canonical_key() ^ self._ROOT_KEYS[self._root_player]
+
+    def _pv_key(self, game):
+        return self._key(game, game.current_player == self._root_player)
+
+    def _tokens_left(self, game, player, depth, maximizing):
+        """Returns how many tokens the player can play in the next depth
+        moves of the search.
+        """
+        return game.tokens_left(player, depth)
+
+    def _bounds_cut_off(self, game, depth, alpha, beta, maximizing):
+        """Returns a bound on the value of the position that settles it
+        without searching (at most alpha, or at least beta), or None.
+
+        No player can score more than max_gain() points per token, so the
+        root player's value can't go up by more than that for each of their
+        own tokens, or down by more than the best other player's gain.
+        """
+        root_player = self._root_player
+        scores = game.scores
+        token_gain = game._max_token_gain
+        root_score = scores[root_player-1]
+
+        best_other = -INFINITY
+        best_other_gain = -INFINITY
+        for player in range(1, game.num_players + 1):
+            if player != root_player:
+                score = scores[player-1]
+                if score > best_other:
+                    best_other = score
+                score += token_gain * self._tokens_left(game, player, depth,
+                                                        maximizing)
+                if score > best_other_gain:
+                    best_other_gain = score
+
+        upper = root_score - best_other + token_gain * self._tokens_left(
+            game, root_player, depth, maximizing)
+        if upper <= alpha:
+            return upper
+        lower = root_score - best_other_gain
+        if lower >= beta:
+            return lower
+        return None
+
+    def _probe(self, game, key, depth, alpha, beta):
+        """Looks up a position in the transposition table.
+
+        Returns (value, alpha, beta, best move) where value is None unless the
+        stored result settles the position, and alpha/beta are narrowed by any
+        stored bound.
+        """
+        entry = self._lookup(game, key)
+        if entry is None:
+            return None, alpha, beta, None
+
+        entry_depth, value, bound, best_move = entry
+        if entry_depth >= depth:
+            if bound == EXACT:
+                return value, alpha, beta, best_move
+            elif bound == LOWER_BOUND:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value, alpha, beta, best_move
+        return None, alpha, beta, best_move
+
+    def _store(self, game, key, depth, value, alpha, beta, best_move):
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._save(game, key, (depth, value, bound, best_move))
+
+
+class ParanoidPlayer(_MultiPlayerSearch):
+    """Paranoid alpha-beta search for 3 to 6 player games.
+
+    Assumes all the other players are working together against the root
+    player, so it's a normal 2 sided minimax search where the root player
+    maximizes their value and everyone else minimizes it. That's pessimistic,
+    but it means alpha-beta can prune as well as it does in 2 player games.
+    """
+
+    def _search(self, game, depth, alpha, beta, maximizing):
+        """Returns the value of the position for the root player, searching
+        depth moves ahead. maximizing is ignored since the turn order
+        already says whose move it is.
+        """
+        self._tick()
+
+        if depth == 0 or game.empty_squares == 0:
+            return self._evaluate(game)
+
+        value = self._bounds_cut_off(game, depth, alpha, beta, None)
+        if value is not None:
+            return value
+
+        key = self._key(game, True)
+        value, alpha, beta, first_col = self._probe(game, key, depth, alpha,
+                                                    beta)
+        if value is not None:
+            return value
+
+        player = game.current_player
+        maximizing = player == self._root_player
+        original_alpha = alpha
+        original_beta = beta
+        best_value = -INFINITY if maximizing else INFINITY
+        best_col = None
+
+        for col in self._ordered_moves(game, first_col):
+            game.play(col)
+            try:
+                value = self._search(game, depth - 1, alpha, beta, None)
+            finally:
+                game.undo()
+
+            if maximizing:
+                if value > best_value:
+                    best_value = value
+                    best_col = col
+                alpha = max(alpha, value)
+            else:
+                if value < best_value:
+                    best_value = value
+                    best_col = col
+                beta = min(beta, value)
+
+            if alpha >= beta:
+                self._history[player][col] += depth * depth
+                break
+
+        self._store(game, key, depth, best_value, original_alpha,
+                    original_beta, best_col)
+        return best_value
+
+
+class BestReplyPlayer(_MultiPlayerSearch):
+    """Best-Reply Search (BRS) for 3 to 6 player games.
+
+    Like the paranoid search, all the other players are against the root
+    player, but instead of each of them taking a turn between the root
+    player's turns, only ONE of them moves: whichever has the best reply.
+    So the search alternates between a layer with the root player's moves,
+    and a layer with every other player's moves. That skips a lot of
+    unlikely positions, and the root player gets to see much further ahead
+    in the same time (e.g. 4 of their own moves in 8 plies, rather than 2
+    in a 4 player paranoid search).
+
+    NOTE: this means positions are searched where players move out of turn,
+    which the game only allows through ConnectMore._set_turn().
+    """
+
+    #marks transposition table keys for the 'other players' layer, since the
+    #same position can come up in both layers
+    OTHERS_LAYER_KEY = 0x5bd1e9955bd1e995
+
+    def _key(self, game, maximizing):
+        key = _MultiPlayerSearch._key(self, game, maximizing)
+        if not maximizing:
+            key ^= self.OTHERS_LAYER_KEY
+        return key
+
+    def _pv_key(self, game):
+        #positions are stored with the root player to move (see _search),
+        #so the line only carries on while the real turns match the layers
+        turn = game.current_player
+        game._set_turn(self._root_player)
+        key = self._key(game, turn == self._root_player)
+        game._set_turn(turn)
+        return key
+
+    def _tokens_left(self, game, player, depth, maximizing):
+        #layers alternate between the root player and the others, but any
+        #one of the others might make all of the others' moves
+        own_layers = (depth + 1) // 2
+        other_layers = depth // 2
+        if (player == self._root_player) != maximizing:
+            own_layers, other_layers = other_layers, own_layers
+        return min(own_layers, game.empty_squares)
+
+    def _search(self, game, depth, alpha, beta, maximizing):
+        """Returns the value of the position for the root player, searching
+        depth moves ahead, where maximizing says whether it's the root
+        player's layer (True) or the other players' layer (False).
+        """
+        self._tick()
+
+        if depth == 0 or game.empty_squares == 0:
+            return self._evaluate(game)
+
+        value = self._bounds_cut_off(game, depth, alpha, beta, maximizing)
+        if value is not None:
+            return value
+
+        #each layer starts from the root player's turn so positions have the
+        #same key however out of turn the moves that led to them were
+        turn = game.current_player
+        game._set_turn(self._root_player)
+        try:
+            key = self._key(game, maximizing)
+            value, alpha, beta, first_move = self._probe(game, key, depth,
+                                                         alpha, beta)
+            if value is not None:
+                return value
+
+            if maximizing:
+                moves = [(self._root_player, col)
+                         for col in self._ordered_moves(game, first_move)]
+            else:
+                moves = self._reply_moves(game, first_move)
+
+            original_alpha = alpha
+            original_beta = beta
+            best_value = -INFINITY if maximizing else INFINITY
+            best_move = None
+
+            for move in moves:
+                player, col = move
+                game._set_turn(player)
+                game.play(col)
+                try:
+                    value = self._search(game, depth - 1, alpha, beta,
+                                         not maximizing)
+                finally:
+                    game.undo()
+
+                if maximizing:
+                    if value > best_value:
+                        best_value = value
+                        best_move = col
+                    alpha = max(alpha, value)
+                else:
+                    if value < best_value:
+                        best_value = value
+                        best_move = move
+                    beta = min(beta, value)
+
+                if alpha >= beta:
+                    self._history[player][col] += depth * depth
+                    break
+
+            self._store(game, key, depth, best_value, original_alpha,
+                        original_beta, best_move)
+            return best_value
+        finally:
+            game._set_turn(turn)
+
+    def _reply_moves(self, game, first_move):
+        """Returns every (player, column) move the other players could make,
+        in the order they should be searched.
+        """
+        moves = []
+        for player in range(1, game.num_players + 1):
+            if player != self._root_player:
+                for col in self._centre_order_moves(game):
+                    moves.append((player, col))
+
+        history = self._history
+        moves.sort(key=lambda move: -history[move[0]][move[1]])
+        if first_move is not None and first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+        return moves
+
+
+def _mirror_move(game, move):
+    """Flips a best move (a column, or a (player, column) tuple) left to
+    right, to go with a position's mirror image.
+    """
+    if isinstance(move, tuple):
+        return move[0], game.mirror_col(move[1])
+    return game.mirror_col(move)
+
+
+#centre-first column orders only depend on the width: width -> columns
+_centre_orders = {}
+
+
+def _centre_order(width):
+    """Returns the columns (1 to width) sorted from the centre outwards."""
+    if width not in _centre_orders:
+        centre = (width + 1) / 2
+        _centre_orders[width] = sorted(range(1, width + 1),
+                                       key=lambda col: abs(col - centre))
+    return _centre_orders[width]
+
+
+#shared by every choose_move() call, so endgames solved for one move are
+#still there for the next
+_endgame_solver = endgame.EndgameSolver()
+
+#the players search() uses, one per variant (position keys only make sense
+#within a variant), kept so their transposition tables are only allocated
+#once and stay warm from one move to the next
+_players = {}
+
+
+def _player_for(game):
+    """Returns the shared player search() uses for the game's variant."""
+    player = _players.get(game.variant)
+    if player is None:
+        if game.num_players == 2:
+            player = AlphaBetaPlayer()
+        else:
+            player = BestReplyPlayer()
+        player.endgame = _endgame_solver
+        player.book = opening_book.default_book(game.num_players)
+        _players[game.variant] = player
+    return player
+
+
+def search(request):
+    """Searches the request's position (see search_api.py) with the best
+    player available for the number of players. Returns a SearchResult.
+    """
+    return _player_for(request.game).search(request)
+
+
+def choose_move(game, time_limit=1.0):
+    """Returns a column for the computer to play in the given game, using
+    the best player available for the number of players.
+    """
+    return search(search_api.SearchRequest(game, time_limit)).col
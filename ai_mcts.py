@@ -0,0 +1,527 @@
+"""Monte Carlo Tree Search (MCTS) computer player for any number of players.
+
+Instead of evaluating positions like the players in ai.py, MCTS plays lots of
+random games ('playouts') from the current position and builds up a tree of
+the moves that did best, spending more playouts on the more promising moves.
+
+The playouts can be spread over several processes ('root parallelization'):
+each process builds its own tree from the current position, and the counts
+for the first moves of all the trees are added up at the end.
+
+MCTSSession keeps its tree from move to move instead, and keeps searching
+while the other players take their turns.
+"""
+import concurrent.futures
+import math
+import os
+import random
+import threading
+import time
+
+import endgame
+import game_logic as gl
+import search_api
+
+
+def rewards(scores):
+    """Returns the reward for each player at the end of a playout, from the
+    final scores. Half the reward is for winning (split evenly between tied
+    leaders) and half is the player's score as a fraction of the top score,
+    so a playout still says something about a move when it doesn't change
+    who wins. Rewards are always between 0 and 1.
+    """
+    top_score = max(scores)
+    leaders = [player for player, score in enumerate(scores)
+               if score == top_score]
+    share = 0.5 / len(leaders)
+    result = []
+    for player, score in enumerate(scores):
+        reward = share if player in leaders else 0.0
+        if top_score > 0:
+            reward += 0.5 * max(score, 0) / top_score
+        else:
+            reward += 0.5
+        result.append(reward)
+    return result
+
+
+class _Node:
+    """A position in the search tree, reached by the mover playing col."""
+
+    #there can be a lot of these, so leave out the per-object __dict__
+    __slots__ = ("parent", "col", "mover", "children", "untried", "visits",
+                 "rewards")
+
+    def __init__(self, parent, col, mover, moves, num_players):
+        self.parent = parent
+        self.col = col
+        self.mover = mover
+        self.children = []
+        #legal moves from here that don't have a child yet
+        self.untried = moves
+        self.visits = 0
+        #total reward for each player from playouts through this node
+        self.rewards = [0.0] * num_players
+
+    def best_child(self, exploration):
+        """Returns the child with the best UCT (Upper Confidence bounds for
+        Trees) value: the average reward for the player who made the move,
+        plus a bonus for moves that haven't been tried much yet.
+        """
+        log_visits = math.log(self.visits)
+        best = None
+        best_value = -1.0
+        for child in self.children:
+            value = (child.rewards[child.mover-1] / child.visits +
+                     exploration * math.sqrt(log_visits / child.visits))
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def most_visited(self):
+        """Returns the child that's been visited the most (None if there are
+        no children yet).
+        """
+        best = None
+        for child in self.children:
+            if best is None or child.visits > best.visits:
+                best = child
+        return best
+
+
+def _playout(root, game, rng, exploration, expand=True):
+    """Runs one iteration of MCTS from root, which must be the game's current
+    position: selects a path down the tree, adds a new node at the end of it
+    (unless expand is False), plays random moves to the end of the game and
+    adds the result to every node on the path.
+
+    Moves are made with play()/undo() on the game itself, which is left as it
+    was found (apart from its redo list, which the caller has to restore).
+
+    Returns (how deep in the tree the playout started, whether it added a
+    node) - it doesn't add one when the path ends at a finished game.
+    """
+    node = root
+    depth = 0
+    expanded = False
+
+    #selection: follow the best children down the tree
+    while not node.untried and node.children:
+        node = node.best_child(exploration)
+        game.play(node.col)
+        depth += 1
+
+    #expansion: add one new child
+    if expand and node.untried:
+        col = node.untried.pop(rng.randrange(len(node.untried)))
+        mover = game.current_player
+        game.play(col)
+        depth += 1
+        child = _Node(node, col, mover, game.legal_moves(), game.num_players)
+        node.children.append(child)
+        node = child
+        expanded = True
+
+    #playout: random moves to the end of the game
+    moves_played = depth
+    while game.empty_squares > 0:
+        game.play(rng.choice(game.legal_moves()))
+        moves_played += 1
+    result = rewards(game.scores)
+    for each_move in range(moves_played):
+        game.undo()
+
+    #backpropagation
+    while node is not None:
+        node.visits += 1
+        node_rewards = node.rewards
+        for player, reward in enumerate(result):
+            node_rewards[player] += reward
+        node = node.parent
+
+    return depth, expanded
+
+
+def search(game, time_limit, exploration=0.7, seed=None, max_playouts=None,
+           cancelled=None):
+    """Builds an MCTS tree from the game's current position for time_limit
+    seconds (or max_playouts playouts, if given, or until the optional
+    cancelled function returns True).
+
+    Moves are made with play()/undo() on the game itself, which is left as
+    it was found.
+
+    Returns (root statistics, number of playouts, deepest node) where the
+    root statistics map each first move (column) to (visits, rewards).
+    """
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + time_limit
+    root = _Node(None, None, None, game.legal_moves(), game.num_players)
+    playouts = 0
+    deepest = 0
+
+    saved_redo = game._redo
+    try:
+        while max_playouts is None or playouts < max_playouts:
+            if playouts % 16 == 0:
+                if time.perf_counter() > deadline:
+                    break
+                if cancelled is not None and cancelled():
+                    break
+            depth, expanded = _playout(root, game, rng, exploration)
+            deepest = max(deepest, depth)
+            playouts += 1
+    finally:
+        game._redo = saved_redo
+
+    stats = {}
+    for child in root.children:
+        stats[child.col] = (child.visits, child.rewards)
+    return stats, playouts, deepest
+
+
+class MCTSPlayer:
+    """MCTS player for 2 to 6 player games.
+
+    With more than 1 worker, the search runs in a pool of worker processes
+    that's kept between moves (call close() when done with the player, or
+    use it in a 'with' block).
+    """
+
+    def __init__(self, workers=None, exploration=0.7, seed=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.exploration = exploration
+        self._rng = random.Random(seed)
+        self._pool = None
+
+        #solves the last few moves of the game exactly instead of searching
+        #(set to None to always search)
+        self.endgame = endgame.EndgameSolver()
+
+        #stats from the last search
+        self.nodes = 0
+        self.depth = 0
+        self.value = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def playouts_per_second(self):
+        """How fast the last search went."""
+        if self.elapsed <= 0:
+            return 0
+        return self.nodes / self.elapsed
+
+    def close(self):
+        """Shuts down the worker processes, if there are any."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def choose_move(self, game, time_limit=1.0):
+        """Returns the best column (1 to width) for the current player, found
+        by searching for up to time_limit seconds.
+        """
+        return self.search(search_api.SearchRequest(game, time_limit)).col
+
+    def search(self, request):
+        """Searches the request's position (see search_api.py) and returns a
+        SearchResult, where nodes are playouts and the principal variation
+        is just the best move (only the first moves of each tree are kept).
+
+        The node limit is split between the workers, and with more than 1
+        worker a cancelled search still runs until its deadline or node
+        limit, since the worker processes can't see the cancel token.
+        """
+        game = request.game
+        if game.empty_squares <= 0:
+            raise gl.GameOverError()
+
+        #neutral until a playout says otherwise
+        self.value = 0.0
+        start = time.perf_counter()
+        if self.endgame is not None and self.endgame.can_solve(game):
+            col, scores = self.endgame.solve(game)
+            self.nodes = self.endgame.nodes
+            self.depth = game.empty_squares
+            self.value = rewards(scores)[game.current_player-1]
+            self.elapsed = time.perf_counter() - start
+            return search_api.SearchResult(col, self.value, [col],
+                                           self.depth, self.nodes,
+                                           self.elapsed)
+
+        seeds = [self._rng.getrandbits(32) for worker in range(self.workers)]
+        time_limit = request.time_left()
+        max_playouts = None
+        if request.max_nodes is not None:
+            max_playouts = max(1, request.max_nodes // self.workers)
+
+        if self.workers == 1:
+            results = [search(game, time_limit, self.exploration, seeds[0],
+                              max_playouts, request.cancelled)]
+        else:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.workers)
+            #each worker gets a pickled copy of the game to search
+            futures = [
+                self._pool.submit(search, game, time_limit, self.exploration,
+                                  seed, max_playouts)
+                for seed in seeds
+            ]
+            results = [future.result() for future in futures]
+
+        #merge the root statistics from each tree
+        visits = {}
+        totals = {}
+        self.nodes = 0
+        self.depth = 0
+        for stats, playouts, deepest in results:
+            self.nodes += playouts
+            self.depth = max(self.depth, deepest)
+            for col, (col_visits, col_rewards) in stats.items():
+                visits[col] = visits.get(col, 0) + col_visits
+                totals[col] = [
+                    total + reward for total, reward in
+                    zip(totals.get(col, [0.0] * game.num_players), col_rewards)
+                ]
+
+        self.elapsed = time.perf_counter() - start
+        if not visits:
+            col = game.legal_moves()[0]
+            return search_api.SearchResult(col, self.value, [col],
+                                           self.depth, self.nodes,
+                                           self.elapsed)
+
+        #the most visited move is the most reliable choice
+        best_col = max(visits, key=lambda col: visits[col])
+        self.value = (totals[best_col][game.current_player-1] /
+                      visits[best_col])
+        return search_api.SearchResult(best_col, self.value, [best_col],
+                                       self.depth, self.nodes, self.elapsed)
+
+
+class MCTSSession:
+    """An MCTS player that keeps its tree for a whole game.
+
+    The session follows the game through play(): each move makes the
+    matching child the new root of the tree, so everything already searched
+    below it is kept for the next search. It also keeps searching in a
+    background thread while it's waiting for its next choose_move() call
+    (i.e. while the other players are thinking), which is called
+    'pondering'. Together these mean most of the tree is usually already
+    there when it's the computer's turn.
+
+    The tree stops growing at about memory_limit_mb (it keeps running
+    playouts to improve the statistics of the nodes it has, but pondering
+    stops). Call close() when the game is over to stop the background thread,
+    or use the session in a 'with' block.
+
+    NOTE: the session searches its own copy of the game, so every move made
+    in the real game has to be passed on with play() (and undo() if a move
+    is taken back).
+    """
+
+    #roughly how much memory each tree node takes (measured on 64 bit Python)
+    NODE_BYTES = 600
+
+    #how many playouts the background thread runs each time it has the lock
+    PONDER_BATCH = 32
+
+    def __init__(self, game, exploration=0.7, memory_limit_mb=256,
+                 ponder=True, seed=None):
+        self.exploration = exploration
+        self.max_nodes = max(1, int(memory_limit_mb * 1024 * 1024 /
+                                    self.NODE_BYTES))
+        self._rng = random.Random(seed)
+        self._game = game.clone()
+        self._new_root()
+        #solves the last few moves of the game exactly instead of searching
+        #(set to None to always search)
+        self.endgame = endgame.EndgameSolver()
+
+        #stats from the last choose_move
+        self.nodes = 0
+        self.reused = 0
+        self.depth = 0
+        self.value = 0.0
+        self.elapsed = 0.0
+        #total playouts run in the background
+        self.pondered = 0
+
+        #the lock is held by whichever thread is using the tree and the game
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        if ponder:
+            self._thread = threading.Thread(target=self._ponder, daemon=True)
+            self._thread.start()
+
+    def _new_root(self):
+        self._root = _Node(None, None, None, self._game.legal_moves(),
+                           self._game.num_players)
+        self._node_count = 1
+
+    def _count_nodes(self, node):
+        count = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+    def _run_playouts(self, count):
+        """Runs up to count playouts on the tree (the lock must be held).
+        Returns the deepest node the playouts started from.
+        """
+        game = self._game
+        deepest = 0
+        saved_redo = game._redo
+        try:
+            for each_playout in range(count):
+                expand = self._node_count < self.max_nodes
+                depth, expanded = _playout(self._root, game, self._rng,
+                                           self.exploration, expand)
+                if expanded:
+                    self._node_count += 1
+                deepest = max(deepest, depth)
+        finally:
+            game._redo = saved_redo
+        return deepest
+
+    def _ponder(self):
+        """Background thread: keeps growing the tree until it's full or the
+        game is over, then waits for the next move.
+        """
+        while not self._closed:
+            with self._lock:
+                idle = (self._game.empty_squares <= 0 or
+                        self._node_count >= self.max_nodes)
+                if not idle:
+                    self._run_playouts(self.PONDER_BATCH)
+                    self.pondered += self.PONDER_BATCH
+            if idle:
+                self._wake.wait(0.5)
+                self._wake.clear()
+            else:
+                #give other threads a chance at the lock between batches
+                time.sleep(0)
+
+    def play(self, col_num):
+        """Records a move made in the game (by anyone), keeping the part of
+        the tree below it.
+        """
+        with self._lock:
+            self._game.play(col_num)
+            child = None
+            for node in self._root.children:
+                if node.col == col_num:
+                    child = node
+            if child is None:
+                self._new_root()
+            else:
+                child.parent = None
+                self._root = child
+                self._node_count = self._count_nodes(child)
+        self._wake.set()
+
+    def undo(self):
+        """Records a move being taken back in the game. The tree can't go
+        backwards, so this starts a new one.
+        """
+        with self._lock:
+            self._game.undo()
+            self._new_root()
+        self._wake.set()
+
+    def choose_move(self, time_limit=1.0):
+        """Returns the best column (1 to width) for the current player, found
+        by searching for up to time_limit seconds on top of the tree that's
+        already there.
+        """
+        return self.search(
+            search_api.SearchRequest(self._game, time_limit)).col
+
+    def search(self, request):
+        """Searches on top of the tree that's already there (see
+        search_api.py) and returns a SearchResult, where nodes are playouts
+        and the principal variation follows the most visited moves down the
+        tree. The request's game has to be in the same position as the
+        session's (raises a ValueError if it isn't).
+        """
+        with self._lock:
+            game = self._game
+            if request.game is not game and request.game != game:
+                raise ValueError("The session isn't at the request's position")
+            if game.empty_squares <= 0:
+                raise gl.GameOverError()
+
+            #neutral until a playout says otherwise
+            self.value = 0.0
+            start = time.perf_counter()
+            if self.endgame is not None and self.endgame.can_solve(game):
+                col, scores = self.endgame.solve(game)
+                self.nodes = self.endgame.nodes
+                self.reused = 0
+                self.depth = game.empty_squares
+                self.value = rewards(scores)[game.current_player-1]
+                self.elapsed = time.perf_counter() - start
+                return search_api.SearchResult(col, self.value, [col],
+                                               self.depth, self.nodes,
+                                               self.elapsed)
+
+            self.reused = self._root.visits
+            self.nodes = 0
+            self.depth = 0
+            while time.perf_counter() < request.deadline:
+                if request.cancelled():
+                    break
+                batch = 16
+                if request.max_nodes is not None:
+                    #don't run past the node limit
+                    batch = min(batch, request.max_nodes - self.nodes)
+                    if batch <= 0:
+                        break
+                self.depth = max(self.depth, self._run_playouts(batch))
+                self.nodes += batch
+
+            best = self._root.most_visited()
+            self.elapsed = time.perf_counter() - start
+            if best is None:
+                col = game.legal_moves()[0]
+                return search_api.SearchResult(col, self.value, [col],
+                                               self.depth, self.nodes,
+                                               self.elapsed)
+            self.value = (best.rewards[game.current_player-1] /
+                          best.visits)
+
+            pv = []
+            node = best
+            while node is not None:
+                pv.append(node.col)
+                node = node.most_visited()
+            return search_api.SearchResult(best.col, self.value, pv,
+                                           self.depth, self.nodes,
+                                           self.elapsed)
+
+    def close(self):
+        """Stops the background thread."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
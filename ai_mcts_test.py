@@ -0,0 +1,136 @@
+import random
+import time
+import unittest
+import ai_mcts
+import game_logic as gl
+
+class TestMCTS(unittest.TestCase):
+
+    def test_rewards(self):
+        """It should reward winning and scoring, between 0 and 1."""
+        self.assertEqual([1.0, 0.125], ai_mcts.rewards([8, 2]))
+        self.assertEqual([0.75, 0.75, 0.0], ai_mcts.rewards([4, 4, 0]))
+        self.assertEqual([0.75, 0.75], ai_mcts.rewards([0, 0]))
+
+    def test_search_takes_points(self):
+        """It should visit a move that completes a chain the most."""
+        game = gl.ConnectMore(2)
+        for col in [1, 6, 2, 6, 4, 1]:
+            game.play(col)
+        # player 1 has 1, 2 and 4 on the bottom row, 3 makes a chain of 4
+        stats, playouts, deepest = ai_mcts.search(game, 10.0, seed=1,
+                                                  max_playouts=3000)
+        self.assertEqual(3000, playouts)
+        self.assertEqual(3, max(stats, key=lambda col: stats[col][0]))
+        self.assertEqual(3000, sum(visits for visits, r in stats.values()))
+
+    def test_search_leaves_game_unchanged(self):
+        """It should leave the game (including undo/redo) as it found it."""
+        game = gl.ConnectMore(3)
+        for col in [3, 4, 3, 4, 5]:
+            game.play(col)
+        game.undo()
+        expected = game.clone()
+
+        ai_mcts.search(game, 10.0, seed=2, max_playouts=200)
+        self.assertEqual(expected, game)
+        self.assertEqual(expected._moves, game._moves)
+        self.assertEqual(expected._redo, game._redo)
+
+    def test_choose_move(self):
+        """It should return a legal move and report its stats."""
+        for num_players in range(2, 7):
+            game = gl.ConnectMore(num_players)
+            with ai_mcts.MCTSPlayer(workers=1, seed=3) as player:
+                col = player.choose_move(game, 0.1)
+            self.assertIn(col, game.legal_moves())
+            self.assertGreater(player.nodes, 0)
+            self.assertGreater(player.playouts_per_second, 0)
+
+    def test_choose_move_workers(self):
+        """It should merge the searches from several worker processes."""
+        game = gl.ConnectMore(2)
+        with ai_mcts.MCTSPlayer(workers=2, seed=4) as player:
+            col = player.choose_move(game, 0.2)
+            self.assertIn(col, game.legal_moves())
+            self.assertEqual(gl.ConnectMore(2), game)
+
+    def test_choose_move_game_over(self):
+        """It should refuse to play a game that's over."""
+        game = gl.ConnectMore(2)
+        for row in range(game.height):
+            for col in range(1, game.width + 1):
+                game.play(col)
+        self.assertRaises(gl.GameOverError,
+                          ai_mcts.MCTSPlayer(workers=1).choose_move, game)
+
+class TestMCTSSession(unittest.TestCase):
+
+    def test_keeps_tree_between_moves(self):
+        """It should keep the searched subtree of the move that was played."""
+        game = gl.ConnectMore(2)
+        with new_session(game, ponder=False) as session:
+            col = session.choose_move(0.3)
+            self.assertEqual(0, session.reused)
+            game.play(col)
+            session.play(col)
+
+            #searched the move that was played, so its subtree is kept
+            self.assertGreater(session._root.visits, 0)
+            reply = session.choose_move(0.1)
+            self.assertGreater(session.reused, 0)
+            self.assertIn(reply, game.legal_moves())
+
+    def test_ponders(self):
+        """It should search in the background while waiting for its turn."""
+        game = gl.ConnectMore(2)
+        with new_session(game, ponder=True) as session:
+            game.play(1)
+            session.play(1)
+            deadline = time.perf_counter() + 5
+            while session.pondered == 0 and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            session.choose_move(0.01)
+            self.assertGreater(session.pondered, 0)
+            self.assertGreater(session.reused, 0)
+        self.assertIsNone(session._thread)
+
+    def test_memory_limit(self):
+        """It should stop adding nodes to the tree when it's full."""
+        game = gl.ConnectMore(2)
+        with new_session(game, ponder=False, memory_limit_mb=0.01) as session:
+            session.choose_move(0.2)
+            self.assertEqual(session.max_nodes, session._node_count)
+            self.assertEqual(session.max_nodes,
+                             session._count_nodes(session._root))
+
+    def test_node_count_finished_games(self):
+        """It should only count the nodes that are really added, when
+        playouts reach the end of the game in the tree.
+        """
+        rng = random.Random(1)
+        game = gl.ConnectMore(2)
+        while game.empty_squares > 3:
+            game.play(rng.choice(game.legal_moves()))
+        with new_session(game, ponder=False) as session:
+            session._run_playouts(200)
+            self.assertEqual(session._count_nodes(session._root),
+                             session._node_count)
+
+    def test_undo(self):
+        """It should follow moves being taken back."""
+        game = gl.ConnectMore(2)
+        with new_session(game, ponder=False) as session:
+            session.play(3)
+            session.play(4)
+            session.undo()
+            self.assertEqual(2, session._game.current_player)
+            self.assertEqual(35, session._game.empty_squares)
+            self.assertEqual(0, session._root.visits)
+
+
+def new_session(game, **options):
+    return ai_mcts.MCTSSession(game, seed=5, **options)
+
+if __name__ == '__main__':
+    unittest.main()
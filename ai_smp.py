@@ -0,0 +1,255 @@
+"""Parallel alpha-beta search using 'Lazy SMP'.
+
+Several worker processes all search the same position at the same time with
+the normal players from ai.py, sharing one transposition table in shared
+memory. There's no other coordination between them: they speed each other up
+by filling in the shared table, so each one finds more of the positions it
+needs already searched. Half of the workers start their iterative deepening a
+move deeper, so the workers spread out over different parts of the tree.
+
+The shared table has a fixed size and no locks. Two processes can write the
+same entry at the same time, so each entry is stored as (key XOR data, data)
+and only used if XOR'ing those back together gives the key being looked up -
+a half written entry won't match, and just looks like a missing one.
+"""
+import concurrent.futures
+import time
+from multiprocessing import shared_memory
+
+import ai
+import endgame
+import game_logic as gl
+import search_api
+import transposition
+
+
+class SharedTranspositionTable:
+    """A fixed size transposition table in shared memory, which behaves like
+    the table the players in ai.py normally use (entry = table.get(key) and
+    table[key] = entry, where entry is (depth, value, bound, move)).
+
+    It can be passed to other processes, which attach to the same memory.
+    Entries are packed the same way as in transposition.TranspositionTable,
+    but always replace whatever was in their slot before.
+    """
+
+    #each slot is 2 unsigned 64 bit words: key XOR data, data
+    WORD_BYTES = 8
+
+    #the first word is a flag the workers check to see if they should stop
+    HEADER_WORDS = 1
+
+    def __init__(self, size_mb=16, name=None):
+        if name is None:
+            slots = max(1, int(size_mb * 1024 * 1024) //
+                        (2 * self.WORD_BYTES))
+            size = (self.HEADER_WORDS + 2 * slots) * self.WORD_BYTES
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.size = ((self._memory.size // self.WORD_BYTES -
+                      self.HEADER_WORDS) // 2)
+        words = self.HEADER_WORDS + 2 * self.size
+        #some platforms round the memory up to a whole page, so only use
+        #the part that was asked for
+        self._words = self._memory.buf[:words * self.WORD_BYTES].cast("Q")
+        if self._owner:
+            self.clear()
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def __getstate__(self):
+        #other processes just need the name to attach to the same memory
+        return {"name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(name=state["name"])
+
+    def clear(self):
+        """Empties the table and clears the stop flag."""
+        self._memory.buf[:len(self._words) * self.WORD_BYTES] = bytes(
+            len(self._words) * self.WORD_BYTES)
+
+    def stop(self):
+        """Tells every process using the table to stop searching."""
+        self._words[0] = 1
+
+    def stopped(self):
+        return self._words[0] != 0
+
+    def reset_stop(self):
+        self._words[0] = 0
+
+    def get(self, key):
+        slot = self.HEADER_WORDS + 2 * (key % self.size)
+        data = self._words[slot + 1]
+        if self._words[slot] ^ data != key or data == 0:
+            return None
+        return transposition.unpack(data)
+
+    def __setitem__(self, key, entry):
+        slot = self.HEADER_WORDS + 2 * (key % self.size)
+        data = transposition.pack(entry)
+        self._words[slot] = key ^ data
+        self._words[slot + 1] = data
+
+    def close(self):
+        """Detaches from the shared memory (and frees it, in the process that
+        created it).
+        """
+        if self._words is not None:
+            self._words.release()
+            self._words = None
+            self._memory.close()
+            if self._owner:
+                self._memory.unlink()
+
+
+#the table each worker process uses, set up when the process starts
+_worker_table = None
+
+
+def _init_worker(table):
+    global _worker_table
+    _worker_table = table
+
+
+def _search_worker(player_class, index, game, time_limit, max_depth,
+                   max_nodes=None):
+    """Runs one worker's search (in a worker process) and returns its result:
+    (column, depth reached, value, nodes, depth_times, principal variation).
+    """
+    #the player's own table is replaced by the shared one straight away, so
+    #only give it the smallest one it can have
+    player = player_class(table_mb=0)
+    player.transpositions = _worker_table
+    player.cancelled = _worker_table.stopped
+    player.max_nodes = max_nodes
+    player.depth_offset = index % 2
+    try:
+        col = player.choose_move(game, time_limit, max_depth)
+    finally:
+        #once the main worker is done there's no point the others carrying on
+        if index == 0:
+            _worker_table.stop()
+    return (col, player.depth, player.value, player.nodes,
+            player.depth_times, player.pv)
+
+
+class LazySMPPlayer:
+    """Alpha-beta search spread over several processes (see above).
+
+    player_class is the player from ai.py each worker runs (by default
+    AlphaBetaPlayer for 2 player games and ParanoidPlayer otherwise). The
+    worker processes and the shared table are kept between moves, so call
+    close() when done with the player (or use it in a 'with' block).
+    """
+
+    #how often to check whether a search has been cancelled, in seconds
+    CHECK_CANCEL_EVERY = 0.05
+
+    def __init__(self, workers=2, table_mb=16, player_class=None):
+        self.workers = workers
+        self.player_class = player_class
+        self.table = SharedTranspositionTable(table_mb)
+        #solves the last few moves of the game exactly instead of searching
+        #(set to None to always search)
+        self.endgame = endgame.EndgameSolver()
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(self.table,))
+
+        #stats from the last search
+        self.nodes = 0
+        self.depth = 0
+        self.value = 0
+        self.elapsed = 0.0
+        self.depth_times = []
+        self.pv = []
+
+    @property
+    def nodes_per_second(self):
+        if self.elapsed <= 0:
+            return 0
+        return self.nodes / self.elapsed
+
+    def choose_move(self, game, time_limit=1.0, max_depth=None):
+        """Returns the best column (1 to width) for the current player, found
+        by searching for up to time_limit seconds (or until the main worker
+        has searched max_depth moves ahead).
+        """
+        return self.search(search_api.SearchRequest(
+            game, time_limit, max_depth=max_depth)).col
+
+    def search(self, request):
+        """Searches the request's position (see search_api.py) and returns a
+        SearchResult. The node limit is for each worker, and there are no
+        transposition table stats since the shared table doesn't count them.
+        """
+        game = request.game
+        if game.empty_squares <= 0:
+            raise gl.GameOverError()
+
+        player_class = self.player_class
+        if player_class is None:
+            if game.num_players == 2:
+                player_class = ai.AlphaBetaPlayer
+            else:
+                player_class = ai.ParanoidPlayer
+
+        start = time.perf_counter()
+        if self.endgame is not None and self.endgame.can_solve(game):
+            col, scores = self.endgame.solve(game)
+            self.nodes = self.endgame.nodes
+            self.depth = game.empty_squares
+            self.value = endgame.final_value(scores, game.current_player)
+            self.depth_times = [time.perf_counter() - start]
+            self.pv = [col]
+            self.elapsed = self.depth_times[0]
+            return search_api.SearchResult(col, self.value, self.pv,
+                                           self.depth, self.nodes,
+                                           self.elapsed)
+
+        self.table.reset_stop()
+        futures = [
+            self._pool.submit(_search_worker, player_class, index, game,
+                              request.time_left(), request.max_depth,
+                              request.max_nodes)
+            for index in range(self.workers)
+        ]
+        #the workers can't see the request's cancel token, but they all stop
+        #when the shared table says so
+        while concurrent.futures.wait(futures,
+                                      self.CHECK_CANCEL_EVERY).not_done:
+            if request.cancelled():
+                self.table.stop()
+        results = [future.result() for future in futures]
+
+        #use the deepest search that finished, preferring the main worker's
+        best = results[0]
+        for result in results[1:]:
+            if result[1] > best[1]:
+                best = result
+
+        col, self.depth, self.value, nodes, times, self.pv = best
+        self.nodes = sum(result[3] for result in results)
+        self.depth_times = results[0][4]
+        self.elapsed = time.perf_counter() - start
+        return search_api.SearchResult(col, self.value, self.pv, self.depth,
+                                       self.nodes, self.elapsed)
+
+    def close(self):
+        """Shuts down the worker processes and frees the shared table."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self.table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,98 @@
+import multiprocessing
+import unittest
+import ai
+import ai_smp
+import game_logic as gl
+
+
+def _write_entry(table, key, entry):
+    table[key] = entry
+
+
+class TestSharedTranspositionTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = ai_smp.SharedTranspositionTable(0.01)
+
+    def tearDown(self):
+        self.table.close()
+
+    def test_get_and_set(self):
+        """It should store and return entries like a dict."""
+        key = 0x123456789abcdef0
+        self.assertIsNone(self.table.get(key))
+
+        self.table[key] = (7, -12, ai.LOWER_BOUND, 4)
+        self.assertEqual((7, -12, ai.LOWER_BOUND, 4), self.table.get(key))
+
+        self.table[key] = (3, 5, ai.EXACT, (3, 9))
+        self.assertEqual((3, 5, ai.EXACT, (3, 9)), self.table.get(key))
+
+        self.table[key] = (1, 0, ai.UPPER_BOUND, None)
+        self.assertEqual((1, 0, ai.UPPER_BOUND, None), self.table.get(key))
+
+    def test_get_other_key_same_slot(self):
+        """It should not return an entry stored for a different key."""
+        key = 42
+        self.table[key] = (2, 3, ai.EXACT, 1)
+        self.assertIsNone(self.table.get(key + self.table.size))
+
+    def test_get_torn_entry(self):
+        """It should ignore an entry whose words don't match (e.g. when
+        another process was part way through writing it).
+        """
+        key = 99
+        self.table[key] = (2, 3, ai.EXACT, 1)
+        slot = self.table.HEADER_WORDS + 2 * (key % self.table.size)
+        self.table._words[slot + 1] ^= 1 << 20
+        self.assertIsNone(self.table.get(key))
+
+    def test_shared_between_processes(self):
+        """It should see entries written by another process."""
+        key = 0xfedcba9876543210
+        process = multiprocessing.Process(
+            target=_write_entry, args=(self.table, key, (5, 8, ai.EXACT, 2)))
+        process.start()
+        process.join()
+        self.assertEqual((5, 8, ai.EXACT, 2), self.table.get(key))
+
+    def test_clear_and_stop(self):
+        """It should empty the table and manage the stop flag."""
+        self.table[5] = (2, 3, ai.EXACT, 1)
+        self.table.stop()
+        self.assertTrue(self.table.stopped())
+        self.table.clear()
+        self.assertFalse(self.table.stopped())
+        self.assertIsNone(self.table.get(5))
+
+
+class TestLazySMPPlayer(unittest.TestCase):
+
+    def test_choose_move(self):
+        """It should search to the requested depth and return a legal move,
+        for 2 player and multi-player games.
+        """
+        for num_players, depth in [(2, 6), (4, 3)]:
+            game = gl.ConnectMore(num_players)
+            for col in [3, 4, 3, 4]:
+                game.play(col)
+            expected = game.clone()
+
+            with ai_smp.LazySMPPlayer(workers=2, table_mb=1) as player:
+                col = player.choose_move(game, 30, max_depth=depth)
+            self.assertIn(col, game.legal_moves())
+            self.assertEqual(depth, player.depth)
+            self.assertEqual(depth, len(player.depth_times))
+            self.assertGreater(player.nodes_per_second, 0)
+            self.assertEqual(expected, game)
+
+    def test_choose_move_takes_points(self):
+        """It should complete a chain when that's clearly the best move."""
+        game = gl.ConnectMore(2)
+        for col in [1, 6, 2, 6, 4, 1]:
+            game.play(col)
+        with ai_smp.LazySMPPlayer(workers=2, table_mb=1) as player:
+            self.assertEqual(3, player.choose_move(game, 0.5))
+
+if __name__ == '__main__':
+    unittest.main()
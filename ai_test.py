@@ -0,0 +1,141 @@
+import time
+import unittest
+import ai
+import game_logic as gl
+
+class TestAlphaBetaPlayer(unittest.TestCase):
+
+    def test_choose_move_takes_points(self):
+        """It should complete a chain when that's clearly the best move."""
+        game = gl.ConnectMore(2)
+        for col in [1, 6, 2, 6, 4, 1]:
+            game.play(col)
+        # player 1 has 1, 2 and 4 on the bottom row, 3 makes a chain of 4
+        player = ai.AlphaBetaPlayer()
+        self.assertEqual(3, player.choose_move(game, 0.5))
+        self.assertGreater(player.depth, 0)
+        self.assertGreater(player.nodes, 0)
+
+    def test_choose_move_leaves_game_unchanged(self):
+        """It should leave the game (including undo/redo) as it found it."""
+        game = gl.ConnectMore(2)
+        for col in [3, 4, 3, 4, 5]:
+            game.play(col)
+        game.undo()
+        expected = game.clone()
+
+        ai.AlphaBetaPlayer().choose_move(game, 0.3)
+        self.assertEqual(expected, game)
+        self.assertEqual(expected.position_key(), game.position_key())
+        self.assertEqual(expected._moves, game._moves)
+        self.assertEqual(expected._redo, game._redo)
+
+    def test_choose_move_time_limit(self):
+        """It should return a legal move within (about) the time limit."""
+        game = gl.ConnectMore(2)
+        start = time.perf_counter()
+        col = ai.AlphaBetaPlayer().choose_move(game, 0.2)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertIn(col, game.legal_moves())
+
+    def test_choose_move_full_columns(self):
+        """It should never choose a full column."""
+        game = gl.ConnectMore(2)
+        for col in [3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4]:
+            game.play(col)
+        col = ai.AlphaBetaPlayer().choose_move(game, 0.1)
+        self.assertIn(col, [1, 2, 5, 6])
+
+    def test_choose_move_invalid_games(self):
+        """It should only play 2 player games that aren't over."""
+        self.assertRaises(ValueError, ai.AlphaBetaPlayer().choose_move,
+                          gl.ConnectMore(3), 0.1)
+
+        game = gl.ConnectMore(2)
+        for row in range(game.height):
+            for col in range(1, game.width + 1):
+                game.play(col)
+        self.assertRaises(gl.GameOverError, ai.AlphaBetaPlayer().choose_move,
+                          game, 0.1)
+
+    def test_endgame_exact(self):
+        """It should search to the end of the game when there's time, so the
+        value is the final score difference if both players play their best.
+        """
+        game = gl.ConnectMore(2)
+        for col in [1, 2, 3, 4, 5, 6] * 5:
+            game.play(col)
+        player = ai.AlphaBetaPlayer()
+        mover = game.current_player
+        game.play(player.choose_move(game, 5.0))
+        self.assertEqual(6, player.depth)
+        expected = player.value
+
+        while game.empty_squares > 0:
+            game.play(player.choose_move(game, 5.0))
+        self.assertEqual(expected,
+                         game.scores[mover-1] - game.scores[2-mover])
+
+    def test_mirrored_positions(self):
+        """It should share transposition table entries between a position
+        and its mirror image, flipping the stored best moves back.
+        """
+        game = gl.ConnectMore(2)
+        mirrored = gl.ConnectMore(2)
+        for col in [1, 6, 2, 6, 4, 1]:
+            game.play(col)
+            mirrored.play(mirrored.mirror_col(col))
+
+        player = ai.AlphaBetaPlayer()
+        self.assertEqual(3, player.choose_move(game, 5.0, max_depth=4))
+        entries = len(player.transpositions)
+        self.assertEqual(4, player.choose_move(mirrored, 5.0, max_depth=4))
+        self.assertEqual(entries, len(player.transpositions))
+
+class TestMultiPlayerSearch(unittest.TestCase):
+
+    PLAYERS = [ai.ParanoidPlayer, ai.BestReplyPlayer]
+
+    def test_choose_move_takes_points(self):
+        """It should complete a chain when that's clearly the best move."""
+        for player_class in self.PLAYERS:
+            game = gl.ConnectMore(3)
+            for col in [1, 9, 8, 2, 9, 8, 4, 1, 1]:
+                game.play(col)
+            # player 1 has 1, 2 and 4 on the bottom row, 3 makes a chain of 4
+            player = player_class()
+            self.assertEqual(3, player.choose_move(game, 0.5))
+            self.assertGreater(player.depth, 0)
+            self.assertGreater(player.nodes_per_second, 0)
+
+    def test_choose_move_leaves_game_unchanged(self):
+        """It should leave the game (including whose turn it is) as it found it."""
+        for player_class in self.PLAYERS:
+            for num_players in range(3, 7):
+                game = gl.ConnectMore(num_players)
+                for col in [3, 4, 3, 4, 5, 1, 1]:
+                    game.play(col)
+                expected = game.clone()
+
+                player_class().choose_move(game, 0.2)
+                self.assertEqual(expected, game)
+                self.assertEqual(expected.position_key(), game.position_key())
+                self.assertEqual(expected._moves, game._moves)
+
+    def test_choose_move_time_limit(self):
+        """It should return a legal move within (about) the time limit."""
+        for player_class in self.PLAYERS:
+            game = gl.ConnectMore(6)
+            start = time.perf_counter()
+            col = player_class().choose_move(game, 0.2)
+            self.assertLess(time.perf_counter() - start, 0.5)
+            self.assertIn(col, game.legal_moves())
+
+    def test_choose_move_invalid_games(self):
+        """It should only play 3 to 6 player games."""
+        for player_class in self.PLAYERS:
+            self.assertRaises(ValueError, player_class().choose_move,
+                              gl.ConnectMore(2), 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,541 @@
+"""Micro benchmarks for the game engine.
+
+Run with:
+>python benchmark.py [name ...]
+
+where each name is one of the benchmarks listed in BENCHMARKS (runs them all
+if no names are given). Timings are the best of a few repeats, since a single
+run on a busy machine can be pretty noisy.
+"""
+import copy
+import random
+import sys
+import timeit
+
+import game_logic as gl
+
+REPEATS = 7
+
+
+def random_games(num_players, num_games, seed=1):
+    """Returns a list of random (but repeatable) games played to the end, each
+    a list of the columns played (1-based, like ConnectMore.play).
+    """
+    rng = random.Random(seed)
+    games = []
+    for each_game in range(num_games):
+        game = gl.ConnectMore(num_players)
+        plays = []
+        while game.empty_squares > 0:
+            open_columns = [col + 1 for col in range(game.width)
+                            if game._heights[col] < game.height]
+            col = rng.choice(open_columns)
+            game.play(col)
+            plays.append(col)
+        games.append(plays)
+    return games
+
+
+def best_time(func, number=1):
+    """Returns the best time in seconds for calling func() number times."""
+    return min(timeit.repeat(func, number=number, repeat=REPEATS))
+
+
+class _RecursiveScoring(gl.ConnectMore):
+    """The original list-of-lists scorer, kept here as a baseline.
+
+    Expects _board to hold the board as a list of rows (the way _squares used
+    to be stored) instead of reading the bitboards.
+    """
+
+    def _update_scores(self, row, col):
+        directions = [
+            [[0, 1], [0, -1]], #right and left
+            [[1, 1], [-1, -1]], #diagonal
+            [[1, 0], [-1, 0]], #up and down
+            [[1, -1], [-1, 1]] #other diagonal
+        ]
+
+        def is_match(row, col, token):
+            if 0 <= row < self.height and 0 <= col < self.width:
+                return token == self._board[row][col]
+            return False
+
+        def get_chain_length(row, col, direction, count):
+            token = self._board[row][col]
+            next_row = row + direction[0]
+            next_col = col + direction[1]
+            if is_match(next_row, next_col, token):
+                return get_chain_length(next_row, next_col, direction, count + 1)
+            else:
+                return count
+
+        deltas = []
+        for direction in directions:
+            forward_length = get_chain_length(row, col, direction[0], 0)
+            back_length = get_chain_length(row, col, direction[1], 0)
+            deltas.append(
+                self.CHAIN_LENGTH_SCORE[forward_length + back_length + 1] -
+                self.CHAIN_LENGTH_SCORE[forward_length] -
+                self.CHAIN_LENGTH_SCORE[back_length])
+
+        deltas = tuple(deltas)
+        self.scores[self.current_player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        return deltas
+
+
+class _ShiftScoring(gl.ConnectMore):
+    """The first bitboard scorer, which shifts a probe bit along the player's
+    mask instead of using the precomputed ray tables.
+    """
+
+    def _update_scores(self, row, col):
+        mask = self._masks[self.current_player-1]
+        bit = 1 << (col * self._stride + row)
+        chain_score = self.CHAIN_LENGTH_SCORE
+        stride = self._stride
+
+        deltas = []
+        for shift in (stride, stride + 1, 1, stride - 1):
+            forward_length = 0
+            probe = bit << shift
+            while mask & probe:
+                forward_length += 1
+                probe <<= shift
+
+            back_length = 0
+            probe = bit >> shift
+            while mask & probe:
+                back_length += 1
+                probe >>= shift
+
+            deltas.append(
+                chain_score[forward_length + back_length + 1] -
+                chain_score[forward_length] -
+                chain_score[back_length])
+
+        deltas = tuple(deltas)
+        self.scores[self.current_player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        return deltas
+
+
+class _RayScoring(gl.ConnectMore):
+    """The ray table scorer, which walks along the precomputed rays from the
+    new token one square at a time instead of looking up the line patterns.
+    """
+
+    def _update_scores(self, row, col):
+        mask = self._masks[self.current_player-1]
+        chain_score = self.CHAIN_LENGTH_SCORE
+        rays = gl.ConnectMore._get_rays(self.width, self.height)
+
+        deltas = []
+        for forward_ray, back_ray in rays[col * self._stride + row]:
+            forward_length = 0
+            for probe in forward_ray:
+                if not mask & probe:
+                    break
+                forward_length += 1
+
+            back_length = 0
+            for probe in back_ray:
+                if not mask & probe:
+                    break
+                back_length += 1
+
+            deltas.append(
+                chain_score[forward_length + back_length + 1] -
+                chain_score[forward_length] -
+                chain_score[back_length])
+
+        deltas = tuple(deltas)
+        self.scores[self.current_player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        return deltas
+
+
+class _LineScoring(gl.ConnectMore):
+    """The generic line table scorer, which loops over the lines through the
+    square instead of calling the square's generated scorer.
+    """
+
+    def _update_scores(self, row, col):
+        lines = self._lines[self.current_player-1]
+        deltas = tuple([table[lines >> offset & length_mask]
+                        for offset, length_mask, table
+                        in self._lines_through[col * self._stride + row]])
+        self.scores[self.current_player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        return deltas
+
+
+class _DeepcopyClone(gl.ConnectMore):
+    """The original clone() and ==, which deep copied the game and compared
+    the whole board state, kept here as a baseline.
+    """
+
+    def clone(self):
+        return copy.deepcopy(self)
+
+    def __eq__(self, other):
+        return self._state() == other._state()
+
+    __hash__ = gl.ConnectMore.__hash__
+
+
+def scoring_positions(game_class, num_players, num_games=20):
+    """Returns (game, row, col) for every move of some random games, with
+    each game set up just after the token was dropped and before it was
+    scored, i.e. ready for a call to game._update_scores(row, col).
+    """
+    positions = []
+    for plays in random_games(num_players, num_games):
+        game = gl.ConnectMore(num_players)
+        for col in plays:
+            row = game._heights[col-1]
+            player = game.current_player
+            game.play(col)
+
+            position = game_class(num_players)
+            position._squares = game._squares
+            position._board = game._squares
+            position.current_player = player
+            positions.append((position, row, col-1))
+    return positions
+
+
+def bench_scoring():
+    """Compares the chain scorers on each board size."""
+    scorers = [
+        ("recursive", _RecursiveScoring),
+        ("bit shifts", _ShiftScoring),
+        ("ray tables", _RayScoring),
+        ("line tables", _LineScoring),
+        ("generated", gl.ConnectMore),
+    ]
+
+    print("Scoring a move (microseconds per call, best of %d)" % REPEATS)
+    print("%-8s" % "board" + "".join(["%14s" % name for name, c in scorers]))
+
+    for num_players in range(2, 7):
+        width = gl.ConnectMore.WIDTHS[num_players-2]
+        height = gl.ConnectMore.HEIGHTS[num_players-2]
+        line = "%-8s" % (str(width) + "x" + str(height))
+
+        for name, game_class in scorers:
+            positions = scoring_positions(game_class, num_players)
+
+            def score_all():
+                for game, row, col in positions:
+                    game._update_scores(row, col)
+
+            seconds = best_time(score_all, number=30)
+            line += "%14.2f" % (seconds / (30 * len(positions)) * 1e6)
+        print(line)
+
+
+def bench_batch(num_games=2000):
+    """Compares random self-play throughput of BatchConnectMore with a loop
+    over ConnectMore games (in games per second), and with stopping games
+    early once they're decided.
+    """
+    import numpy as np
+    import game_batch as gb
+
+    print("Random self-play (games/second, %d games per batch)" % num_games)
+    print("%-8s%14s%14s%14s" % ("board", "ConnectMore", "batch",
+                                "stop decided"))
+
+    for num_players in range(2, 7):
+        width = gl.ConnectMore.WIDTHS[num_players-2]
+        height = gl.ConnectMore.HEIGHTS[num_players-2]
+        plays = random_games(num_players, 50)
+
+        def play_loop():
+            for columns in plays:
+                game = gl.ConnectMore(num_players)
+                for col in columns:
+                    game.play(col)
+
+        def play_batch(stop_decided=False):
+            rng = np.random.default_rng(1)
+            batch = gb.BatchConnectMore(num_games, num_players, stop_decided)
+            while not batch.finished().all():
+                batch.play_random(rng)
+
+        loop_rate = len(plays) / best_time(play_loop)
+        batch_rate = num_games / best_time(play_batch)
+        stop_rate = num_games / best_time(lambda: play_batch(True))
+        print("%-8s%14d%14d%14d" % (str(width) + "x" + str(height),
+                                    loop_rate, batch_rate, stop_rate))
+
+
+def bench_search(time_limit=1.0):
+    """Reports the depth reached and nodes/second of the computer players
+    from a few early-game positions on each board size.
+    """
+    import ai
+
+    print("Search (%.1f seconds per move)" % time_limit)
+    print("%-8s%-18s%8s%14s" % ("board", "player", "depth", "nodes/sec"))
+
+    for num_players in range(2, 7):
+        width = gl.ConnectMore.WIDTHS[num_players-2]
+        height = gl.ConnectMore.HEIGHTS[num_players-2]
+        if num_players == 2:
+            players = [ai.AlphaBetaPlayer]
+        else:
+            players = [ai.ParanoidPlayer, ai.BestReplyPlayer]
+
+        for player_class in players:
+            depths = []
+            rates = []
+            for plays in random_games(num_players, 3):
+                game = gl.ConnectMore(num_players)
+                for col in plays[:2 * num_players]:
+                    game.play(col)
+                player = player_class()
+                player.choose_move(game, time_limit)
+                depths.append(player.depth)
+                rates.append(player.nodes_per_second)
+
+            print("%-8s%-18s%8.1f%14d" % (
+                str(width) + "x" + str(height), player_class.__name__,
+                sum(depths) / len(depths), sum(rates) / len(rates)))
+
+
+def bench_mcts(time_limit=2.0):
+    """Reports MCTS playouts/second on each board size for 1, 2, 4... worker
+    processes, up to the number of CPUs.
+    """
+    import os
+    import ai_mcts
+
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+        workers.append(workers[-1] * 2)
+
+    print("MCTS playouts/second (%.1f seconds per move)" % time_limit)
+    print("%-8s" % "board" +
+          "".join(["%12s" % (str(count) + " workers") for count in workers]))
+
+    for num_players in range(2, 7):
+        game = gl.ConnectMore(num_players)
+        line = "%-8s" % (str(game.width) + "x" + str(game.height))
+        for count in workers:
+            with ai_mcts.MCTSPlayer(workers=count, seed=1) as player:
+                #the first move also starts up the worker processes
+                player.choose_move(game, 0.1)
+                player.choose_move(game, time_limit)
+                line += "%12d" % player.playouts_per_second
+        print(line)
+
+
+def bench_smp(max_workers=4):
+    """Reports the Lazy SMP time-to-depth speedup for 1, 2, 4... workers on
+    a 2 player and a 4 player board (the time for the main worker to finish
+    searching to a fixed depth, from an empty shared table each time).
+    """
+    import ai_smp
+
+    workers = [1]
+    while workers[-1] * 2 <= max_workers:
+        workers.append(workers[-1] * 2)
+
+    print("Lazy SMP time to depth (seconds, average of 3 positions)")
+    print("%-8s%8s" % ("board", "depth") +
+          "".join(["%12s" % (str(count) + " workers") for count in workers]) +
+          "%10s" % "speedup")
+
+    for num_players, depth in [(2, 11), (4, 6)]:
+        game = gl.ConnectMore(num_players)
+        times = []
+        for count in workers:
+            with ai_smp.LazySMPPlayer(workers=count) as player:
+                #the first search also starts up the worker processes
+                player.choose_move(game, 0.1, max_depth=1)
+                total = 0.0
+                for plays in random_games(num_players, 3):
+                    position = gl.ConnectMore(num_players)
+                    for col in plays[:2 * num_players]:
+                        position.play(col)
+                    player.table.clear()
+                    player.choose_move(position, 600, max_depth=depth)
+                    total += player.depth_times[-1]
+                times.append(total / 3)
+
+        print("%-8s%8d" % (str(game.width) + "x" + str(game.height), depth) +
+              "".join(["%12.2f" % seconds for seconds in times]) +
+              "%9.2fx" % (times[0] / times[-1]))
+
+
+def long_chain_squares(width, height):
+    """Returns a board (as a list of rows) that's all player 1's tokens
+    apart from every other square of the top row, which are empty, so each
+    move there joins long chains in every direction but across.
+    """
+    squares = [[1] * width for each_row in range(height)]
+    squares[-1] = [0 if col % 2 else 1 for col in range(width)]
+    return squares
+
+
+def bench_chains():
+    """Compares scoring moves by walking along the ray tables, looking up
+    the line patterns, with the generated scorers (ConnectMore) and with the
+    union-find ChainConnectMore (in microseconds per play and undo), on
+    random positions and on a board of very long chains.
+    """
+    import chains
+
+    classes = [("ray tables", _RayScoring),
+               ("line tables", _LineScoring),
+               ("generated", gl.ConnectMore),
+               ("union-find", chains.ChainConnectMore)]
+    print("Play and undo (microseconds each, best of %d)" % REPEATS)
+    print("%-8s%-14s" % ("board", "positions") +
+          "".join(["%14s" % name for name, c in classes]))
+
+    for num_players in range(2, 7):
+        width = gl.ConnectMore.WIDTHS[num_players-2]
+        height = gl.ConnectMore.HEIGHTS[num_players-2]
+        board = str(width) + "x" + str(height)
+
+        random_line = "%-8s%-14s" % (board, "random")
+        long_line = "%-8s%-14s" % (board, "long chains")
+        for name, game_class in classes:
+            #every move of some random games, played and undone in turn
+            games = []
+            for plays in random_games(num_players, 10):
+                game = game_class(num_players)
+                for col in plays[:-1]:
+                    game.play(col)
+                games.append((game, plays))
+
+            def play_random():
+                for game, plays in games:
+                    for each_move in range(len(plays) - 1):
+                        game.undo()
+                    for col in plays[:-1]:
+                        game.play(col)
+
+            moves = sum(len(plays) - 1 for game, plays in games)
+            seconds = best_time(play_random, number=5)
+            random_line += "%14.2f" % (seconds / (5 * moves) * 1e6)
+
+            game = game_class(num_players)
+            game._squares = long_chain_squares(width, height)
+            game.rescore()
+            columns = game.legal_moves()
+
+            def play_long():
+                for col in columns:
+                    game.play(col)
+                    game.undo()
+
+            seconds = best_time(play_long, number=500)
+            long_line += "%14.2f" % (seconds / (500 * len(columns)) * 1e6)
+        print(random_line)
+        print(long_line)
+
+
+def bench_codegen():
+    """Reports how long it takes to get the generated scorers for each board
+    size (in milliseconds): generating and compiling them, and loading them
+    from the cache on disk instead.
+    """
+    import shutil
+    import tempfile
+    import scorers
+
+    print("Generated scorers (milliseconds, best of %d)" % REPEATS)
+    print("%-8s%14s%14s" % ("board", "generate", "from cache"))
+
+    folder = tempfile.mkdtemp()
+    try:
+        for num_players in range(2, 7):
+            width = gl.ConnectMore.WIDTHS[num_players-2]
+            height = gl.ConnectMore.HEIGHTS[num_players-2]
+            variant = gl.Variant.standard(num_players)
+            line_scores = lambda length: gl.ConnectMore._get_line_scores(
+                length, variant.chain_scores)
+
+            def get_scorers(cache_folder):
+                scorers.get_scorers(width, height, variant._lines_through,
+                                    line_scores, cache_folder)
+
+            generate = best_time(lambda: get_scorers(None))
+            get_scorers(folder)
+            cached = best_time(lambda: get_scorers(folder))
+            print("%-8s%14.2f%14.2f" % (str(width) + "x" + str(height),
+                                        generate * 1e3, cached * 1e3))
+    finally:
+        shutil.rmtree(folder)
+
+
+def bench_clone(num_games=10):
+    """Compares the old deepcopy clone() and == with the hand-written ones
+    (in microseconds per snapshot), on a snapshot-heavy workload: playing
+    random games with a clone after every play, then undoing them again and
+    comparing each position with its snapshot.
+    """
+    print("Snapshot play/undo (microseconds per move, best of %d)" % REPEATS)
+    print("%-8s%14s%14s" % ("board", "deepcopy", "clone"))
+
+    for num_players in range(2, 7):
+        games = random_games(num_players, num_games)
+        line = "%-8s" % (str(gl.ConnectMore.WIDTHS[num_players-2]) + "x" +
+                         str(gl.ConnectMore.HEIGHTS[num_players-2]))
+        for game_class in [_DeepcopyClone, gl.ConnectMore]:
+
+            def snapshot_games():
+                for plays in games:
+                    game = game_class(num_players)
+                    snapshots = []
+                    for col in plays:
+                        snapshots.append(game.clone())
+                        game.play(col)
+                    for snapshot in reversed(snapshots):
+                        game.undo()
+                        assert game == snapshot
+
+            moves = sum(len(plays) for plays in games)
+            seconds = best_time(snapshot_games)
+            line += "%14.2f" % (seconds / moves * 1e6)
+        print(line)
+
+
+def bench_perft(depth=5):
+    """Reports perft nodes/second (moves played and undone) from the empty
+    board on each board size, which is the headline speed of the engine.
+    """
+    import perft
+
+    print("Perft from the empty board (depth %d)" % depth)
+    print("%-8s%12s%14s" % ("board", "leaves", "nodes/sec"))
+
+    for num_players in range(2, 7):
+        game = gl.ConnectMore(num_players)
+        counts, results = perft.run(game, depth)
+        print("%-8s%12d%14d" % (str(game.width) + "x" + str(game.height),
+                                counts[0], counts[3]))
+
+
+BENCHMARKS = {
+    "batch": bench_batch,
+    "chains": bench_chains,
+    "clone": bench_clone,
+    "codegen": bench_codegen,
+    "perft": bench_perft,
+    "smp": bench_smp,
+    "mcts": bench_mcts,
+    "search": bench_search,
+    "scoring": bench_scoring,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+        print()
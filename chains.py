@@ -0,0 +1,143 @@
+"""Chain tracking with union-find, as an alternative to scanning for chains.
+
+ConnectMore._update_scores() works out how long the chains through a new
+token are by checking the squares along each direction one at a time, so the
+longer the chains get, the more squares it checks. ChainTracker keeps every
+chain as a set instead: one 'disjoint-set' (union-find) structure per
+direction, where each token is linked into the set of the same player's
+tokens it's in a line with, so a chain's length is just the size of its set.
+
+Placing a token joins it to the chains next to it (union by size, so the
+links never get more than log(tokens) deep), and every join is written to a
+log so the last token placed can be taken out again by undoing its joins.
+There's no path compression, since that would change links that the log
+doesn't know about.
+
+ChainConnectMore is a ConnectMore that scores moves with a ChainTracker. It
+plays exactly the same game, so it's opt-in - see the 'chains' benchmark in
+benchmark.py for how it compares.
+"""
+import game_logic as gl
+
+
+class ChainTracker:
+    """Chains of tokens on a board (see above), using the same bit numbers as
+    ConnectMore (bit = col * (height + 1) + row).
+    """
+
+    def __init__(self, width, height):
+        stride = height + 1
+        size = width * stride
+        #steps between squares in a line, in the same order as the directions
+        #in ConnectMore's ray tables: right, diagonal, up, other diagonal
+        self._steps = (stride, stride + 1, 1, 1 - stride)
+
+        #the player in each square, 0 for empty squares and the sentinels
+        #(which is what stops chains wrapping between columns)
+        self._owner = [0] * size
+        #for each direction: the square each square is linked to (itself
+        #for the first square of a set) and the size of each set
+        self._parents = [list(range(size)) for step in self._steps]
+        self._sizes = [[1] * size for step in self._steps]
+
+        #for each token placed, its bit and the joins it made:
+        #(direction, the set's first square that was linked into another)
+        self._log = []
+
+    def _find(self, parents, bit):
+        while parents[bit] != bit:
+            bit = parents[bit]
+        return bit
+
+    def chain_lengths(self, bit):
+        """Returns the length of the chain through the token at bit in each
+        direction.
+        """
+        return tuple(sizes[self._find(parents, bit)]
+                     for parents, sizes in zip(self._parents, self._sizes))
+
+    def add(self, bit, player):
+        """Places a token for player (1 to num_players) at bit, and returns
+        (forward length, backward length) for each direction: the lengths of
+        the chains it joined on each side.
+        """
+        owner = self._owner
+        owner[bit] = player
+        size = len(owner)
+        joins = []
+        lengths = []
+
+        for direction, step in enumerate(self._steps):
+            parents = self._parents[direction]
+            sizes = self._sizes[direction]
+            root = bit
+            side_lengths = []
+            for neighbour in (bit + step, bit - step):
+                if 0 <= neighbour < size and owner[neighbour] == player:
+                    other = self._find(parents, neighbour)
+                    side_lengths.append(sizes[other])
+                    #union by size: link the smaller set into the bigger one
+                    if sizes[other] > sizes[root]:
+                        root, other = other, root
+                    parents[other] = root
+                    sizes[root] += sizes[other]
+                    joins.append((direction, other))
+                else:
+                    side_lengths.append(0)
+            lengths.append(tuple(side_lengths))
+
+        self._log.append((bit, joins))
+        return lengths
+
+    def remove_last(self):
+        """Takes out the last token placed (that hasn't been taken out)."""
+        bit, joins = self._log.pop()
+        for direction, other in reversed(joins):
+            parents = self._parents[direction]
+            root = parents[other]
+            parents[other] = other
+            self._sizes[direction][root] -= self._sizes[direction][other]
+        self._owner[bit] = 0
+
+
+class ChainConnectMore(gl.ConnectMore):
+    """A ConnectMore that finds chain lengths with a ChainTracker instead of
+    scanning the board.
+    """
+
+    def __init__(self, num_players, variant=None):
+        gl.ConnectMore.__init__(self, num_players, variant)
+        self._chains = ChainTracker(self.width, self.height)
+
+    def _update_scores(self, row, col):
+        chain_score = self._chain_scores
+        lengths = self._chains.add(col * self._stride + row,
+                                   self.current_player)
+        deltas = tuple(
+            chain_score[forward_length + back_length + 1] -
+            chain_score[forward_length] - chain_score[back_length]
+            for forward_length, back_length in lengths)
+
+        self.scores[self.current_player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        return deltas
+
+    def undo(self):
+        if self._moves:
+            self._chains.remove_last()
+        gl.ConnectMore.undo(self)
+
+    def redo(self):
+        if self._redo:
+            col, row, player = self._redo[-1][:3]
+            self._chains.add(col * self._stride + row, player)
+        gl.ConnectMore.redo(self)
+
+    @gl.ConnectMore._squares.setter
+    def _squares(self, squares):
+        gl.ConnectMore._squares.fset(self, squares)
+        self._chains = ChainTracker(self.width, self.height)
+        for player, mask in enumerate(self._masks):
+            for bit in range(mask.bit_length()):
+                if mask >> bit & 1:
+                    self._chains.add(bit, player + 1)
@@ -0,0 +1,89 @@
+import random
+import unittest
+import chains
+import game_logic as gl
+
+
+def random_plays(num_players, seed):
+    """Returns the columns of a random game played to the end."""
+    rng = random.Random(seed)
+    game = gl.ConnectMore(num_players)
+    plays = []
+    while game.empty_squares > 0:
+        plays.append(rng.choice(game.legal_moves()))
+        game.play(plays[-1])
+    return plays
+
+
+class TestChainTracker(unittest.TestCase):
+
+    def test_chain_lengths(self):
+        """It should join tokens into chains in each direction, and split
+        them again when they're taken out.
+        """
+        game = gl.ConnectMore(2)
+        tracker = chains.ChainTracker(game.width, game.height)
+        stride = game.height + 1
+        #a row of 3 for player 1 along the bottom, with the middle one last
+        tracker.add(0, 1)
+        tracker.add(2 * stride, 1)
+        self.assertEqual([(1, 1), (0, 0), (0, 0), (0, 0)],
+                         tracker.add(1 * stride, 1))
+        self.assertEqual((3, 1, 1, 1), tracker.chain_lengths(0))
+        self.assertEqual((3, 1, 1, 1), tracker.chain_lengths(2 * stride))
+
+        #player 2 on top of the middle one doesn't join anything
+        self.assertEqual([(0, 0)] * 4, tracker.add(1 * stride + 1, 2))
+
+        tracker.remove_last()
+        tracker.remove_last()
+        self.assertEqual((1, 1, 1, 1), tracker.chain_lengths(0))
+        self.assertEqual((1, 1, 1, 1), tracker.chain_lengths(2 * stride))
+
+    def test_same_scores(self):
+        """A ChainConnectMore should score every move exactly the same as a
+        ConnectMore, through undo and redo too.
+        """
+        rng = random.Random(1)
+        for num_players in range(2, 7):
+            for seed in range(3):
+                plays = random_plays(num_players, seed)
+                game = gl.ConnectMore(num_players)
+                chain_game = chains.ChainConnectMore(num_players)
+                for col in plays:
+                    game.play(col)
+                    chain_game.play(col)
+                    self.assertEqual(game._moves[-1], chain_game._moves[-1])
+
+                    if rng.random() < 0.3:
+                        for each_game in [game, chain_game]:
+                            each_game.undo()
+                            each_game.undo()
+                            each_game.redo()
+                        self.assertEqual(game, chain_game)
+                        game.redo()
+                        chain_game.redo()
+                self.assertEqual(game.scores, chain_game.scores)
+
+    def test_loaded_board(self):
+        """It should carry on correctly from a board loaded with _squares,
+        and from a copy.
+        """
+        plays = random_plays(3, 1)
+        game = gl.ConnectMore(3)
+        for col in plays[:30]:
+            game.play(col)
+
+        chain_game = chains.ChainConnectMore(3)
+        chain_game.current_player = game.current_player
+        chain_game._squares = game._squares
+        chain_game.empty_squares = game.empty_squares
+        chain_game.rescore()
+        chain_game = chain_game.clone()
+        for col in plays[30:]:
+            game.play(col)
+            chain_game.play(col)
+        self.assertEqual(game.scores, chain_game.scores)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import random
+import tempfile
+import unittest
+import ai
+import endgame
+import game_logic as gl
+
+
+def endgame_position(num_players, empty_squares, seed=1):
+    """Returns a game played randomly until empty_squares are left."""
+    rng = random.Random(seed)
+    game = gl.ConnectMore(num_players)
+    while game.empty_squares > empty_squares:
+        game.play(rng.choice(game.legal_moves()))
+    return game
+
+
+class TestEndgameSolver(unittest.TestCase):
+
+    def test_solve_2_players(self):
+        """It should find the same value as a full depth alpha-beta search,
+        and reach the final scores it predicts by following its own moves.
+        """
+        for seed in range(3):
+            game = endgame_position(2, 8, seed)
+            expected = game.clone()
+            solver = endgame.EndgameSolver()
+            col, scores = solver.solve(game)
+            self.assertEqual(expected, game)
+            self.assertEqual(expected._moves, game._moves)
+
+            player = ai.AlphaBetaPlayer()
+            player.endgame = None
+            player.choose_move(game, 30)
+            self.assertEqual(8, player.depth)
+            self.assertEqual(player.value,
+                             endgame.final_value(scores, game.current_player))
+
+            while game.empty_squares > 0:
+                game.play(solver.solve(game)[0])
+            self.assertEqual(scores, game.scores)
+
+    def test_solve_multi_player(self):
+        """It should pick the move that gives the best final lead."""
+        game = endgame_position(4, 6)
+        solver = endgame.EndgameSolver()
+        col, scores = solver.solve(game)
+        mover = game.current_player
+        for other_col in game.legal_moves():
+            game.play(other_col)
+            other_scores = solver.solve(game)[1]
+            game.undo()
+            self.assertLessEqual(endgame.final_value(other_scores, mover),
+                                 endgame.final_value(scores, mover))
+
+    def test_game_over(self):
+        """It should return the final scores for a finished game."""
+        game = endgame_position(2, 0)
+        self.assertEqual((None, game.scores),
+                         endgame.EndgameSolver().solve(game))
+
+    def test_can_solve(self):
+        """It should only solve games close to the end."""
+        solver = endgame.EndgameSolver(max_squares=[10, 9, 8, 7, 6])
+        self.assertFalse(solver.can_solve(endgame_position(2, 11)))
+        self.assertTrue(solver.can_solve(endgame_position(2, 10)))
+        self.assertTrue(solver.can_solve(endgame_position(6, 6)))
+        self.assertFalse(solver.can_solve(endgame_position(6, 0)))
+
+    def test_cache_limit(self):
+        """It should never remember more than max_entries positions."""
+        game = endgame_position(3, 9)
+        expected = endgame.EndgameSolver().solve(game)
+        solver = endgame.EndgameSolver(max_entries=50)
+        self.assertEqual(expected, solver.solve(game))
+        self.assertLessEqual(len(solver), 50)
+
+    def test_save_and_load(self):
+        """It should save solved positions to a file and load them again,
+        even for several numbers of players at once.
+        """
+        solver = endgame.EndgameSolver()
+        games = [endgame_position(2, 8), endgame_position(3, 6)]
+        results = [solver.solve(game) for game in games]
+
+        path = os.path.join(tempfile.mkdtemp(), "endgames.bin")
+        try:
+            solver.save(path)
+            loaded = endgame.EndgameSolver()
+            self.assertEqual(len(solver), loaded.load(path))
+            for game, result in zip(games, results):
+                self.assertEqual(result, loaded.solve(game))
+                self.assertEqual(1, loaded.nodes)
+        finally:
+            os.remove(path)
+
+    def test_save_big_scores(self):
+        """It should save scores too big for 16 bits."""
+        variant = gl.Variant.standard(2)
+        solver = endgame.EndgameSolver()
+        solver._caches[variant] = {12345: (3, 40000, -40000)}
+        path = os.path.join(tempfile.mkdtemp(), "endgames.bin")
+        try:
+            solver.save(path)
+            loaded = endgame.EndgameSolver()
+            self.assertEqual(1, loaded.load(path))
+            self.assertEqual(solver._caches, loaded._caches)
+        finally:
+            os.remove(path)
+
+    def test_variants(self):
+        """It should keep positions from variants with the same board apart,
+        in the cache and in saved files.
+        """
+        standard = endgame_position(2, 8)
+        variant = gl.Variant(6, 6, 2, chain_scores=range(7))
+        linear = variant.new_game()
+        for move in standard._moves:
+            linear.play(move[0] + 1)
+        self.assertEqual(standard.canonical_key(), linear.canonical_key())
+        self.assertNotEqual(standard, linear)
+
+        solver = endgame.EndgameSolver()
+        results = [solver.solve(game) for game in [standard, linear]]
+        self.assertEqual(results[1], endgame.EndgameSolver().solve(linear))
+        self.assertNotEqual(results[0][1], results[1][1])
+
+        path = os.path.join(tempfile.mkdtemp(), "endgames.bin")
+        try:
+            solver.save(path)
+            loaded = endgame.EndgameSolver()
+            self.assertEqual(len(solver), loaded.load(path))
+            for game, result in zip([standard, linear], results):
+                self.assertEqual(result, loaded.solve(game))
+                self.assertEqual(1, loaded.nodes)
+        finally:
+            os.remove(path)
+
+    def test_players_use_solver(self):
+        """The computer players should solve endgames instead of searching."""
+        game = endgame_position(2, 8)
+        col, scores = endgame.EndgameSolver().solve(game)
+        player = ai.AlphaBetaPlayer()
+        self.assertEqual(col, player.choose_move(game, 0.1))
+        self.assertEqual(8, player.depth)
+
+if __name__ == '__main__':
+    unittest.main()
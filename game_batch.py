@@ -0,0 +1,319 @@
+"""Plays lots of independent Connect More games in lockstep using NumPy.
+
+Each call to BatchConnectMore.play() drops one token in every game at once,
+which is a lot faster than looping over ConnectMore objects when running
+thousands of random/simulated games (e.g. for Monte Carlo evaluation).
+
+NOTE: unlike the rest of the game, this needs NumPy installed
+(pip install numpy).
+"""
+import numpy as np
+
+import game_logic as gl
+
+
+class BatchConnectMore:
+
+    #directions to check for chains from the last token played
+    # each pair has a forward [0] and backward [1]
+    DIRECTIONS = [
+        [[0, 1], [0, -1]], #right and left
+        [[1, 1], [-1, -1]], #diagonal
+        [[1, 0], [-1, 0]], #up and down
+        [[1, -1], [-1, 1]] #other diagonal
+    ]
+
+    CHAIN_LENGTH_SCORE = np.array(gl.ConnectMore.CHAIN_LENGTH_SCORE)
+
+    #decided() only checks the chains the players could still make (which
+    #means scoring the whole board again for each player) in games with at
+    #most this many empty squares left - random games are hardly ever
+    #decided any earlier than that, so it isn't worth the time
+    DECIDED_SQUARES = 8
+
+    def __init__(self, num_games, num_players, stop_decided=False):
+        if num_players < 2 or num_players > 6:
+            raise ValueError("Number of players must be between 2 and 6")
+
+        self.num_games = num_games
+        self.num_players = num_players
+        self.width = gl.ConnectMore.WIDTHS[num_players - 2]
+        self.height = gl.ConnectMore.HEIGHTS[num_players - 2]
+
+        #same layout as ConnectMore._squares, with an extra first index for
+        #the game: boards[game][row][col], row 0 is the bottom row
+        self.boards = np.zeros((num_games, self.height, self.width),
+                               dtype=np.int8)
+        self.heights = np.zeros((num_games, self.width), dtype=np.int64)
+        self.scores = np.zeros((num_games, num_players), dtype=np.int64)
+
+        #players are 1-based like ConnectMore
+        self.current_player = np.ones(num_games, dtype=np.int64)
+        self.empty_squares = np.full(
+            num_games, num_players * gl.ConnectMore.TURNS_PER_PLAYER,
+            dtype=np.int64)
+
+        #opt-in: treat games as finished as soon as they're decided (see
+        #decided), so simulations don't waste time playing them out
+        self.stop_decided = stop_decided
+        self.stopped = np.zeros(num_games, dtype=bool)
+        self._max_token_gain = gl.Variant.standard(
+            num_players)._max_token_gain
+
+    def finished(self):
+        """Returns a bool per game, True if that game is over (or stopped
+        because it was decided, when stop_decided is set).
+        """
+        return (self.empty_squares <= 0) | self.stopped
+
+    def tokens_left(self):
+        """Returns how many more tokens each player (0-based) gets to play
+        in each game, like ConnectMore.tokens_left.
+        """
+        players = np.arange(1, self.num_players + 1)
+        turns_away = (players[None, :] -
+                      self.current_player[:, None]) % self.num_players
+        return ((self.empty_squares[:, None] + self.num_players - 1 -
+                 turns_away) // self.num_players)
+
+    def decided(self):
+        """Returns a bool per game, True if the game is over or one player
+        is in the lead and none of the others can catch up with them, like
+        ConnectMore.decided (but see DECIDED_SQUARES).
+        """
+        top_score = self.scores.max(axis=1, keepdims=True)
+        one_leader = (self.scores == top_score).sum(axis=1) == 1
+        bounds = self.scores + self.tokens_left() * self._max_token_gain
+
+        #the chains each player could still make, i.e. their score with
+        #every empty square filled with their tokens
+        endgame = np.nonzero(one_leader & (self.empty_squares > 0) &
+                             (self.empty_squares <= self.DECIDED_SQUARES))[0]
+        if len(endgame):
+            boards = self.boards[endgame]
+            for player in range(1, self.num_players + 1):
+                open_squares = (boards == 0) | (boards == player)
+                bounds[endgame, player - 1] = np.minimum(
+                    bounds[endgame, player - 1],
+                    score_boards(open_squares.astype(np.int8), 1)[:, 0])
+
+        #the leader can always reach their own score, so it's decided when
+        #they're the only one who can
+        return ((self.empty_squares <= 0) |
+                ((bounds >= top_score).sum(axis=1) == 1))
+
+    def legal_columns(self):
+        """Returns a bool per game per column (0-based), True if a token can
+        be played there, i.e. the game isn't over and the column isn't full.
+        """
+        return (self.heights < self.height) & ~self.finished()[:, None]
+
+    def play(self, columns):
+        """Drops the current player's token in the given column of each game.
+
+        columns holds one column number per game, numbered 1 to width like
+        ConnectMore.play(). Games that are already over, or where the column
+        is full or invalid, are left untouched rather than raising an error
+        (so one bad game doesn't stop the whole batch).
+
+        Returns a bool per game, True if a token was played in that game.
+        """
+        columns = np.asarray(columns, dtype=np.int64) - 1
+        valid_col = (columns >= 0) & (columns < self.width)
+        safe_cols = np.where(valid_col, columns, 0)
+        games = np.arange(self.num_games)
+
+        played = (valid_col & ~self.finished() &
+                  (self.heights[games, safe_cols] < self.height))
+
+        games = games[played]
+        cols = safe_cols[played]
+        rows = self.heights[games, cols]
+        players = self.current_player[games]
+
+        self.boards[games, rows, cols] = players
+        self.heights[games, cols] += 1
+        self._update_scores(games, rows, cols, players)
+
+        self.current_player[games] = players % self.num_players + 1
+        self.empty_squares[games] -= 1
+        if self.stop_decided:
+            self.stopped |= self.decided()
+        return played
+
+    def play_random(self, rng):
+        """Plays a uniformly random legal column in every unfinished game,
+        using rng (a numpy.random.Generator). Returns the columns played
+        (1-based, 0 for games that were already over).
+        """
+        legal = self.legal_columns()
+        #a random key per column, with illegal columns pushed below all the
+        #legal ones so argmax always picks a random legal column
+        keys = rng.random(legal.shape) + legal
+        columns = np.argmax(keys, axis=1) + 1
+        columns[~legal.any(axis=1)] = 0
+        self.play(columns)
+        return columns
+
+    def _update_scores(self, games, rows, cols, players):
+        """Updates the scores of the given games based on the token just
+        played at rows, cols (one entry per game).
+
+        Same algorithm as ConnectMore._update_scores, but each step of a chain
+        is checked for all the games at once.
+        """
+        chain_score = self.CHAIN_LENGTH_SCORE
+        total = np.zeros(len(games), dtype=np.int64)
+
+        for forward, backward in self.DIRECTIONS:
+            forward_length = self._chain_lengths(games, rows, cols, players,
+                                                 forward)
+            back_length = self._chain_lengths(games, rows, cols, players,
+                                              backward)
+            total += (chain_score[forward_length + back_length + 1] -
+                      chain_score[forward_length] -
+                      chain_score[back_length])
+
+        #a game can only appear once in games, so += is safe here
+        self.scores[games, players - 1] += total
+
+    def _chain_lengths(self, games, rows, cols, players, direction):
+        """Returns how many matching tokens follow each played token in
+        the given direction.
+        """
+        length = np.zeros(len(games), dtype=np.int64)
+        running = np.ones(len(games), dtype=bool)
+        row = rows.copy()
+        col = cols.copy()
+
+        for step in range(max(self.width, self.height) - 1):
+            row += direction[0]
+            col += direction[1]
+            running &= ((row >= 0) & (row < self.height) &
+                        (col >= 0) & (col < self.width))
+            if not running.any():
+                break
+
+            #finished chains may point off the board, so look them up at
+            #(0, 0) instead - running is already False for them anyway
+            safe_row = np.where(running, row, 0)
+            safe_col = np.where(running, col, 0)
+            running &= self.boards[games, safe_row, safe_col] == players
+            length += running
+
+        return length
+
+    def leaders(self):
+        """Returns a bool per game per player (0-based), True if that player
+        has the top score in that game.
+        """
+        return self.scores == self.scores.max(axis=1, keepdims=True)
+
+    def rescore(self):
+        """Recomputes the scores of every game from the boards alone (see
+        score_boards). Returns the new scores.
+        """
+        self.scores = score_boards(self.boards, self.num_players)
+        return self.scores
+
+    def game(self, index):
+        """Returns a ConnectMore with the same board, scores and turn as one
+        of the games in the batch (with no undo history).
+        """
+        game = gl.ConnectMore(self.num_players)
+        game.current_player = int(self.current_player[index])
+        game._squares = self.boards[index].tolist()
+        game.scores = self.scores[index].tolist()
+        game.empty_squares = int(self.empty_squares[index])
+        game.leaders = game.get_leaders()
+        return game
+
+
+#index tables to pull each line of squares out of a flattened board, so they
+#only get built once per board size: (height, width) -> list of arrays
+_line_indexes = {}
+
+
+def _get_line_indexes(height, width):
+    """Returns an array for each of the 4 directions holding the flat board
+    index (row * width + col) of the squares in every line running that way
+    (rows, columns and both sets of diagonals).
+
+    Lines are padded out to the same length with the index height * width,
+    which is an extra always-empty square tacked onto the end of the board.
+    """
+    key = (height, width)
+    if key in _line_indexes:
+        return _line_indexes[key]
+
+    empty = height * width
+
+    def line(row, col, direction):
+        squares = []
+        while 0 <= row < height and 0 <= col < width:
+            squares.append(row * width + col)
+            row += direction[0]
+            col += direction[1]
+        return squares
+
+    #the first square of every line in each direction
+    starts = [
+        ([(row, 0) for row in range(height)], [0, 1]),
+        ([(row, 0) for row in range(height)] +
+         [(0, col) for col in range(1, width)], [1, 1]),
+        ([(0, col) for col in range(width)], [1, 0]),
+        ([(row, width - 1) for row in range(height)] +
+         [(0, col) for col in range(width - 1)], [1, -1]),
+    ]
+
+    indexes = []
+    for firsts, direction in starts:
+        lines = [line(row, col, direction) for row, col in firsts]
+        length = max(len(squares) for squares in lines)
+        indexes.append(np.array(
+            [squares + [empty] * (length - len(squares)) for squares in lines]))
+
+    _line_indexes[key] = indexes
+    return indexes
+
+
+def score_boards(boards, num_players):
+    """Computes every player's score from the board(s) alone.
+
+    boards is either a single board or an array of boards, in the same
+    layout as ConnectMore._squares (board[row][col], 0 for an empty square
+    and 1 to num_players for a player's token).
+
+    Returns an array of scores with one entry per player (per board).
+
+    Every line of the board is cut out as a row of an array and padded with
+    an empty square at each end. A chain of tokens then starts where the
+    diff along a line is +1 and finishes where it's -1, and since both are
+    found in the same order the distance between the nth start and nth finish
+    is the length of the nth chain, which is looked up in CHAIN_LENGTH_SCORE.
+    """
+    boards = np.asarray(boards)
+    single = boards.ndim == 2
+    if single:
+        boards = boards[None]
+
+    num_boards, height, width = boards.shape
+    flat = np.concatenate(
+        [boards.reshape(num_boards, height * width),
+         np.zeros((num_boards, 1), dtype=boards.dtype)], axis=1)
+
+    chain_score = BatchConnectMore.CHAIN_LENGTH_SCORE
+    scores = np.zeros((num_boards, num_players), dtype=np.int64)
+
+    for index in _get_line_indexes(height, width):
+        lines = flat[:, index]
+        for player in range(1, num_players + 1):
+            tokens = np.pad(lines == player, [(0, 0), (0, 0), (1, 1)])
+            steps = np.diff(tokens.astype(np.int8), axis=-1)
+            board_num, line_num, starts = np.nonzero(steps == 1)
+            finishes = np.nonzero(steps == -1)[2]
+            scores[:, player - 1] += np.bincount(
+                board_num, weights=chain_score[finishes - starts],
+                minlength=num_boards).astype(np.int64)
+
+    return scores[0] if single else scores
@@ -0,0 +1,122 @@
+import unittest
+import game_logic as gl
+
+try:
+    import numpy as np
+    import game_batch as gb
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "NumPy isn't installed")
+class TestBatchConnectMore(unittest.TestCase):
+
+    def test_create_batch(self):
+        """It should create games with the same board size as ConnectMore."""
+        for num_players in range(2, 7):
+            batch = gb.BatchConnectMore(5, num_players)
+            game = gl.ConnectMore(num_players)
+            self.assertEqual((5, game.height, game.width), batch.boards.shape)
+            self.assertEqual((5, num_players), batch.scores.shape)
+            self.assertEqual([1] * 5, batch.current_player.tolist())
+            self.assertEqual([game.empty_squares] * 5,
+                             batch.empty_squares.tolist())
+
+    def test_play_matches_game_logic(self):
+        """It should give the same boards and scores as ConnectMore, game for game."""
+        rng = np.random.default_rng(3)
+        for num_players in range(2, 7):
+            batch = gb.BatchConnectMore(30, num_players)
+            games = [gl.ConnectMore(num_players) for i in range(30)]
+
+            while not batch.finished().all():
+                columns = batch.play_random(rng)
+                for game, col in zip(games, columns):
+                    if col > 0:
+                        game.play(int(col))
+
+                for index, game in enumerate(games):
+                    self.assertEqual(game, batch.game(index))
+
+            leaders = batch.leaders()
+            for index, game in enumerate(games):
+                self.assertEqual(game.leaders,
+                                 [p + 1 for p in np.flatnonzero(leaders[index])])
+
+    def test_play_skips_full_columns_and_finished_games(self):
+        """It should leave games alone when their column is full, invalid or
+        the game is over, and report which games were played.
+        """
+        batch = gb.BatchConnectMore(3, 2)
+        for i in range(6):
+            batch.play([1, 2, 3])
+        batch.empty_squares[2] = 0
+
+        played = batch.play([1, 9, 3])
+        self.assertEqual([False, False, False], played.tolist())
+        self.assertEqual([1, 1, 1], batch.current_player.tolist())
+
+        played = batch.play([2, 0, 3])
+        self.assertEqual([True, False, False], played.tolist())
+        self.assertEqual([2, 1, 1], batch.current_player.tolist())
+
+    def test_decided(self):
+        """It should match ConnectMore.decided, and with stop_decided set,
+        stop playing games once they're decided.
+        """
+        rng = np.random.default_rng(5)
+        for num_players in range(2, 7):
+            batch = gb.BatchConnectMore(30, num_players)
+            stopping = gb.BatchConnectMore(30, num_players, stop_decided=True)
+            while not batch.finished().all():
+                columns = batch.play_random(rng)
+                stopping.play(columns)
+
+                decided = batch.decided()
+                for index in range(30):
+                    game = batch.game(index)
+                    if game.empty_squares <= batch.DECIDED_SQUARES:
+                        self.assertEqual(game.decided(), decided[index])
+                    elif decided[index]:
+                        self.assertTrue(game.decided())
+
+            self.assertTrue(stopping.finished().all())
+            for index in range(30):
+                game = stopping.game(index)
+                self.assertTrue(game.decided())
+                self.assertEqual(batch.game(index).leaders, game.leaders)
+
+    def test_rescore(self):
+        """It should compute the same scores from the boards alone as were
+        built up one play at a time, for finished and unfinished games.
+        """
+        rng = np.random.default_rng(4)
+        for num_players in range(2, 7):
+            batch = gb.BatchConnectMore(50, num_players)
+            for turn in range(25):
+                batch.play_random(rng)
+            expected = batch.scores.copy()
+            self.assertEqual(expected.tolist(), batch.rescore().tolist())
+
+            while not batch.finished().all():
+                batch.play_random(rng)
+            expected = batch.scores.copy()
+            self.assertEqual(expected.tolist(), batch.rescore().tolist())
+
+    def test_score_boards_single_board(self):
+        """It should score a single board given as a list of rows."""
+        board = [
+            [1, 2, 2, 2, 2, 1],
+            [1, 1, 2, 1, 0, 2],
+            [1, 2, 1, 0, 0, 0],
+            [2, 0, 0, 1, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+        ]
+        points = gl.ConnectMore.CHAIN_LENGTH_SCORE
+        self.assertEqual([points[3] + points[4], points[4] + points[4]],
+                         gb.score_boards(board, 2).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
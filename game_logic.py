@@ -1,28 +1,8 @@
 import json
 import copy
+import random
 
-# Use a global variable to store copies of the previous state after each play.
-#
-# Note that this isn't a good idea - you couldn't use this on a real server
-# to host multiple games for instance. It's also messed up the state of my
-# unit tests because I do sometimes do multiple asserts in a test.
-#
-# I reverted to this for now because using an instance variable was equally bad
-# (or worse). Each call to play does:
-#   1. clone the current instance
-#   2. store the clone in history (makes 'undo' really simple to implement)
-#
-# So if history is an instance variable, it gets included in the cloning each
-# time and re-stored in history as the 'history' of that copy. This means that
-# each instance in history has it's own complete copy of the entire game's
-# history up to that point! Each subsequent call to play() recopies every
-# instance with their entire copy of history again, so history grows at an n^2
-# rate. After about 10 calls to play(), it starts getting VERY slow... about
-# 1 second to execute the 10th call, and doubles every play after that.
-#
-# TODO: To fix this, clone() needs to be changed to not re-copy history each
-# time, and then history can be made an instance variable again.
-history = []
+import scorers
 
 class ConnectMore:
 
@@ -38,26 +18,386 @@ class ConnectMore:
             CHAIN_LENGTH_SCORE[chain_length-1] +
             CHAIN_LENGTH_SCORE[chain_length-2])
 
-    def __init__(self, num_players):
-        if num_players < 2 or num_players > 6:
-            raise ValueError("Number of players must be between 2 and 6")
+    #the state of the game itself, which gets copied/pickled
+    _GAME_STATE = ("variant", "current_player", "num_players", "scores",
+                   "empty_squares", "width", "height", "_masks", "_heights",
+                   "_lines", "_hash", "_mirror_hash", "leaders", "_moves",
+                   "_redo")
+    #the lookup tables, which are shared with the variant (see
+    #_set_geometry)
+    _TABLES = ("_stride", "_board_mask", "_chain_scores", "_line_bits",
+               "_lines_through", "_scorers", "_zobrist", "_mirror_zobrist",
+               "_turn_keys", "_max_token_gain")
+    #searches make and copy a lot of these, so leave out the per-object
+    #__dict__ (subclasses that add their own attributes still get one)
+    __slots__ = _GAME_STATE + _TABLES
+
+    def __init__(self, num_players, variant=None):
+        """Starts a new game for num_players, on the standard board for that
+        many players unless a Variant (for the same number of players) is
+        given.
+        """
+        if variant is None:
+            if num_players < 2 or num_players > 6:
+                raise ValueError("Number of players must be between 2 and 6")
+            variant = Variant.standard(num_players)
+        elif variant.num_players != num_players:
+            raise ValueError("The variant is for " +
+                             str(variant.num_players) + " players")
+        #the variant holds the board size and all the lookup tables for it
+        self.variant = variant
 
         #players are 1-based indexed, '0' in a square means it's empty
         self.current_player = 1
         self.num_players = num_players
         self.scores = [0 for player in range(self.num_players)]
-        self.empty_squares = num_players * ConnectMore.TURNS_PER_PLAYER
-        self.width = ConnectMore.WIDTHS[num_players - 2]
-        self.height = ConnectMore.HEIGHTS[num_players - 2]
-
-        self._squares = [
-            [0 for each_column in list(range(self.width))]
-            for each_row in list(range(self.height))
-        ]
+        self.empty_squares = num_players * variant.turns_per_player
+        self.width = variant.width
+        self.height = variant.height
+
+        #the board is stored as a 'bitboard': one int per player with a bit
+        #set for each square holding that player's token, plus the number of
+        #tokens in each column (see _set_geometry for the bit layout)
+        self._masks = [0 for player in range(self.num_players)]
+        self._heights = [0 for each_column in range(self.width)]
+        #the same tokens again, laid out line by line (see _get_lines) so
+        #the tokens in any line through a square can be read off in one go
+        self._lines = [0 for player in range(self.num_players)]
+        self._set_geometry()
+
+        #a 'Zobrist' hash of the position (see _get_zobrist), kept up to date
+        #by play/undo/redo so positions can be compared/looked up cheaply,
+        #along with the hash of the position's mirror image (see
+        #canonical_key)
+        self._hash, self._mirror_hash = self._compute_hashes()
 
         #adding as an instance attribute so UIs can display leaderboard
         self.leaders = self.get_leaders()
 
+        #each play pushes a small record onto _moves so undo() can reverse it
+        #without keeping copies of the whole game around:
+        #  (col, row, player, per-direction score deltas, previous leaders)
+        #undo() moves the record over to _redo so redo() can re-apply it
+        self._moves = []
+        self._redo = []
+
+    def _set_geometry(self):
+        """Works out the bit layout of the board for the current width/height.
+
+        Squares are numbered column by column from the bottom left, with one
+        extra 'sentinel' bit at the top of each column that is never set:
+
+            bit = col * (height + 1) + row
+
+        Moving one square in any direction is then a fixed shift of the bit
+        number, and because of the sentinels a chain can never 'wrap' from
+        the top of one column to the bottom of the next.
+
+        The tables are all built by the game's Variant (and shared by every
+        game of that variant), so this just picks them up from there.
+        """
+        variant = self.variant
+        self._stride = variant._stride
+        #every square on the board (i.e. everything but the sentinels)
+        self._board_mask = variant._board_mask
+        self._chain_scores = variant.chain_scores
+        self._line_bits = variant._line_bits
+        self._lines_through = variant._lines_through
+        #a generated scorer for each square (see scorers.py)
+        self._scorers = variant._scorers
+        self._zobrist = variant._zobrist
+        self._mirror_zobrist = variant._mirror_zobrist
+        self._turn_keys = variant._turn_keys
+        self._max_token_gain = variant._max_token_gain
+
+    #ray tables are the same for every game with the same board size, so
+    #they're only built once and shared: (width, height) -> rays
+    #(moves are scored with the line tables below now, but the rays are
+    #still handy for walking out from a square, e.g. in benchmark.py)
+    _ray_tables = {}
+
+    @staticmethod
+    def _get_rays(width, height):
+        """Returns the ray table for a board size, building it on first use.
+
+        The table is indexed by bit number (see _set_geometry) and holds, for
+        each of the 4 directions, a pair of tuples with the bits of the squares
+        going forward and backward from that square, nearest first, stopping
+        at the edge of the board. Sentinel bits get no rays since tokens are
+        never played there.
+        """
+        key = (width, height)
+        if key in ConnectMore._ray_tables:
+            return ConnectMore._ray_tables[key]
+
+        stride = height + 1
+
+        #directions to check for chains from the last token played
+        # each pair has a forward [0] and backward [1]
+        directions = [
+            [[0, 1], [0, -1]], #right and left
+            [[1, 1], [-1, -1]], #diagonal
+            [[1, 0], [-1, 0]], #up and down
+            [[1, -1], [-1, 1]] #other diagonal
+        ]
+
+        def ray(row, col, step):
+            bits = []
+            row += step[0]
+            col += step[1]
+            while 0 <= row < height and 0 <= col < width:
+                bits.append(1 << (col * stride + row))
+                row += step[0]
+                col += step[1]
+            return tuple(bits)
+
+        rays = [() for bit in range(width * stride)]
+        for col in range(width):
+            for row in range(height):
+                rays[col * stride + row] = tuple(
+                    (ray(row, col, forward), ray(row, col, backward))
+                    for forward, backward in directions)
+
+        ConnectMore._ray_tables[key] = rays
+        return rays
+
+    #line tables are shared the same way: (width, height, chain scores) ->
+    #(line bits, lines through each square, scorers)
+    _line_tables = {}
+
+    @staticmethod
+    def _get_lines(width, height, chain_scores):
+        """Returns the line tables for a board size and scoring, building them
+        on first use.
+
+        Every line of squares on the board (each row, column and diagonal,
+        from edge to edge) gets its own run of bits in a 'line mask', so a
+        player's tokens in the line through a square are just a shift and a
+        mask away. The tables are indexed by bit number (see _set_geometry):
+          line bits: the square's bit in each of its 4 lines, OR'd together,
+            to add to or remove from a player's line mask
+          lines through: for each of the 4 directions (in the same order as
+            the ray tables), (offset of the line, mask for its length, score
+            table), where the score table is the one for the square's place
+            in the line (see _get_line_scores)
+          scorers: the generated scorer for each square (see scorers.py)
+        """
+        key = (width, height, chain_scores)
+        if key in ConnectMore._line_tables:
+            return ConnectMore._line_tables[key]
+
+        steps = [(0, 1), (1, 1), (1, 0), (1, -1)]
+        stride = height + 1
+        line_bits = [0 for bit in range(width * stride)]
+        lines_through = [[None] * len(steps) for bit in range(width * stride)]
+
+        def on_board(row, col):
+            return 0 <= row < height and 0 <= col < width
+
+        offset = 0
+        for direction, (row_step, col_step) in enumerate(steps):
+            for col in range(width):
+                for row in range(height):
+                    #lines start at the squares with nothing behind them
+                    if on_board(row - row_step, col - col_step):
+                        continue
+                    squares = []
+                    line_row, line_col = row, col
+                    while on_board(line_row, line_col):
+                        squares.append(line_col * stride + line_row)
+                        line_row += row_step
+                        line_col += col_step
+
+                    length_mask = (1 << len(squares)) - 1
+                    scores = ConnectMore._get_line_scores(len(squares),
+                                                          chain_scores)
+                    for place, bit in enumerate(squares):
+                        line_bits[bit] |= 1 << (offset + place)
+                        lines_through[bit][direction] = (
+                            offset, length_mask, scores[place])
+                    offset += len(squares)
+
+        lines_through = [tuple(lines) for lines in lines_through]
+        line_scores = lambda length: ConnectMore._get_line_scores(
+            length, chain_scores)
+        tables = (line_bits, lines_through, scorers.get_scorers(
+            width, height, lines_through, line_scores))
+        ConnectMore._line_tables[key] = tables
+        return tables
+
+    #line score tables only depend on the length of the line (and the chain
+    #scores): (length, chain scores) -> score table for each place in the
+    #line
+    _line_score_tables = {}
+
+    @staticmethod
+    def _get_line_scores(length, chain_scores):
+        """Returns the score tables for a line of the given length, with the
+        given score for each chain length, building them on first use.
+
+        There's a table for each place in the line, indexed by the pattern of
+        a player's tokens in the line (bit i set if they have a token in the
+        i'th square) once they've just played in that place, giving how much
+        the chains through that place add to their score: the new chain's
+        score less the scores of the chains it joined.
+        """
+        key = (length, chain_scores)
+        if key in ConnectMore._line_score_tables:
+            return ConnectMore._line_score_tables[key]
+
+        chain_score = chain_scores
+        tables = []
+        for place in range(length):
+            table = [0] * (1 << length)
+            for pattern in range(1 << length):
+                if not pattern >> place & 1:
+                    continue
+                forward_length = 0
+                while pattern >> (place + forward_length + 1) & 1:
+                    forward_length += 1
+                back_length = 0
+                while (back_length < place and
+                       pattern >> (place - back_length - 1) & 1):
+                    back_length += 1
+                table[pattern] = (
+                    chain_score[forward_length + back_length + 1] -
+                    chain_score[forward_length] -
+                    chain_score[back_length])
+            tables.append(table)
+
+        ConnectMore._line_score_tables[key] = tables
+        return tables
+
+    #zobrist keys are random but have to be the same for every game with the
+    #same board size (and in every process), so they're generated once from a
+    #fixed seed: (width, height) -> (square keys, mirrored square keys,
+    #turn keys)
+    _zobrist_tables = {}
+
+    @staticmethod
+    def _get_zobrist(width, height):
+        """Returns the Zobrist hash keys for a board size, generating them on
+        first use.
+
+        There's a random 64 bit key for every player's token in every square
+        (indexed [player-1][bit number], see _set_geometry) and one for each
+        player's turn. A position's hash is all the keys for the tokens on the
+        board and the current player's turn XOR'd together, so adding or
+        removing a token only takes one XOR (and one more to change turns).
+
+        The mirrored square keys are the same keys flipped left to right, i.e.
+        the key for a token in column c of the mirror image of the board.
+        """
+        key = (width, height)
+        if key in ConnectMore._zobrist_tables:
+            return ConnectMore._zobrist_tables[key]
+
+        rng = random.Random("zobrist " + str(width) + "x" + str(height))
+        num_bits = width * (height + 1)
+        num_players = len(ConnectMore.WIDTHS) + 1
+        square_keys = [
+            [rng.getrandbits(64) for bit in range(num_bits)]
+            for player in range(num_players)
+        ]
+        turn_keys = [rng.getrandbits(64) for player in range(num_players)]
+
+        stride = height + 1
+        mirror_keys = [
+            [keys[(width - 1 - bit // stride) * stride + bit % stride]
+             for bit in range(num_bits)]
+            for keys in square_keys
+        ]
+
+        ConnectMore._zobrist_tables[key] = (square_keys, mirror_keys,
+                                            turn_keys)
+        return square_keys, mirror_keys, turn_keys
+
+    #the most points one token can score only depends on the board size
+    #(and the chain scores): (width, height, chain scores) -> points
+    _max_token_gains = {}
+
+    @staticmethod
+    def _get_max_token_gain(width, height, chain_scores):
+        """Returns the most points a single token can ever score on a board
+        size, with the given score for each chain length.
+
+        In each direction, a token scores by joining the chains on either
+        side of it (forward and back tokens long) into one longer chain, so
+        the most it can score that way is the biggest jump in
+        chain_scores from joining 2 chains that fit on the longest line
+        in that direction. Going up and down, there's never anything above a
+        new token, so that's just the biggest step from one length to the
+        next.
+        """
+        key = (width, height, chain_scores)
+        if key in ConnectMore._max_token_gains:
+            return ConnectMore._max_token_gains[key]
+
+        chain_score = chain_scores
+
+        def best_join(line_length, both_sides):
+            best = 0
+            for length in range(1, line_length + 1):
+                for back in range(length):
+                    forward = length - 1 - back
+                    if forward == 0 or both_sides:
+                        best = max(best, chain_score[length] -
+                                   chain_score[forward] - chain_score[back])
+            return best
+
+        diagonal = min(width, height)
+        gain = (best_join(width, True) + best_join(height, False) +
+                2 * best_join(diagonal, True))
+        ConnectMore._max_token_gains[key] = gain
+        return gain
+
+    def _compute_hashes(self):
+        """Computes the position's Zobrist hash and its mirror image's hash
+        from scratch.
+        """
+        position_hash = self._turn_keys[self.current_player-1]
+        mirror_hash = position_hash
+        for player, mask in enumerate(self._masks):
+            keys = self._zobrist[player]
+            mirror_keys = self._mirror_zobrist[player]
+            for bit in range(len(keys)):
+                if mask >> bit & 1:
+                    position_hash ^= keys[bit]
+                    mirror_hash ^= mirror_keys[bit]
+        return position_hash, mirror_hash
+
+    def position_key(self):
+        """Returns a 64 bit hash of the position (the tokens on the board and
+        whose turn it is), which is kept up to date as the game is played so
+        this doesn't cost anything.
+
+        NOTE: different positions can have the same key, though it's very
+        unlikely (about 1 in 2^64 for any given pair of positions).
+        """
+        return self._hash
+
+    def canonical_key(self):
+        """Returns the same key for a position and its mirror image (the
+        board flipped left to right, which always has the same scores), so
+        caches of positions only need to store one of them: the smaller of
+        the position's key and its mirror image's.
+
+        When is_mirrored() is True, the key is the mirror image's, so any
+        column stored with it has to be flipped with mirror_col().
+        """
+        return min(self._hash, self._mirror_hash)
+
+    def is_mirrored(self):
+        """Returns True if canonical_key() is the key of the mirror image
+        of the position rather than the position itself.
+        """
+        return self._mirror_hash < self._hash
+
+    def mirror_col(self, col_num):
+        """Returns the column (1 to width) that's in the same place as
+        col_num in the mirror image of the board.
+        """
+        return self.width + 1 - col_num
 
     def play(self, col_num):
         """Drops the current player's 'Token' in the corresponding column.
@@ -72,28 +412,169 @@ class ConnectMore:
             raise GameOverError()
 
         col_num -= 1
-        if col_num >= self.width:
+        if not 0 <= col_num < self.width:
             raise ValueError("Invalid Column Number")
 
-        history.append(self.clone())
+        row_num = self._heights[col_num]
+        if row_num == self.height:
+            raise FullColumnError()
+
+        player = self.current_player
+        next_player = player % self.num_players + 1
+        previous_leaders = self.leaders
+        bit = col_num * self._stride + row_num
+        self._masks[player-1] |= 1 << bit
+        self._lines[player-1] |= self._line_bits[bit]
+        self._heights[col_num] = row_num + 1
+        turn_keys = self._turn_keys[player-1] ^ self._turn_keys[next_player-1]
+        self._hash ^= self._zobrist[player-1][bit] ^ turn_keys
+        self._mirror_hash ^= self._mirror_zobrist[player-1][bit] ^ turn_keys
+        deltas = self._update_scores(row_num, col_num)
+
+        self._moves.append((col_num, row_num, player, deltas,
+                            previous_leaders))
+        #a new play starts a new line of history, so nothing is left to redo
+        if self._redo:
+            self._redo = []
+
+        self.current_player = next_player
+        self.empty_squares -= 1
 
-        for row_num, row in enumerate(self._squares):
-            #go through each row until there's an empty square in the column
-            if row[col_num] == 0:
-                row[col_num] = self.current_player
-                self._update_scores(row_num, col_num)
-                break
-            if row_num == self.height - 1:
-                raise FullColumnError()
+    def _set_turn(self, player):
+        """Makes it the given player's turn without playing a token.
 
-        self.current_player = self.current_player % self.num_players + 1
-        self.empty_squares -= 1
+        NOTE: this isn't part of the rules, it's for searches that look at
+        moves made out of turn (see ai.BestReplyPlayer). Undo doesn't know
+        about it, so whoever changes the turn has to change it back.
+        """
+        turn_keys = (self._turn_keys[self.current_player-1] ^
+                     self._turn_keys[player-1])
+        self._hash ^= turn_keys
+        self._mirror_hash ^= turn_keys
+        self.current_player = player
+
+    def legal_moves(self):
+        """Returns the column numbers (1 to width) that can be played in, i.e.
+        the columns that aren't full (none at all if the game is over).
+        """
+        if self.empty_squares <= 0:
+            return []
+        return [col + 1 for col, height in enumerate(self._heights)
+                if height < self.height]
+
+    def tokens_left(self, player, moves=None):
+        """Returns how many more tokens the given player (1 to num_players)
+        gets to play before the game is over, or in the next 'moves' moves
+        if that's given.
+        """
+        remaining = self.empty_squares
+        if moves is not None and moves < remaining:
+            remaining = moves
+        turns_away = (player - self.current_player) % self.num_players
+        return ((remaining + self.num_players - 1 - turns_away) //
+                self.num_players)
+
+    def max_gain(self, player, moves=None):
+        """Returns an upper bound on how many more points the given player
+        can score before the game is over (or in the next 'moves' moves):
+        their tokens left times the most a single token can ever score.
+
+        It's cheap rather than tight (see max_final_score for a tighter
+        bound), but it's always safe to use to rule things out, e.g. in a
+        search.
+        """
+        return self.tokens_left(player, moves) * self._max_token_gain
+
+    def max_final_score(self, player):
+        """Returns an upper bound on the given player's score at the end of
+        the game.
+
+        As well as max_gain(), this checks the chains the player could still
+        make: tokens never lose points, so the player can't end up with more
+        than they'd have if every empty square was filled with their tokens,
+        i.e. if all their chains were extended as far as the other players'
+        tokens (and the edges of the board) allow. That's a lot tighter
+        towards the end of the game.
+        """
+        score = self.scores[player-1] + self.max_gain(player)
+        others = 0
+        for other_player, mask in enumerate(self._masks):
+            if other_player != player - 1:
+                others |= mask
+        return min(score, self._board_score(self._board_mask & ~others))
+
+    def decided(self):
+        """Returns True if the game is over, or one player is in the lead
+        and none of the others can catch up with them (even to tie) however
+        the rest of the game goes.
+
+        NOTE: this is opt-in, games don't stop by themselves when they're
+        decided. It's for things like simulations that want to save time by
+        not playing out games that are already won.
+        """
+        if self.empty_squares <= 0:
+            return True
+        if len(self.leaders) > 1:
+            return False
+        top_score = self.scores[self.leaders[0]-1]
+        for player in range(1, self.num_players + 1):
+            if (player != self.leaders[0] and
+                    self.max_final_score(player) >= top_score):
+                return False
+        return True
 
     def undo(self):
-        """Reverts the game back to its prior state before the last play."""
-        if(len(history) > 0):
-            self.__dict__.update(history[-1].__dict__)
-            history.pop()
+        """Reverts the game back to its prior state before the last play.
+
+        Does nothing if there's nothing to undo.
+        """
+        if not self._moves:
+            return
+
+        move = self._moves.pop()
+        col, row, player, deltas, previous_leaders = move
+
+        bit = col * self._stride + row
+        self._masks[player-1] ^= 1 << bit
+        self._lines[player-1] ^= self._line_bits[bit]
+        self._heights[col] = row
+        turn_keys = (self._turn_keys[player-1] ^
+                     self._turn_keys[self.current_player-1])
+        self._hash ^= self._zobrist[player-1][bit] ^ turn_keys
+        self._mirror_hash ^= self._mirror_zobrist[player-1][bit] ^ turn_keys
+        self.scores[player-1] -= sum(deltas)
+        self.leaders = previous_leaders
+        self.current_player = player
+        self.empty_squares += 1
+        self._redo.append(move)
+
+    def redo(self):
+        """Re-applies the last play that was undone.
+
+        Does nothing if there's nothing to redo (i.e. nothing has been undone,
+        or a new play was made since the last undo).
+        """
+        if not self._redo:
+            return
+
+        move = self._redo.pop()
+        col, row, player, deltas, previous_leaders = move
+
+        #the score deltas were recorded when the move was first played, so
+        #there's no need to re-scan the board for chains
+        next_player = player % self.num_players + 1
+        bit = col * self._stride + row
+        self._masks[player-1] |= 1 << bit
+        self._lines[player-1] |= self._line_bits[bit]
+        self._heights[col] = row + 1
+        turn_keys = self._turn_keys[player-1] ^ self._turn_keys[next_player-1]
+        self._hash ^= self._zobrist[player-1][bit] ^ turn_keys
+        self._mirror_hash ^= self._mirror_zobrist[player-1][bit] ^ turn_keys
+        self.scores[player-1] += sum(deltas)
+        self.leaders = self.get_leaders()
+        self.current_player = next_player
+        self.empty_squares -= 1
+        self._moves.append(move)
 
     def _update_scores(self, row, col):
         """Updates the current score based on the last token played (at row, col).
@@ -101,57 +582,118 @@ class ConnectMore:
         NOTE: this should not be called from outside the expected order in
         play method as it assumes this is a newly played token and only updates
         the score from that. It makes no effort to compute the correct score
-        from the rest of board state.
-        """
+        from the rest of board state (see rescore() for that).
 
-        #directions to check for chains from the last token played
-        # each pair has a forward [0] and backward [1]
-        directions = [
-            [[0, 1], [0, -1]], #right and left
-            [[1, 1], [-1, -1]], #diagonal
-            [[1, 0], [-1, 0]], #up and down
-            [[1, -1], [-1, 1]] #other diagonal
-        ]
-
-        def is_match(row, col, token):
-            """Checks is a square is inside the board and contains a token."""
-            if 0 <= row < self.height and 0 <= col < self.width:
-                return token == self._squares[row][col]
-            return False
-
-        def get_chain_length(row, col, direction, count):
-            """Recursively checks how long a chain of matching tokens is."""
-            token = self._squares[row][col]
-            next_row = row + direction[0]
-            next_col = col + direction[1]
-            if is_match(next_row, next_col, token):
-                return get_chain_length(next_row, next_col, direction, count + 1)
-            else:
-                return count
-
-        #algorithm:
-        #for each direction to search
-        #  determine the chain length forward from row, col
-        #  determine the chain length backward from row, col
-        #  subtract score for the previous chain lengths
-        #  add score for new total length
-
-        for direction in directions:
-            forward_length = 0
-            back_length = 0
-
-            forward_length = get_chain_length(row, col, direction[0], 0)
-            back_length = get_chain_length(row, col, direction[1], 0)
-
-            self.scores[self.current_player-1] -= \
-                self.CHAIN_LENGTH_SCORE[forward_length]
-            self.scores[self.current_player-1] -= \
-                self.CHAIN_LENGTH_SCORE[back_length]
-            self.scores[self.current_player-1] += \
-                self.CHAIN_LENGTH_SCORE[forward_length + back_length + 1]
+        Returns the score change for each of the 4 directions so the play can
+        be undone without re-scanning the board.
+        """
+        #each line's score table gives the score change straight from the
+        #pattern of the player's tokens in the line (see _get_lines), which
+        #the square's generated scorer looks up for all 4 lines at once
+        deltas = self._scorers[col * self._stride + row](
+            self._lines[self.current_player-1])
+        self.scores[self.current_player-1] += sum(deltas)
 
         #update leaders so web UI doesn't need another ajax call when game over
         self.leaders = self.get_leaders()
+        return deltas
+
+    @property
+    def _squares(self):
+        """The board as a list of rows (bottom row first), each a list of the
+        token in each square. This is the format the UIs use.
+        """
+        squares = [
+            [0 for each_column in range(self.width)]
+            for each_row in range(self.height)
+        ]
+        for player, mask in enumerate(self._masks):
+            for col in range(self.width):
+                for row in range(self._heights[col]):
+                    if mask >> (col * self._stride + row) & 1:
+                        squares[row][col] = player + 1
+        return squares
+
+    @_squares.setter
+    def _squares(self, squares):
+        """Loads the board from a list of rows in the same format as above.
+
+        The width and height are taken from the size of the list, and the undo
+        history is cleared. Scores aren't touched, but the position's hash is
+        recomputed (for the current player, so set that first).
+
+        A board of a different size switches the game to a Variant of that
+        size (keeping the chain scores, if they go up to long enough chains).
+        """
+        height = len(squares)
+        width = len(squares[0])
+        variant = self.variant
+        if (width, height) != (variant.width, variant.height):
+            chain_scores = variant.chain_scores
+            if len(chain_scores) <= max(width, height):
+                chain_scores = None
+            self.variant = Variant(width, height, self.num_players,
+                                   chain_scores=chain_scores)
+        self.height = height
+        self.width = width
+        self._set_geometry()
+
+        self._masks = [0 for player in range(self.num_players)]
+        self._lines = [0 for player in range(self.num_players)]
+        self._heights = [0 for each_column in range(self.width)]
+        for row, tokens in enumerate(squares):
+            for col, token in enumerate(tokens):
+                if token != 0:
+                    bit = col * self._stride + row
+                    self._masks[token-1] |= 1 << bit
+                    self._lines[token-1] |= self._line_bits[bit]
+                    self._heights[col] = row + 1
+
+        self._hash, self._mirror_hash = self._compute_hashes()
+        self._moves = []
+        self._redo = []
+
+    def rescore(self):
+        """Recomputes every player's score from scratch using only the board,
+        e.g. after loading a position that wasn't reached by calling play().
+
+        Returns the new scores.
+        """
+        self.scores = [self._board_score(mask) for mask in self._masks]
+        self.leaders = self.get_leaders()
+        return self.scores
+
+    def _board_score(self, mask):
+        """Returns the total score of all the chains in a player's mask.
+
+        Rather than walking the chains one at a time, this finds every chain
+        on the board at once, one length at a time:
+          'runs' starts with the first token of every chain in a direction
+            (a token with no matching token just behind it), which all score
+            the value of length 1 (nothing in the standard scores)
+          and keeps only the chains that are at least 1 token longer each time
+            around the loop, by checking the token 'length' squares ahead
+          so when there are N chains of at least length L left, each of them
+            scores the difference between the value of length L and L-1
+        """
+        chain_score = self._chain_scores
+        stride = self._stride
+        score = 0
+
+        for shift in (stride, stride + 1, 1, stride - 1):
+            runs = mask & ~(mask << shift)
+            if chain_score[1]:
+                score += chain_score[1] * bin(runs).count("1")
+            length = 1
+            while True:
+                runs &= mask >> (length * shift)
+                if not runs:
+                    break
+                length += 1
+                score += ((chain_score[length] - chain_score[length-1]) *
+                          bin(runs).count("1"))
+
+        return score
 
     def get_leaders(self):
         """Returns the human-displayable player numbers with the highest scores
@@ -185,13 +727,208 @@ class ConnectMore:
         return result
 
     def to_json(self):
-        return json.dumps(self.__dict__)
+        """Returns the game state the UIs need as a JSON string."""
+        return json.dumps(self._state())
+
+    def _state(self):
+        """Returns the board state as a dict (leaving out the undo history)."""
+        return {
+            "current_player": self.current_player,
+            "num_players": self.num_players,
+            "scores": self.scores,
+            "empty_squares": self.empty_squares,
+            "width": self.width,
+            "height": self.height,
+            "_squares": self._squares,
+            "leaders": self.leaders,
+        }
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        """Games are equal if their variants, boards and scores are,
+        regardless of how they got there (i.e. undo/redo history isn't
+        compared).
+
+        The position hashes are compared first, so different positions (the
+        usual case) are told apart without looking at the boards.
+        """
+        if not isinstance(other, ConnectMore):
+            return NotImplemented
+        return (self._hash == other._hash and
+                self.current_player == other.current_player and
+                self._masks == other._masks and
+                self.scores == other.scores and
+                self.empty_squares == other.empty_squares and
+                self.variant == other.variant)
+
+    def __hash__(self):
+        #equal games always have the same board and player to move, so the
+        #same hash
+        return self._hash
+
+    def __getstate__(self):
+        """Leaves the shared lookup tables out when a game is copied or
+        pickled (e.g. to send to another process), since they come with the
+        variant.
+        """
+        state = {name: getattr(self, name)
+                 for name in ConnectMore._GAME_STATE}
+        #plus anything a subclass added
+        state.update(getattr(self, "__dict__", {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._set_geometry()
 
     def clone(self):
-        return copy.deepcopy(self)
+        """Returns a copy of the game (undo/redo history included) that can
+        be played independently.
+
+        Only the board, the scores and the history lists are copied: the
+        lookup tables are shared, and the move records in the history are
+        tuples (holding lists that are never changed in place) so they can
+        be shared too. Subclasses' own attributes are deep copied.
+        """
+        game = object.__new__(type(self))
+        for name in ConnectMore.__slots__:
+            setattr(game, name, getattr(self, name))
+        #the state that's changed in place needs copies of its own
+        game.scores = self.scores[:]
+        game._masks = self._masks[:]
+        game._heights = self._heights[:]
+        game._lines = self._lines[:]
+        game._moves = self._moves[:]
+        game._redo = self._redo[:]
+
+        extra = getattr(self, "__dict__", None)
+        if extra:
+            game.__dict__.update(copy.deepcopy(extra))
+        return game
+
+
+class Variant:
+    """A version of the game: the board's width and height, the number of
+    players, how many turns each player gets (by default as many as fill
+    the board between them) and the score for a chain of each length
+    (chain_scores[length], by default CHAIN_LENGTH_SCORE, carried on the
+    same way for boards with longer lines).
+
+    A variant builds all the lookup tables its games need when it's made
+    (or picks them up from another variant with the same board and scores),
+    so every game made from it shares them and starting a game costs
+    nothing extra. Variants can't be changed once they're made.
+
+    Start a game with new_game(). The standard variants (the ones
+    ConnectMore(num_players) uses) come from Variant.standard().
+    """
+
+    #num_players -> the standard variant
+    _standard = {}
+
+    #the search players' transposition tables (see transposition.py) pack
+    #a column into 4 bits and a value into 16 bits, so bigger boards and
+    #scores can't be searched
+    MAX_WIDTH = 15
+    MAX_SCORE = (1 << 15) - 1
+
+    def __init__(self, width, height, num_players, turns_per_player=None,
+                 chain_scores=None):
+        if num_players < 2 or num_players > 6:
+            raise ValueError("Number of players must be between 2 and 6")
+        if width < 1 or height < 1:
+            raise ValueError("The board needs at least 1 row and 1 column")
+        if width > Variant.MAX_WIDTH:
+            raise ValueError("The board can't be more than " +
+                             str(Variant.MAX_WIDTH) + " columns wide")
+        if turns_per_player is None:
+            turns_per_player = width * height // num_players
+        if not 1 <= turns_per_player * num_players <= width * height:
+            raise ValueError("The board doesn't have a square for every turn")
+
+        longest = max(width, height)
+        if chain_scores is None:
+            chain_scores = list(ConnectMore.CHAIN_LENGTH_SCORE)
+            while len(chain_scores) <= longest:
+                chain_scores.append(chain_scores[-1] + chain_scores[-2])
+        if len(chain_scores) <= longest:
+            raise ValueError("chain_scores needs a score for every chain "
+                             "length up to " + str(longest))
+        if chain_scores[0] != 0:
+            raise ValueError("A chain of length 0 can't score anything")
+        #a token can join a chain of a on one side to a chain of b on the
+        #other, and the score bounds (see max_final_score) rely on that
+        #never losing points
+        for length in range(1, longest + 1):
+            for back in range(length):
+                forward = length - 1 - back
+                if (chain_scores[length] <
+                        chain_scores[forward] + chain_scores[back]):
+                    raise ValueError("Joining chains can't lose points, "
+                                     "but a chain of " + str(length) +
+                                     " scores less than " + str(forward) +
+                                     " and " + str(back))
+
+        self.width = width
+        self.height = height
+        self.num_players = num_players
+        self.turns_per_player = turns_per_player
+        self.chain_scores = tuple(chain_scores)
+
+        #the tables (see ConnectMore._set_geometry for the bit layout)
+        self._stride = height + 1
+        column_mask = (1 << height) - 1
+        self._board_mask = sum(column_mask << (col * self._stride)
+                               for col in range(width))
+        self._line_bits, self._lines_through, self._scorers = (
+            ConnectMore._get_lines(width, height, self.chain_scores))
+        self._zobrist, self._mirror_zobrist, self._turn_keys = (
+            ConnectMore._get_zobrist(width, height))
+        self._max_token_gain = ConnectMore._get_max_token_gain(
+            width, height, self.chain_scores)
+        if self._max_token_gain * turns_per_player > Variant.MAX_SCORE:
+            raise ValueError("Scores could go over " +
+                             str(Variant.MAX_SCORE))
+
+    @staticmethod
+    def standard(num_players):
+        """Returns the standard variant for the number of players."""
+        if num_players not in Variant._standard:
+            if num_players < 2 or num_players > 6:
+                raise ValueError("Number of players must be between 2 and 6")
+            Variant._standard[num_players] = Variant(
+                ConnectMore.WIDTHS[num_players - 2],
+                ConnectMore.HEIGHTS[num_players - 2], num_players,
+                ConnectMore.TURNS_PER_PLAYER)
+        return Variant._standard[num_players]
+
+    def new_game(self):
+        return ConnectMore(self.num_players, self)
+
+    def _key(self):
+        return (self.width, self.height, self.num_players,
+                self.turns_per_player, self.chain_scores)
+
+    def __eq__(self, other):
+        return isinstance(other, Variant) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "Variant(%d, %d, %d, %d, %r)" % self._key()
+
+    def __reduce__(self):
+        #pickled as just the settings, the tables are built (or looked up)
+        #again when it's loaded
+        return Variant, self._key()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
 
 class FullColumnError(Exception):
     pass
@@ -1,3 +1,5 @@
+import pickle
+import random
 import unittest
 import game_logic as gl
 
@@ -6,9 +8,6 @@ class TestGameLogic(unittest.TestCase):
     def setUp(self):
         pass
 
-    def tearDown(self):
-        gl.history = [] # have to reset history because it's using a global :(
-
     def test_create_game_invalid_input(self):
         """It should throw an error if the number of players is < 2 or > 6."""
         test_nums = (0, 1, 7)
@@ -35,6 +34,7 @@ class TestGameLogic(unittest.TestCase):
             #don't test 'private' variables like _squares
             #but do check there's the right number of columns
             self.assertRaises(ValueError, game.play, game.width + 1)
+            self.assertRaises(ValueError, game.play, 0)
             self.assertEqual(None, game.play(game.width))
 
     def test_play(self):
@@ -117,6 +117,35 @@ class TestGameLogic(unittest.TestCase):
         game.play(1)
         self.assertEqual([13, 8], game.scores)
 
+    def test_play_chains_do_not_wrap(self):
+        """It should not join chains across the top of one column and the
+        bottom of the next, or across the ends of rows.
+        """
+        game = gl.ConnectMore(2)
+        game._squares = [
+            [2, 1, 0, 0, 0, 1], #this is actually the bottom row
+            [2, 1, 0, 0, 0, 1],
+            [2, 0, 0, 0, 0, 1],
+            [1, 0, 0, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+        ]
+        game.play(2)
+        self.assertEqual([1, 0], game.scores)
+        self.assertRaises(gl.FullColumnError, game.play, 1)
+
+    def test_play_scores_match_rescore(self):
+        """The line pattern tables should score every move on every board
+        size the same as scoring the whole board from scratch.
+        """
+        rng = random.Random(1)
+        for num_players in range(2, 7):
+            game = gl.ConnectMore(num_players)
+            while game.empty_squares > 0:
+                game.play(rng.choice(game.legal_moves()))
+                self.assertEqual(game.scores, [game._board_score(mask)
+                                               for mask in game._masks])
+
     def test_game_over(self):
         """It should throw a GameOverError when all squares are full."""
         game = gl.ConnectMore(4)
@@ -138,6 +167,35 @@ class TestGameLogic(unittest.TestCase):
         ]
         self.assertEqual(expected_scores, game.scores)
 
+    def test_rescore(self):
+        """It should compute the same scores from the board alone as were
+        built up one play at a time.
+        """
+        plays = [1, 1, 2, 2, 3, 3, 4, 5, 5, 5, 4, 4, 6, 6, 6, 6, 4, 3, 2]
+        game = gl.ConnectMore(2)
+        for col in plays:
+            game.play(col)
+        expected = list(game.scores)
+
+        game.scores = [0, 0]
+        self.assertEqual(expected, game.rescore())
+        self.assertEqual(expected, game.scores)
+        self.assertEqual(game.get_leaders(), game.leaders)
+
+    def test_rescore_loaded_board(self):
+        """It should score a board that was loaded rather than played."""
+        game = gl.ConnectMore(2)
+        game._squares = [
+            [1, 2, 2, 2, 2, 1], #this is actually the bottom row
+            [1, 1, 2, 1, 0, 2],
+            [1, 2, 1, 0, 0, 0],
+            [2, 0, 0, 1, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+        ]
+        points = game.CHAIN_LENGTH_SCORE
+        self.assertEqual([points[3] + points[4], points[4] + points[4]], game.rescore())
+
     def test_get_leaders(self):
         """It should return a list of the player(s) with the top score."""
         game = gl.ConnectMore(6)
@@ -175,6 +233,54 @@ class TestGameLogic(unittest.TestCase):
         game1.play(2)
         self.assertEqual(game1, game2)
 
+    def test_clone_history(self):
+        """A clone should have its own copy of the undo/redo history, and
+        leave the shared tables shared.
+        """
+        game1 = gl.ConnectMore(3)
+        for col in [1, 2, 2, 3, 1]:
+            game1.play(col)
+        game1.undo()
+        game2 = game1.clone()
+        self.assertFalse(hasattr(game2, "__dict__"))
+        self.assertIs(game1._scorers, game2._scorers)
+        game2.undo()
+        game2.undo()
+        self.assertEqual(4, len(game1._moves))
+        game1.redo()
+        game2.redo()
+        game2.redo()
+        game2.redo()
+        self.assertEqual(game1, game2)
+        self.assertEqual(game1._moves, game2._moves)
+
+    def test_clone_every_slot(self):
+        """A clone should have every attribute set, with the same values."""
+        game = gl.Variant(15, 10, 3).new_game()
+        game.play(2)
+        copied = game.clone()
+        for name in gl.ConnectMore.__slots__:
+            self.assertTrue(hasattr(copied, name), name)
+            self.assertEqual(getattr(game, name), getattr(copied, name))
+        self.assertEqual(set(gl.ConnectMore.__slots__),
+                         set(gl.ConnectMore._GAME_STATE +
+                             gl.ConnectMore._TABLES))
+
+    def test_eq_hash(self):
+        """Equal games should have equal hashes, however they got there."""
+        game1 = gl.ConnectMore(2)
+        game2 = gl.ConnectMore(2)
+        for col in [1, 2, 3, 4]:
+            game1.play(col)
+        for col in [3, 4, 1, 2]:
+            game2.play(col)
+        self.assertEqual(game1, game2)
+        self.assertEqual(hash(game1), hash(game2))
+        self.assertEqual(1, len({game1, game2}))
+        game2.scores[0] += 1
+        self.assertNotEqual(game1, game2)
+        self.assertNotEqual(game1, "not a game")
+
     def test_undo_nothing(self):
         """It should do nothing if there's nothing to undo."""
         game = gl.ConnectMore(2)
@@ -219,5 +325,276 @@ class TestGameLogic(unittest.TestCase):
             self.assertEqual(previous_states[-1], game)
             previous_states.pop()
 
+    def test_undo_independent_games(self):
+        """It should only undo plays made in the same game."""
+        game1 = gl.ConnectMore(2)
+        game2 = gl.ConnectMore(2)
+        game1.play(1)
+        game2.play(2)
+        game2.play(3)
+
+        game1.undo()
+        self.assertEqual(gl.ConnectMore(2), game1)
+        self.assertEqual(2, game2._squares[0][2])
+
+    def test_redo_nothing(self):
+        """It should do nothing if there's nothing to redo."""
+        game = gl.ConnectMore(2)
+        game.play(1)
+        expected = game.clone()
+        game.redo()
+        self.assertEqual(expected, game)
+
+    def test_redo(self):
+        """It should re-apply undone plays in order, restoring scores and leaders."""
+        plays = [1, 1, 2, 2, 3, 3, 4, 5, 5, 5, 4, 4]
+        game = gl.ConnectMore(2)
+        states = []
+        for col in plays:
+            game.play(col)
+            states.append(game.clone())
+
+        for col in plays:
+            game.undo()
+        self.assertEqual(gl.ConnectMore(2), game)
+
+        for state in states:
+            game.redo()
+            self.assertEqual(state, game)
+            self.assertEqual(state.leaders, game.leaders)
+
+    def test_redo_cleared_by_play(self):
+        """It should discard undone plays once a new play is made."""
+        game = gl.ConnectMore(2)
+        game.play(1)
+        game.play(2)
+        game.undo()
+        game.play(3)
+        expected = game.clone()
+        game.redo()
+        self.assertEqual(expected, game)
+
+    def test_position_key(self):
+        """It should give the same key for the same position however it was
+        reached, and keep it up to date through play, undo and redo.
+        """
+        game1 = gl.ConnectMore(3)
+        game2 = gl.ConnectMore(3)
+        self.assertEqual(game1.position_key(), game2.position_key())
+
+        keys = [game1.position_key()]
+        for col in [1, 2, 3, 4, 5, 6]:
+            game1.play(col)
+            keys.append(game1.position_key())
+        self.assertEqual(len(keys), len(set(keys)))
+
+        #same tokens, different order
+        for col in [4, 2, 3, 1, 5, 6]:
+            game2.play(col)
+        self.assertNotEqual(game1._moves, game2._moves)
+        self.assertEqual(game1.position_key(), game2.position_key())
+        self.assertEqual(hash(game1), hash(game2))
+
+        for key in reversed(keys[:-1]):
+            game1.undo()
+            self.assertEqual(key, game1.position_key())
+        for key in keys[1:]:
+            game1.redo()
+            self.assertEqual(key, game1.position_key())
+
+    def test_position_key_loaded_board(self):
+        """It should compute the key for a board that was loaded."""
+        game1 = gl.ConnectMore(2)
+        for col in [4, 4, 5, 3]:
+            game1.play(col)
+        game2 = gl.ConnectMore(2)
+        game2._squares = game1._squares
+        self.assertEqual(game1.position_key(), game2.position_key())
+
+    def test_canonical_key(self):
+        """It should give a position and its mirror image the same canonical
+        key, and keep it up to date through play, undo and redo.
+        """
+        game1 = gl.ConnectMore(3)
+        game2 = gl.ConnectMore(3)
+        plays = [1, 2, 2, 7, 9, 9]
+        keys = [game1.canonical_key()]
+        for col in plays:
+            game1.play(col)
+            game2.play(game2.mirror_col(col))
+            keys.append(game1.canonical_key())
+            self.assertEqual(game1.canonical_key(), game2.canonical_key())
+            self.assertNotEqual(game1.position_key(), game2.position_key())
+            self.assertNotEqual(game1.is_mirrored(), game2.is_mirrored())
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(9, game1.mirror_col(1))
+
+        for key in reversed(keys[:-1]):
+            game1.undo()
+            self.assertEqual(key, game1.canonical_key())
+        for key in keys[1:]:
+            game1.redo()
+            self.assertEqual(key, game1.canonical_key())
+
+        game3 = gl.ConnectMore(3)
+        game3._squares = game2._squares
+        self.assertEqual(game1.canonical_key(), game3.canonical_key())
+
+    def test_canonical_key_symmetric(self):
+        """It should give a symmetric position the same key both ways."""
+        game = gl.ConnectMore(2)
+        for col in [3, 1, 4, 6]:
+            game.play(col)
+        self.assertEqual(game.position_key(), game.canonical_key())
+        self.assertFalse(game.is_mirrored())
+
+    def test_tokens_left(self):
+        """It should count each player's remaining turns."""
+        game = gl.ConnectMore(3)
+        self.assertEqual([18, 18, 18],
+                         [game.tokens_left(player) for player in [1, 2, 3]])
+        game.play(1)
+        self.assertEqual([17, 18, 18],
+                         [game.tokens_left(player) for player in [1, 2, 3]])
+        self.assertEqual([1, 2, 1],
+                         [game.tokens_left(player, 4) for player in [1, 2, 3]])
+
+    def test_score_bounds(self):
+        """It should never score more than max_gain/max_final_score allow,
+        and a decided game should always be won by the leader at the time.
+        """
+        rng = random.Random(7)
+        for num_players in range(2, 7):
+            for each_game in range(5):
+                game = gl.ConnectMore(num_players)
+                positions = []
+                while game.empty_squares > 0:
+                    positions.append((
+                        list(game.scores), game.decided(), game.leaders,
+                        [game.max_gain(player) for player in
+                         range(1, num_players + 1)],
+                        [game.max_final_score(player) for player in
+                         range(1, num_players + 1)]))
+                    game.play(rng.choice(game.legal_moves()))
+                self.assertTrue(game.decided())
+
+                for scores, decided, leaders, gains, bounds in positions:
+                    for player in range(num_players):
+                        self.assertLessEqual(game.scores[player],
+                                             scores[player] + gains[player])
+                        self.assertLessEqual(game.scores[player],
+                                             bounds[player])
+                    if decided:
+                        self.assertEqual(leaders, game.leaders)
+
+    def test_decided(self):
+        """It should only be decided when nobody can catch the leader."""
+        game = gl.ConnectMore(2)
+        self.assertFalse(game.decided())
+        for col in [2, 3, 6, 3, 2, 3, 4, 3, 1, 4, 2, 5, 3, 4, 1, 2, 6, 3, 1,
+                    2, 5, 6, 1, 1, 2, 5, 5]:
+            game.play(col)
+        self.assertEqual([3, 9], game.scores)
+        #player 1 could still fill the top of column 5 and the top row
+        self.assertEqual(13, game.max_final_score(1))
+        self.assertFalse(game.decided())
+
+        #which player 2 blocks
+        game.play(5)
+        self.assertEqual(8, game.max_final_score(1))
+        self.assertTrue(game.decided())
+        game.undo()
+        self.assertFalse(game.decided())
+
+
+class TestVariant(unittest.TestCase):
+
+    def test_standard(self):
+        """The standard variants should be the boards ConnectMore uses."""
+        for num_players in range(2, 7):
+            variant = gl.Variant.standard(num_players)
+            self.assertIs(variant, gl.Variant.standard(num_players))
+            game = variant.new_game()
+            self.assertEqual(gl.ConnectMore(num_players), game)
+            self.assertIs(variant, gl.ConnectMore(num_players).variant)
+
+    def test_invalid_variant(self):
+        """It should throw an error for a variant that can't be played."""
+        for args in [(6, 6, 1), (6, 6, 7), (0, 6, 2), (6, 6, 2, 19),
+                     (6, 6, 2, 0), (10, 6, 2, None, (0, 1, 2, 3, 4)),
+                     (6, 6, 2, None, (1, 1, 2, 3, 4, 5, 6)),
+                     (5, 2, 2, None, (0, 0, 10, -50, -50, -50)),
+                     (6, 6, 2, None, (0, 3, 3, 3, 3, 3, 3)),
+                     (16, 4, 2),
+                     (6, 6, 2, None, [1000 * length for length in range(7)])]:
+            self.assertRaises(ValueError, gl.Variant, *args)
+        self.assertRaises(ValueError, gl.ConnectMore, 3,
+                          gl.Variant.standard(2))
+
+    def test_custom_board(self):
+        """A bigger board should play to the end, scoring every move the same
+        as scoring the whole board from scratch.
+        """
+        rng = random.Random(1)
+        variant = gl.Variant(15, 10, 4, 30)
+        game = variant.new_game()
+        self.assertEqual((15, 10, 120), (game.width, game.height,
+                                         game.empty_squares))
+        self.assertEqual(len(variant.chain_scores), 16)
+        while game.empty_squares > 0:
+            game.play(rng.choice(game.legal_moves()))
+            self.assertEqual(game.scores, [game._board_score(mask)
+                                           for mask in game._masks])
+            self.assertLessEqual(game.scores[game.current_player-1],
+                                 game.max_final_score(game.current_player))
+        #30 turns each leaves 30 squares empty
+        self.assertEqual(120, sum(bin(mask).count("1")
+                                  for mask in game._masks))
+
+    def test_custom_scores(self):
+        """It should score chains with the variant's chain scores."""
+        variant = gl.Variant(6, 6, 2, chain_scores=range(7))
+        self.assertEqual(18, variant.turns_per_player)
+        game = variant.new_game()
+        for col in [1, 1, 2, 2, 3]:
+            game.play(col)
+        #a chain of 3 on the bottom row, and 3 chains of 1 going the other
+        #ways from each token
+        self.assertEqual([12, 8], game.scores)
+        game.rescore()
+        self.assertEqual([12, 8], game.scores)
+
+    def test_shared_tables(self):
+        """Games should share their variant's tables, and variants with the
+        same board should share them too.
+        """
+        variant = gl.Variant(15, 10, 3)
+        game1 = variant.new_game()
+        game2 = variant.new_game()
+        self.assertIs(game1._scorers, game2._scorers)
+        self.assertIs(game1._zobrist, game2._zobrist)
+        other = gl.Variant(15, 10, 5)
+        self.assertIs(variant._lines_through, other._lines_through)
+        self.assertIs(variant._zobrist, other._zobrist)
+        self.assertIsNot(variant._scorers,
+                         gl.Variant(15, 10, 3, None, range(16))._scorers)
+
+    def test_copy(self):
+        """Copies and pickles should keep the variant and its tables."""
+        variant = gl.Variant(15, 10, 3, 20, range(16))
+        game = variant.new_game()
+        game.play(1)
+        for copied in [game.clone(), pickle.loads(pickle.dumps(game))]:
+            self.assertIs(variant._scorers, copied._scorers)
+            self.assertEqual(variant, copied.variant)
+            self.assertEqual(hash(variant), hash(copied.variant))
+            self.assertEqual(game, copied)
+            copied.play(1)
+            game.play(1)
+            self.assertEqual(game, copied)
+            game.undo()
+        self.assertIn("Variant(15, 10, 3, 20, (0, 1, 2", repr(variant))
+        self.assertNotEqual(variant, gl.Variant(15, 10, 3))
+
 if __name__ == '__main__':
     unittest.main()
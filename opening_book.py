@@ -0,0 +1,207 @@
+"""Opening book: the best first few moves, worked out ahead of time.
+
+Every game starts from the same few positions, so rather than searching
+them again in every game, the book is built once (offline) by searching
+every position up to a few moves in for a long time, and saved to a file
+of (canonical position key, best column, value) entries sorted by key.
+
+At run time the file is opened with mmap and binary searched, so a lookup
+only reads the handful of entries it needs, opening a book doesn't read
+the whole file, and every process using the same book shares the same
+pages of memory.
+
+Build a book with:
+>python opening_book.py num_players plies seconds [book_file]
+
+which searches every position up to plies moves from the start for the
+given number of seconds each (so it can take a while), and saves it to
+book_file (by default books/<num_players>_players.book, which is the one
+ai.choose_move() uses).
+"""
+import mmap
+import os
+import struct
+import sys
+import time
+
+import game_logic as gl
+
+DEFAULT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "books")
+
+
+class OpeningBook:
+    """A book file opened for lookups (see above)."""
+
+    #file header: magic, then the book's variant: number of players, width,
+    #height, turns per player, number of chain scores (which follow the
+    #header), then the number of entries
+    FILE_MAGIC = b"CMO2"
+    HEADER = struct.Struct("<4sBBBHBI")
+    CHAIN_SCORE = struct.Struct("<q")
+    #each entry: canonical key, value for the player to move, best column
+    ENTRY = struct.Struct("<QhB")
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.num_players, self.width, self.height, turns_per_player,
+         num_scores, self._count) = self.HEADER.unpack_from(self._map)
+        if magic != self.FILE_MAGIC:
+            self._map.close()
+            raise ValueError("Not an opening book file: " + str(path))
+
+        chain_scores = [
+            self.CHAIN_SCORE.unpack_from(
+                self._map, self.HEADER.size + index * self.CHAIN_SCORE.size)[0]
+            for index in range(num_scores)]
+        #the keys only make sense for games of the same variant
+        self.variant = gl.Variant(self.width, self.height, self.num_players,
+                                  turns_per_player, chain_scores)
+        self._entries_offset = (self.HEADER.size +
+                                num_scores * self.CHAIN_SCORE.size)
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, game):
+        """Returns (best column, value) for the game's position, or None if
+        it's not in the book (or the book is for a different variant of the
+        game).
+        """
+        if game.variant != self.variant:
+            return None
+        key = game.canonical_key()
+
+        #binary search for the key
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._entries_offset + middle * self.ENTRY.size
+            entry_key, value, col = self.ENTRY.unpack_from(self._map, offset)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                if game.is_mirrored():
+                    col = game.mirror_col(col)
+                return col, value
+        return None
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_book(path, num_players, entries, variant=None):
+    """Writes a book file from a dict of canonical key -> (best column,
+    value), with columns for the canonical position (i.e. flipped with
+    mirror_col() for positions where is_mirrored() is True), for the
+    standard game unless a variant is given.
+    """
+    if variant is None:
+        variant = gl.Variant.standard(num_players)
+    with open(path, "wb") as file:
+        file.write(OpeningBook.HEADER.pack(
+            OpeningBook.FILE_MAGIC, num_players, variant.width,
+            variant.height, variant.turns_per_player,
+            len(variant.chain_scores), len(entries)))
+        for score in variant.chain_scores:
+            file.write(OpeningBook.CHAIN_SCORE.pack(score))
+        for key in sorted(entries):
+            col, value = entries[key]
+            file.write(OpeningBook.ENTRY.pack(key, value, col))
+
+
+def build_book(num_players, plies, time_limit, report=None, variant=None):
+    """Searches every position up to plies moves from the start of the game
+    (the standard game, unless a variant is given) for time_limit seconds
+    each. Returns a dict of canonical key -> (best column, value) that can
+    be passed to save_book().
+
+    Calls report(done, total) after each position, if given.
+    """
+    #imported here since ai uses the book too (and only building one needs
+    #the players)
+    import ai
+
+    #every distinct position (mirror images count as one) up to plies in
+    positions = {}
+    level = [gl.ConnectMore(num_players, variant)]
+    for ply in range(plies + 1):
+        next_level = []
+        for game in level:
+            key = game.canonical_key()
+            if key in positions:
+                continue
+            positions[key] = game
+            if ply < plies:
+                for col in game.legal_moves():
+                    child = game.clone()
+                    child.play(col)
+                    next_level.append(child)
+        level = next_level
+
+    entries = {}
+    for done, (key, game) in enumerate(positions.items()):
+        if num_players == 2:
+            player = ai.AlphaBetaPlayer()
+        else:
+            player = ai.BestReplyPlayer()
+        col = player.choose_move(game, time_limit)
+        if game.is_mirrored():
+            col = game.mirror_col(col)
+        entries[key] = (col, int(player.value))
+        if report:
+            report(done + 1, len(positions))
+    return entries
+
+
+def default_path(num_players):
+    return os.path.join(DEFAULT_FOLDER, "%d_players.book" % num_players)
+
+
+#books opened so far: num_players -> OpeningBook (or None if there's no
+#book file)
+_default_books = {}
+
+
+def default_book(num_players):
+    """Returns the book in the default location for the number of players,
+    or None if there isn't one. Each book is only opened once per process.
+    """
+    if num_players not in _default_books:
+        path = default_path(num_players)
+        _default_books[num_players] = (OpeningBook(path)
+                                       if os.path.exists(path) else None)
+    return _default_books[num_players]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("Usage: python opening_book.py num_players plies seconds "
+              "[book_file]")
+        sys.exit(1)
+
+    num_players = int(sys.argv[1])
+    path = sys.argv[4] if len(sys.argv) > 4 else default_path(num_players)
+    start = time.perf_counter()
+
+    def print_progress(done, total):
+        print("%8.0fs %6d / %d positions" % (
+            time.perf_counter() - start, done, total))
+
+    entries = build_book(num_players, int(sys.argv[2]), float(sys.argv[3]),
+                         print_progress)
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    save_book(path, num_players, entries)
+    print("Saved %d positions to %s" % (len(entries), path))
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+import ai
+import game_logic as gl
+import opening_book as ob
+
+
+class TestOpeningBook(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "test.book")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_build_and_lookup(self):
+        """It should find every position it was built from (and their mirror
+        images), with the moves the search picked.
+        """
+        entries = ob.build_book(2, 1, 0.02)
+        #the empty board plus the first moves, less the mirror images
+        self.assertEqual(1 + 3, len(entries))
+        ob.save_book(self.path, 2, entries)
+
+        with ob.OpeningBook(self.path) as book:
+            self.assertEqual(len(entries), len(book))
+            self.assertEqual((2, 6, 6), (book.num_players, book.width,
+                                         book.height))
+            game = gl.ConnectMore(2)
+            for col in game.legal_moves():
+                game.play(col)
+                key = game.canonical_key()
+                best_col, value = entries[key]
+                if game.is_mirrored():
+                    best_col = game.mirror_col(best_col)
+                self.assertEqual((best_col, value), book.lookup(game))
+                game.undo()
+
+            game.play(1)
+            game.play(1)
+            self.assertIsNone(book.lookup(game))
+            self.assertIsNone(book.lookup(gl.ConnectMore(3)))
+
+    def test_variants(self):
+        """It should only answer for games of the variant it was built for,
+        even when the position keys match.
+        """
+        variant = gl.Variant(15, 10, 2)
+        entries = ob.build_book(2, 0, 0.02, variant=variant)
+        ob.save_book(self.path, 2, entries, variant)
+
+        with ob.OpeningBook(self.path) as book:
+            self.assertEqual(variant, book.variant)
+            self.assertIsNotNone(book.lookup(variant.new_game()))
+            self.assertIsNone(book.lookup(gl.ConnectMore(2)))
+            self.assertIsNone(book.lookup(gl.Variant(
+                15, 10, 2, chain_scores=range(16)).new_game()))
+
+    def test_not_a_book(self):
+        """It should refuse to open other files."""
+        with open(self.path, "wb") as file:
+            file.write(b"not a book at all")
+        self.assertRaises(ValueError, ob.OpeningBook, self.path)
+
+    def test_players_use_book(self):
+        """The computer players should play book moves without searching."""
+        game = gl.ConnectMore(2)
+        #a move no search would pick
+        ob.save_book(self.path, 2, {game.canonical_key(): (1, 5)})
+        with ob.OpeningBook(self.path) as book:
+            player = ai.AlphaBetaPlayer()
+            player.book = book
+            self.assertEqual(1, player.choose_move(game, 0.1))
+            self.assertEqual(0, player.nodes)
+            self.assertEqual(5, player.value)
+
+            game.play(3)
+            player.choose_move(game, 0.1)
+            self.assertGreater(player.nodes, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Perft: counts every position a few moves ahead.
+
+Playing every possible sequence of moves to a fixed depth is a standard,
+repeatable workload for the game engine: the number of positions reached
+(the 'leaves') checks the move generation (play/undo/legal_moves), and a
+checksum of the scores at every leaf checks the scoring, so any change to
+the engine that changes either is a bug. The time it takes gives the
+engine's speed in nodes (moves played) per second.
+
+The checksum adds up player * score for every player at every leaf, so
+scores given to the wrong player change it too.
+
+Run with:
+>python perft.py num_players depth [workers]
+
+to print the counts for each first move and the totals, splitting the
+first moves over several processes if workers is given.
+"""
+import concurrent.futures
+import sys
+import time
+
+import game_logic as gl
+
+
+def perft(game, depth):
+    """Returns (leaves, checksum, nodes) for every sequence of depth moves
+    from the game's position (games that end sooner count as a leaf where
+    they end). nodes is how many moves were played to get there.
+
+    Moves are made with play()/undo() on the game itself, which is left as
+    it was found.
+    """
+    saved_redo = game._redo
+    try:
+        return _perft(game, depth)
+    finally:
+        game._redo = saved_redo
+
+
+def _perft(game, depth):
+    if depth == 0 or game.empty_squares == 0:
+        checksum = 0
+        for player, score in enumerate(game.scores):
+            checksum += (player + 1) * score
+        return 1, checksum, 0
+
+    leaves = 0
+    checksum = 0
+    nodes = 0
+    for col in game.legal_moves():
+        game.play(col)
+        child_leaves, child_checksum, child_nodes = _perft(game, depth - 1)
+        game.undo()
+        leaves += child_leaves
+        checksum += child_checksum
+        nodes += child_nodes + 1
+    return leaves, checksum, nodes
+
+
+def _perft_move(game, col, depth):
+    """Runs perft after playing col (in a worker process)."""
+    game.play(col)
+    return perft(game, depth - 1)
+
+
+def divide(game, depth, workers=None):
+    """Returns {column: (leaves, checksum, nodes)} for each first move, where
+    the counts are for the rest of the depth moves after it (nodes includes
+    the first move itself).
+
+    If workers is given, the first moves are split over that many processes.
+    """
+    if depth < 1 or game.empty_squares == 0:
+        raise ValueError("Need at least one move to divide")
+
+    moves = game.legal_moves()
+    if workers:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_perft_move, [game.clone()] * len(moves),
+                                    moves, [depth] * len(moves)))
+    else:
+        results = [_perft_move(game.clone(), col, depth) for col in moves]
+
+    return {col: (leaves, checksum, nodes + 1)
+            for col, (leaves, checksum, nodes) in zip(moves, results)}
+
+
+def run(game, depth, workers=None):
+    """Returns (leaves, checksum, nodes, nodes per second) for depth moves
+    from the game's position, along with the divide() results.
+    """
+    start = time.perf_counter()
+    results = divide(game, depth, workers)
+    elapsed = time.perf_counter() - start
+
+    leaves = sum(result[0] for result in results.values())
+    checksum = sum(result[1] for result in results.values())
+    nodes = sum(result[2] for result in results.values())
+    return (leaves, checksum, nodes, nodes / elapsed), results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python perft.py num_players depth [workers]")
+        sys.exit(1)
+
+    game = gl.ConnectMore(int(sys.argv[1]))
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    (leaves, checksum, nodes, rate), results = run(game, int(sys.argv[2]),
+                                                   workers)
+    for col, (col_leaves, col_checksum, col_nodes) in sorted(results.items()):
+        print("%4d: %12d leaves %14d checksum" % (col, col_leaves,
+                                                  col_checksum))
+    print("Total: %d leaves, checksum %d, %d nodes, %d nodes/sec" % (
+        leaves, checksum, nodes, rate))
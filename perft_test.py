@@ -0,0 +1,82 @@
+import unittest
+import game_logic as gl
+import perft
+
+#4 rounds of moves into a game for each number of players
+OPENINGS = {
+    2: [2, 5, 1, 3, 1, 4, 4, 4],
+    3: [3, 2, 5, 2, 8, 8, 8, 7, 4, 2, 8, 1],
+    4: [3, 2, 5, 2, 8, 8, 8, 7, 4, 2, 8, 1, 7, 7, 1, 8],
+    5: [3, 10, 2, 5, 2, 8, 8, 8, 7, 4, 2, 8, 1, 7, 7, 10, 1, 8, 5, 4],
+    6: [3, 10, 2, 5, 2, 8, 8, 8, 11, 7, 4, 2, 8, 1, 7, 7, 10, 1, 12, 8, 5,
+        12, 4, 10],
+}
+
+#(leaves, checksum, nodes) 4 moves on from each of the OPENINGS
+KNOWN_COUNTS = {
+    2: (1295, 4170, 1553),
+    3: (6527, 6273, 7345),
+    4: (6560, 2064, 7379),
+    5: (10000, 6804, 11110),
+    6: (20736, 7856, 22620),
+}
+
+
+def mid_game(num_players):
+    game = gl.ConnectMore(num_players)
+    for col in OPENINGS[num_players]:
+        game.play(col)
+    return game
+
+
+class TestPerft(unittest.TestCase):
+
+    def test_empty_board(self):
+        """Every column is open for the first few moves."""
+        for num_players in range(2, 7):
+            game = gl.ConnectMore(num_players)
+            leaves, checksum, nodes = perft.perft(game, 3)
+            self.assertEqual(game.width ** 3, leaves)
+            self.assertEqual(0, checksum)
+            self.assertEqual(sum(game.width ** depth
+                                 for depth in range(1, 4)), nodes)
+
+        self.assertEqual((46656, 8572, 55986),
+                         perft.perft(gl.ConnectMore(2), 6))
+
+    def test_known_counts(self):
+        """It should match the counts the engine has always given."""
+        for num_players, counts in KNOWN_COUNTS.items():
+            game = mid_game(num_players)
+            expected = game.clone()
+            self.assertEqual(counts, perft.perft(game, 4))
+            self.assertEqual(expected, game)
+            self.assertEqual(expected._moves, game._moves)
+
+    def test_game_over(self):
+        """Games that end before the depth count as one leaf."""
+        game = gl.ConnectMore(2)
+        while game.empty_squares > 2:
+            game.play(game.legal_moves()[0])
+        leaves, checksum, nodes = perft.perft(game, 5)
+        self.assertEqual(len(game.legal_moves()), leaves)
+        self.assertEqual(leaves * 2, nodes)
+
+    def test_divide(self):
+        """The counts for each first move should add up to the totals,
+        with or without worker processes.
+        """
+        game = mid_game(3)
+        results = perft.divide(game, 4)
+        self.assertEqual(game.legal_moves(), sorted(results))
+        totals = tuple(sum(result[index] for result in results.values())
+                       for index in range(3))
+        self.assertEqual(KNOWN_COUNTS[3], totals)
+        self.assertEqual(results, perft.divide(game, 4, workers=2))
+
+        counts, results = perft.run(game, 4)
+        self.assertEqual(KNOWN_COUNTS[3], counts[:3])
+        self.assertGreater(counts[3], 0)
+
+if __name__ == '__main__':
+    unittest.main()
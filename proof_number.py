@@ -0,0 +1,205 @@
+"""Proof-number search: can a player guarantee a win from here?
+
+For yes/no questions there's no need to work out exact scores the way the
+players in ai.py and the solvers do. Proof-number search keeps, for every
+position it has looked at, how many more positions it would need to prove
+to show the answer is yes (the 'proof number') and to show it's no (the
+'disproof number'), and always expands the position that looks cheapest
+to settle. The search stops as soon as the root is settled either way,
+so a won position can be proved without working out how much it's won by.
+
+This uses the depth-first version (df-pn), which only keeps the current
+line of play, plus a cache of proof/disproof numbers keyed by position,
+which is kept between questions, so asking about each move from a
+position in turn reuses the work done for the others.
+
+The player asking the question moves at 'OR' positions (proved if ANY
+move is proved), and all the other players are assumed to be working
+against them at 'AND' positions (proved only if EVERY move is proved).
+A position is settled early once the score bounds (see
+ConnectMore.max_final_score) show the answer can't change.
+"""
+import random
+import time
+
+#proof/disproof number meaning 'can't ever be proved'
+INFINITY = 1 << 62
+
+
+class _OutOfNodes(Exception):
+    """Raised when a search uses up its node budget."""
+    pass
+
+
+class ProofNumberSearch:
+    """Answers whether a player can force a win (or at least a tie for the
+    lead, with tie_ok) from a position, searching up to max_nodes positions
+    per question.
+
+    The cache holds up to max_entries positions, and is cleared when it
+    fills up.
+    """
+
+    #random keys for each (player, tie_ok) question, mixed into position
+    #keys so the answers for different questions are kept apart
+    _GOAL_KEYS = [[random.Random("goal %d %d" % (player, tie_ok))
+                   .getrandbits(64) for tie_ok in range(2)]
+                  for player in range(7)]
+
+    def __init__(self, max_nodes=1000000, max_entries=2000000):
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+        #position key -> (proof number, disproof number)
+        self._cache = {}
+
+        #stats from the last question
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    def clear(self):
+        self._cache = {}
+
+    def can_win(self, game, player=None, tie_ok=False):
+        """Returns True if the player (by default the current player) can
+        make sure they finish the game in the lead (alone, or tied with
+        others if tie_ok), whatever the other players do. Returns False if
+        they can't, and None if that couldn't be settled within max_nodes.
+
+        Moves are made with play()/undo() on the game itself, which is left
+        as it was found.
+        """
+        self._player = player or game.current_player
+        self._tie_ok = tie_ok
+        self._goal_key = self._GOAL_KEYS[self._player][int(tie_ok)]
+        self.nodes = 0
+
+        start = time.perf_counter()
+        saved_redo = game._redo
+        try:
+            proof, disproof = self._search(game, INFINITY, INFINITY)
+        except _OutOfNodes:
+            return None
+        finally:
+            game._redo = saved_redo
+            self.elapsed = time.perf_counter() - start
+
+        if proof == 0:
+            return True
+        if disproof == 0:
+            return False
+        return None
+
+    def _key(self, game):
+        return game.canonical_key() ^ self._goal_key
+
+    def _save(self, game, numbers):
+        if len(self._cache) >= self.max_entries:
+            self._cache = {}
+        self._cache[self._key(game)] = numbers
+
+    def _settled(self, game):
+        """Returns (0, INFINITY) if the question is already proved for the
+        position, (INFINITY, 0) if it's disproved, or None if it's still
+        open, going by the final scores still possible.
+        """
+        player = self._player
+        scores = game.scores
+        own_score = scores[player-1]
+        best_other = max(score for other, score in enumerate(scores)
+                         if other != player - 1)
+
+        if game.empty_squares == 0:
+            won = (own_score >= best_other if self._tie_ok
+                   else own_score > best_other)
+            return (0, INFINITY) if won else (INFINITY, 0)
+
+        #the other players' scores can't go down, so if the player can't
+        #get past the best of them, it's disproved
+        own_best = game.max_final_score(player)
+        if own_best < best_other or (own_best == best_other and
+                                     not self._tie_ok):
+            return INFINITY, 0
+
+        #and if none of the others can catch up with the player, it's proved
+        for other in range(1, game.num_players + 1):
+            if other != player:
+                other_best = scores[other-1] + game.max_gain(other)
+                if other_best >= own_score:
+                    other_best = min(other_best, game.max_final_score(other))
+                if other_best > own_score or (other_best == own_score and
+                                              not self._tie_ok):
+                    return None
+        return 0, INFINITY
+
+    def _search(self, game, proof_limit, disproof_limit):
+        """Expands the position until its proof number reaches proof_limit
+        or its disproof number reaches disproof_limit (or it's settled).
+        Returns its (proof number, disproof number).
+        """
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise _OutOfNodes()
+
+        numbers = self._settled(game)
+        if numbers is not None:
+            self._save(game, numbers)
+            return numbers
+
+        or_node = game.current_player == self._player
+        moves = game.legal_moves()
+
+        #the children's keys don't change, so work them out once (settling
+        #any children that can be settled straight away)
+        keys = []
+        for col in moves:
+            game.play(col)
+            key = self._key(game)
+            if key not in self._cache:
+                numbers = self._settled(game)
+                if numbers is not None:
+                    self._save(game, numbers)
+            keys.append(key)
+            game.undo()
+
+        while True:
+            #collect the children's numbers from the cache (unknown children
+            #count as (1, 1))
+            cache = self._cache
+            children = [cache.get(key, (1, 1)) for key in keys]
+
+            if or_node:
+                proof = min(child[0] for child in children)
+                disproof = min(sum(child[1] for child in children), INFINITY)
+            else:
+                proof = min(sum(child[0] for child in children), INFINITY)
+                disproof = min(child[1] for child in children)
+            self._save(game, (proof, disproof))
+
+            if proof >= proof_limit or disproof >= disproof_limit:
+                return proof, disproof
+
+            #pick the most promising child (the easiest to prove at OR
+            #positions, the easiest to disprove at AND positions), and give
+            #it limits so it comes back once the second best one is better
+            #(by a quarter, so the search doesn't keep switching between
+            #children that are about as good as each other)
+            side = 0 if or_node else 1
+            order = sorted(range(len(children)),
+                           key=lambda index: children[index][side])
+            best = order[0]
+            second = (children[order[1]][side] if len(order) > 1
+                      else INFINITY)
+            best_proof, best_disproof = children[best]
+            if or_node:
+                child_limits = (min(proof_limit, second + 1 + second // 4),
+                                disproof_limit - disproof + best_disproof)
+            else:
+                child_limits = (proof_limit - proof + best_proof,
+                                min(disproof_limit,
+                                    second + 1 + second // 4))
+
+            game.play(moves[best])
+            try:
+                self._search(game, *child_limits)
+            finally:
+                game.undo()
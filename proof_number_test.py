@@ -0,0 +1,85 @@
+import random
+import unittest
+import endgame
+import game_logic as gl
+import proof_number as pn
+
+
+def endgame_position(num_players, empty_squares, seed=1):
+    """Returns a game played randomly until empty_squares are left."""
+    rng = random.Random(seed)
+    game = gl.ConnectMore(num_players)
+    while game.empty_squares > empty_squares:
+        game.play(rng.choice(game.legal_moves()))
+    return game
+
+
+class TestProofNumberSearch(unittest.TestCase):
+
+    def test_can_win_2_players(self):
+        """It should agree with the exact result from the endgame solver,
+        and leave the game as it found it.
+        """
+        solver = endgame.EndgameSolver()
+        search = pn.ProofNumberSearch()
+        for seed in range(6):
+            game = endgame_position(2, 9, seed)
+            expected = game.clone()
+            value = endgame.final_value(solver.solve(game)[1],
+                                        game.current_player)
+
+            self.assertEqual(value > 0, search.can_win(game))
+            self.assertEqual(value >= 0, search.can_win(game, tie_ok=True))
+            other = 3 - game.current_player
+            self.assertEqual(value < 0, search.can_win(game, other))
+            self.assertEqual(expected, game)
+            self.assertEqual(expected._moves, game._moves)
+
+    def test_can_win_multi_player(self):
+        """It should assume the other players all play against the player
+        asking.
+        """
+        game = endgame_position(3, 6)
+        search = pn.ProofNumberSearch()
+        for player in range(1, 4):
+            result = search.can_win(game, player)
+            self.assertIn(result, [True, False])
+            #nobody can be sure of a win while someone else is too
+            if result:
+                for other in range(1, 4):
+                    if other != player:
+                        self.assertFalse(search.can_win(game, other,
+                                                        tie_ok=True))
+
+    def test_game_over(self):
+        """It should just check the final scores of a finished game."""
+        game = endgame_position(2, 0)
+        self.assertEqual([7, 7], game.scores)
+        search = pn.ProofNumberSearch()
+        for player in [1, 2]:
+            self.assertFalse(search.can_win(game, player))
+            self.assertTrue(search.can_win(game, player, tie_ok=True))
+
+    def test_node_budget(self):
+        """It should give up (returning None) after max_nodes positions."""
+        search = pn.ProofNumberSearch(max_nodes=100)
+        self.assertIsNone(search.can_win(gl.ConnectMore(2)))
+        self.assertEqual(101, search.nodes)
+
+    def test_cache_shared(self):
+        """It should reuse earlier answers (e.g. for sibling positions)."""
+        game = endgame_position(2, 10)
+        search = pn.ProofNumberSearch()
+        for col in game.legal_moves():
+            game.play(col)
+            search.can_win(game, 1)
+            game.undo()
+        search.can_win(game, 1)
+        cached_nodes = search.nodes
+
+        search.clear()
+        search.can_win(game, 1)
+        self.assertLess(cached_nodes, search.nodes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Generated move scorers for each board size.
+
+ConnectMore scores a move by looking up the pattern of the player's tokens
+in each of the 4 lines through the new token (see ConnectMore._get_lines).
+Done generically, that means looping over a table of (offset, mask, score
+table) for the square every time. Since there are only a few board sizes,
+this instead writes out a small straight-line Python function for every
+square, with the offsets and masks written in as constants and the score
+tables bound as default arguments (so they're fast local variables), e.g.
+
+    def score_8(lines, t0=t_6_1, t1=t_6_0, t2=t_6_2, t3=t_1_0):
+        return (t0[lines >> 6 & 63], t1[lines >> 37 & 63],
+                t2[lines >> 80 & 63], t3[lines >> 121 & 1])
+
+The functions for a board size (and scoring) are generated and compiled the
+first time a game of that size is made - ConnectMore keeps them with the
+rest of its line tables. The compiled code is also saved in the
+__pycache__ folder (if it can be written to), and later runs load it from
+there instead of generating and compiling it again.
+"""
+import marshal
+import os
+import sys
+import zlib
+
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "__pycache__")
+
+#bump this when the generated code changes, so old cached code isn't used
+VERSION = 1
+
+def _table_name(length, place):
+    return "t_%d_%d" % (length, place)
+
+
+def _table_entries(lines_through, line_scores):
+    """Returns (offset, length mask, length, place) for each line through
+    each square (None for the sentinels), working out each score table's
+    place in its line from the line_scores(length) tables.
+    """
+    entries = []
+    for lines in lines_through:
+        if lines[0] is None:
+            entries.append(None)
+            continue
+        square = []
+        for offset, length_mask, table in lines:
+            length = length_mask.bit_length()
+            place = [index for index, scores
+                     in enumerate(line_scores(length)) if scores is table][0]
+            square.append((offset, length_mask, length, place))
+        entries.append(square)
+    return entries
+
+
+def generate_source(entries):
+    """Returns the source code of the scorers for a board, from the
+    _table_entries() for its squares. Running it defines SCORERS, the list
+    of scorers indexed by bit.
+    """
+    source = []
+    names = []
+    for bit, square in enumerate(entries):
+        if square is None:
+            names.append("None")
+            continue
+        name = "score_%d" % bit
+        names.append(name)
+        defaults = ", ".join(
+            "t%d=%s" % (direction, _table_name(length, place))
+            for direction, (offset, mask, length, place) in enumerate(square))
+        lookups = ",\n            ".join(
+            "t%d[lines >> %d & %d]" % (direction, offset, mask)
+            for direction, (offset, mask, length, place) in enumerate(square))
+        source.append("def %s(lines, %s):\n    return (%s)\n" % (
+            name, defaults, lookups))
+    source.append("SCORERS = [%s]\n" % ", ".join(names))
+    return "\n".join(source)
+
+
+def _cache_path(width, height, entries, cache_folder):
+    #the layout is part of the name, in case the line tables ever change
+    layout = zlib.crc32(repr(entries).encode())
+    return os.path.join(cache_folder, "scorers_%dx%d_%08x.v%d.%s.bin" % (
+        width, height, layout, VERSION, sys.implementation.cache_tag))
+
+
+def _load_code(path):
+    try:
+        with open(path, "rb") as file:
+            return marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _save_code(path, code):
+    """Saves the compiled code, if the folder can be written to."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, "wb") as file:
+            marshal.dump(code, file)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def get_scorers(width, height, lines_through, line_scores,
+                cache_folder=CACHE_FOLDER):
+    """Returns the generated scorer for each bit of a board (None for the
+    sentinels), given ConnectMore's line tables for the board and its
+    line_scores(length) function. Each scorer takes a player's line mask
+    and returns the score change in each direction for a token just played
+    in its square.
+
+    Set cache_folder to None to always generate the code.
+    """
+    entries = _table_entries(lines_through, line_scores)
+    code = None
+    path = None
+    if cache_folder is not None:
+        path = _cache_path(width, height, entries, cache_folder)
+        code = _load_code(path)
+    if code is None:
+        code = compile(generate_source(entries),
+                       "<scorers %dx%d>" % (width, height), "exec")
+        if path is not None:
+            _save_code(path, code)
+
+    namespace = {}
+    for square in entries:
+        for offset, mask, length, place in square or []:
+            namespace[_table_name(length, place)] = line_scores(length)[place]
+    exec(code, namespace)
+
+    return namespace["SCORERS"]
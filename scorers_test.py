@@ -0,0 +1,81 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import game_logic as gl
+import scorers
+
+
+class TestScorers(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def get_scorers(self, width, height, cache_folder):
+        variant = gl.Variant(width, height, 2)
+        line_scores = lambda length: gl.ConnectMore._get_line_scores(
+            length, variant.chain_scores)
+        return scorers.get_scorers(width, height, variant._lines_through,
+                                   line_scores, cache_folder)
+
+    def test_same_as_line_tables(self):
+        """Each square's scorer should look up the same entries as looping
+        over the square's lines would.
+        """
+        rng = random.Random(1)
+        for num_players in range(2, 7):
+            game = gl.ConnectMore(num_players)
+            for bit, lines in enumerate(game._lines_through):
+                scorer = game._scorers[bit]
+                if lines[0] is None:
+                    self.assertIsNone(scorer)
+                    continue
+                for each_mask in range(5):
+                    #every square is in 4 lines
+                    mask = rng.getrandbits(4 * game.width * game.height)
+                    mask |= game._line_bits[bit]
+                    self.assertEqual(
+                        tuple(table[mask >> offset & length_mask]
+                              for offset, length_mask, table in lines),
+                        scorer(mask))
+
+    def test_cache(self):
+        """It should save the compiled scorers, load them again next time,
+        and generate them again if the saved file is no good.
+        """
+        generated = self.get_scorers(9, 6, self.folder)
+        files = os.listdir(self.folder)
+        self.assertEqual(1, len(files))
+
+        loaded = self.get_scorers(9, 6, self.folder)
+        self.assertIsNot(generated, loaded)
+        mask = random.Random(1).getrandbits(300)
+        self.assertEqual([scorer and scorer(mask) for scorer in generated],
+                         [scorer and scorer(mask) for scorer in loaded])
+
+        with open(os.path.join(self.folder, files[0]), "wb") as file:
+            file.write(b"not code")
+        broken = self.get_scorers(9, 6, self.folder)
+        self.assertEqual([scorer and scorer(mask) for scorer in generated],
+                         [scorer and scorer(mask) for scorer in broken])
+
+    def test_generate_source(self):
+        """The generated code should be plain Python with the numbers written
+        in.
+        """
+        game = gl.ConnectMore(2)
+        line_scores = lambda length: gl.ConnectMore._get_line_scores(
+            length, game._chain_scores)
+        entries = scorers._table_entries(game._lines_through, line_scores)
+        source = scorers.generate_source(entries)
+        self.assertIn("def score_0(lines, t0=t_6_0, t1=t_6_0, t2=t_6_0, "
+                      "t3=t_1_0):", source)
+        self.assertIn("SCORERS = [score_0, ", source)
+        compile(source, "test", "exec")
+
+if __name__ == '__main__':
+    unittest.main()
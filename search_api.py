@@ -0,0 +1,116 @@
+"""The common interface to all the computer players' searches.
+
+Every player (in ai.py, ai_smp.py and ai_mcts.py) has a search(request)
+method that takes a SearchRequest (the position, a deadline, and optionally
+a node limit and a CancelToken) and returns a SearchResult with the best
+column and the stats for the search, so callers like the web UI can cap how
+long each request takes, stop a search early, and report what the searches
+are doing the same way for every player.
+"""
+import threading
+import time
+
+
+class CancelToken:
+    """Lets one thread stop a search running in another: call cancel(), and
+    the search stops at its next check of the clock and returns the best
+    move it has so far.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class SearchRequest:
+    """What to search and for how long.
+
+    game: the position to search (the players leave it as they found it)
+    time_limit: seconds from now until the search has to stop (so the
+      deadline is fixed when the request is made, e.g. when a web request
+      comes in, not when the search starts)
+    max_nodes: stop after about this many nodes (positions searched, or
+      playouts for MCTS), if given
+    max_depth: stop after searching this many moves ahead, if given (only
+      used by the alpha-beta players)
+    cancel: a CancelToken to stop the search early, if given
+    """
+
+    def __init__(self, game, time_limit=1.0, max_nodes=None, max_depth=None,
+                 cancel=None):
+        self.game = game
+        self.deadline = time.perf_counter() + time_limit
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.cancel = cancel
+
+    def time_left(self):
+        """Returns the seconds left until the deadline (never below 0)."""
+        return max(0.0, self.deadline - time.perf_counter())
+
+    def cancelled(self):
+        return self.cancel is not None and self.cancel.cancelled()
+
+
+class SearchResult:
+    """What a search found.
+
+    col: the best column (1 to width)
+    value: how good the position is for the player to move, in the player's
+      own units (score difference for alpha-beta and the endgame solver,
+      average reward between 0 and 1 for MCTS)
+    pv: the 'principal variation', i.e. the line of play the search expects,
+      starting with col (as long as the player can work it out)
+    depth: how many moves ahead the search got
+    nodes: positions searched (playouts for MCTS)
+    elapsed: seconds the search took
+    tt_hits/tt_probes: transposition table lookups that found an entry, out
+      of all lookups (both 0 for players without a table)
+    """
+
+    def __init__(self, col, value=0, pv=None, depth=0, nodes=0, elapsed=0.0,
+                 tt_hits=0, tt_probes=0):
+        self.col = col
+        self.value = value
+        self.pv = pv if pv is not None else [col]
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.tt_hits = tt_hits
+        self.tt_probes = tt_probes
+
+    @property
+    def nodes_per_second(self):
+        if self.elapsed <= 0:
+            return 0
+        return self.nodes / self.elapsed
+
+    @property
+    def tt_hit_rate(self):
+        """The fraction of transposition table lookups that found an entry
+        (None if there weren't any lookups).
+        """
+        if self.tt_probes == 0:
+            return None
+        return self.tt_hits / self.tt_probes
+
+    def to_dict(self):
+        """Returns the result as a dict (e.g. for JSON)."""
+        return {
+            "col": self.col,
+            "value": self.value,
+            "pv": self.pv,
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "nodes_per_second": self.nodes_per_second,
+            "tt_hit_rate": self.tt_hit_rate,
+            "elapsed": self.elapsed,
+        }
+
+    def __repr__(self):
+        return "SearchResult(%r)" % self.to_dict()
@@ -0,0 +1,163 @@
+import time
+import unittest
+import ai
+import ai_mcts
+import ai_smp
+import game_logic as gl
+import search_api as sa
+
+
+def early_position(num_players):
+    game = gl.ConnectMore(num_players)
+    for col in [3, 4, 2, 5, 3, 1][:num_players + 1]:
+        game.play(col)
+    return game
+
+
+def check_pv(test, game, result):
+    """The principal variation should be legal moves, starting with the
+    best move.
+    """
+    test.assertEqual(result.col, result.pv[0])
+    position = game.clone()
+    for col in result.pv:
+        test.assertIn(col, position.legal_moves())
+        position.play(col)
+
+
+class TestSearchAPI(unittest.TestCase):
+
+    def test_alpha_beta(self):
+        """It should report the search's stats, and leave the game as it
+        found it.
+        """
+        game = early_position(2)
+        expected = game.clone()
+        player = ai.AlphaBetaPlayer()
+        player.endgame = None
+        result = player.search(sa.SearchRequest(game, 10, max_depth=4))
+        self.assertEqual(expected, game)
+        self.assertEqual(expected._moves, game._moves)
+
+        self.assertEqual(4, result.depth)
+        self.assertEqual(4, len(result.pv))
+        check_pv(self, game, result)
+        self.assertEqual(player.value, result.value)
+        self.assertEqual(player.nodes, result.nodes)
+        self.assertGreater(result.nodes_per_second, 0)
+        self.assertGreater(result.tt_probes, 0)
+        self.assertTrue(0 < result.tt_hit_rate < 1)
+        self.assertEqual(result.tt_hit_rate, result.to_dict()["tt_hit_rate"])
+
+    def test_multi_player(self):
+        """The 3 to 6 player searches should find principal variations too."""
+        game = early_position(3)
+        #best-reply lines stop at the first reply by a player moving out of
+        #turn, so they can be just the best move
+        for player_class, shortest in [(ai.ParanoidPlayer, 3),
+                                       (ai.BestReplyPlayer, 1)]:
+            player = player_class()
+            result = player.search(sa.SearchRequest(game, 10, max_depth=3))
+            self.assertEqual(3, result.depth)
+            self.assertGreaterEqual(len(result.pv), shortest)
+            check_pv(self, game, result)
+
+        result = ai.search(sa.SearchRequest(game, 0.2))
+        check_pv(self, game, result)
+
+    def test_shared_players(self):
+        """ai.search() should keep one player (and transposition table) per
+        variant from one search to the next.
+        """
+        game = early_position(2)
+        ai.search(sa.SearchRequest(game, 0.1))
+        player = ai._players[game.variant]
+        result = ai.search(sa.SearchRequest(game, 0.1))
+        self.assertIs(player, ai._players[game.variant])
+        self.assertGreater(result.tt_hits, 0)
+
+        wide = gl.Variant(9, 6, 2).new_game()
+        ai.search(sa.SearchRequest(wide, 0.1))
+        self.assertIsNot(player, ai._players[wide.variant])
+
+    def test_limits(self):
+        """It should stop at the node limit, when cancelled, or at the
+        deadline, whichever comes first.
+        """
+        game = gl.ConnectMore(2)
+        player = ai.AlphaBetaPlayer()
+        result = player.search(sa.SearchRequest(game, 10, max_nodes=1000))
+        self.assertLessEqual(result.nodes,
+                             1000 + ai.AlphaBetaPlayer.CHECK_TIME_EVERY)
+        self.assertIn(result.col, game.legal_moves())
+
+        cancel = sa.CancelToken()
+        cancel.cancel()
+        result = player.search(sa.SearchRequest(game, 10, cancel=cancel))
+        self.assertLess(result.elapsed, 1)
+        self.assertIsNone(player.cancelled)
+        self.assertIsNone(player.max_nodes)
+
+        #the deadline is fixed when the request is made
+        request = sa.SearchRequest(game, 0.2)
+        time.sleep(0.1)
+        self.assertLess(request.time_left(), 0.15)
+        result = player.search(request)
+        self.assertLess(result.elapsed, 0.15)
+
+    def test_mcts_no_playouts(self):
+        """An MCTS search that runs no playouts shouldn't report the value
+        from the search before.
+        """
+        game = early_position(2)
+        with ai_mcts.MCTSPlayer(workers=1, seed=1) as player:
+            player.search(sa.SearchRequest(game, 10, max_nodes=50))
+            self.assertNotEqual(0.0, player.value)
+            result = player.search(sa.SearchRequest(game, 0))
+            self.assertEqual(0, result.nodes)
+            self.assertEqual(0.0, result.value)
+
+        cancel = sa.CancelToken()
+        cancel.cancel()
+        with ai_mcts.MCTSSession(game, ponder=False, seed=1) as session:
+            #as if it was left over from searching the move before
+            session.value = 0.5
+            result = session.search(sa.SearchRequest(game, 10,
+                                                     cancel=cancel))
+            self.assertEqual(0, result.nodes)
+            self.assertEqual(0.0, result.value)
+
+    def test_mcts(self):
+        """The MCTS players should count playouts as nodes."""
+        game = early_position(2)
+        with ai_mcts.MCTSPlayer(workers=1, seed=1) as player:
+            result = player.search(sa.SearchRequest(game, 10, max_nodes=200))
+            self.assertEqual(200, result.nodes)
+            self.assertEqual([result.col], result.pv)
+            self.assertIsNone(result.tt_hit_rate)
+
+        with ai_mcts.MCTSSession(game, ponder=False, seed=1) as session:
+            result = session.search(sa.SearchRequest(game, 10,
+                                                     max_nodes=500))
+            self.assertEqual(500, result.nodes)
+            self.assertGreater(len(result.pv), 1)
+            check_pv(self, game, result)
+            self.assertRaises(ValueError, session.search,
+                              sa.SearchRequest(gl.ConnectMore(2)))
+
+    def test_lazy_smp(self):
+        """The parallel search should pass the limits on to its workers."""
+        game = early_position(2)
+        with ai_smp.LazySMPPlayer(workers=2) as player:
+            player.endgame = None
+            result = player.search(sa.SearchRequest(game, 10, max_depth=4))
+            self.assertEqual(4, result.depth)
+            check_pv(self, game, result)
+
+            cancel = sa.CancelToken()
+            cancel.cancel()
+            result = player.search(sa.SearchRequest(game, 10, cancel=cancel))
+            self.assertLess(result.elapsed, 2)
+
+if __name__ == '__main__':
+    unittest.main()
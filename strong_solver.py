@@ -0,0 +1,337 @@
+"""Strong solver for the 2 player (6x6) game.
+
+Works out the exact final score difference with perfect play from a
+position (the empty board, to solve the whole game), using alpha-beta
+search on the score difference all the way to the end of the game.
+
+The result for every position up to store_plies moves from the start of the
+solve is searched with a full window, so it's exact, and saved in a
+PositionStore: a dbm file on disk, keyed by canonical position key. Deeper
+positions use a fixed size in-memory transposition table, but any of them
+that the search happens to solve exactly (its value came out inside the
+alpha-beta window) is saved in the store as well, unless it's within
+min_store_squares of the end of the game.
+
+That file is the output (look up any stored position's value and best move
+with PositionStore.lookup, which is a single dbm lookup), and it's also the
+checkpoint - a solve that's stopped part way through picks up where it left
+off, since every position already in the store is just looked up again.
+
+Run with:
+>python strong_solver.py store_file [column ...]
+
+to solve the position after playing the given columns, printing progress
+(nodes/second etc) as it goes. Stop it with Ctrl-C and run it again with
+the same arguments to carry on.
+
+NOTE: the whole 6x6 game is a very big search in pure Python, so expect it
+to take a long time from the empty board. It's quick from later positions.
+"""
+import dbm
+import struct
+import sys
+import time
+
+import ai
+import game_logic as gl
+import transposition
+
+
+class PositionStore:
+    """Solved positions on disk: canonical key -> (value, best column),
+    where value is the final score difference for the player to move if
+    both players play perfectly.
+
+    Position keys don't say which variant of the game they're from (see
+    game_logic.Variant), so the store is for one variant (the standard 2
+    player game unless another is given), which is recorded in the file
+    when it's created and checked when it's opened again.
+    """
+
+    ENTRY = struct.Struct("<hB")
+    #the record holding the variant (position keys are all 8 bytes long)
+    VARIANT_KEY = b"variant"
+
+    def __init__(self, path, flag="c", variant=None):
+        self.variant = variant or gl.Variant.standard(2)
+        self._db = dbm.open(path, flag)
+        stored = self._db.get(self.VARIANT_KEY)
+        if stored is None and flag != "r":
+            self._db[self.VARIANT_KEY] = repr(self.variant).encode()
+        elif stored is not None and stored != repr(self.variant).encode():
+            self._db.close()
+            raise ValueError("The store is for a different variant: " +
+                             stored.decode())
+
+    def __len__(self):
+        return len(self._db) - (self.VARIANT_KEY in self._db)
+
+    def _key(self, game):
+        return struct.pack("<Q", game.canonical_key())
+
+    def lookup(self, game):
+        """Returns (value, best column) for the game's position, or None if
+        it hasn't been solved (or is from a different variant).
+        """
+        if game.variant != self.variant:
+            return None
+        data = self._db.get(self._key(game))
+        if data is None:
+            return None
+        value, col = self.ENTRY.unpack(data)
+        if game.is_mirrored():
+            col = game.mirror_col(col)
+        return value, col
+
+    def best_move(self, game):
+        """Returns the perfect move for the game's position, or None if it
+        hasn't been solved (a 'hint').
+        """
+        entry = self.lookup(game)
+        return entry[1] if entry else None
+
+    def store(self, game, value, col):
+        if game.variant != self.variant:
+            raise ValueError("The game is from a different variant")
+        if game.is_mirrored():
+            col = game.mirror_col(col)
+        self._db[self._key(game)] = self.ENTRY.pack(value, col)
+
+    def sync(self):
+        """Makes sure everything stored so far is written to disk."""
+        if hasattr(self._db, "sync"):
+            self._db.sync()
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StrongSolver:
+    """Solves 2 player positions exactly (see above).
+
+    store_plies is how many moves from the start of the solve get exact
+    values stored. Every stored position is searched with a full window, so
+    each extra ply costs a lot more time - 1 means the position and every
+    move from it (later positions can be solved when they come up, since
+    the end of the game is a lot quicker to solve).
+
+    Deeper positions that are solved exactly are stored too, if they have at
+    least min_store_squares empty squares (the last few moves are quicker to
+    solve again than to store).
+
+    Calls report(solver) every REPORT_EVERY seconds with the solver's stats
+    (nodes, nodes_per_second, stored, elapsed), by default printing them.
+    """
+
+    REPORT_EVERY = 10.0
+
+    #how many nodes to search between checks of the clock
+    CHECK_TIME_EVERY = 4096
+
+    def __init__(self, store, store_plies=1, table_mb=64, report=None,
+                 min_store_squares=6):
+        self.store = store
+        self.store_plies = store_plies
+        self.min_store_squares = min_store_squares
+        self.transpositions = transposition.TranspositionTable(table_mb)
+        self.report = report or print_progress
+
+        #stats
+        self.nodes = 0
+        self.stored = 0
+        self.elapsed = 0.0
+
+    @property
+    def nodes_per_second(self):
+        if self.elapsed <= 0:
+            return 0
+        return self.nodes / self.elapsed
+
+    def solve(self, game):
+        """Returns (value, best column) for the game: the final score
+        difference for the current player with perfect play, and the move
+        that gets it.
+        """
+        if game.num_players != 2:
+            raise ValueError("StrongSolver only solves 2 player games")
+        if game.variant != self.store.variant:
+            raise ValueError("The store is for a different variant")
+        if game.empty_squares <= 0:
+            raise gl.GameOverError()
+
+        self._start = time.perf_counter()
+        self._next_report = self._start + self.REPORT_EVERY
+        self._store_until = game.empty_squares - self.store_plies
+        self._centre_order = ai._centre_order(game.width)
+        self.nodes = 0
+        self.stored = 0
+
+        saved_redo = game._redo
+        try:
+            self._solve_exact(game)
+        finally:
+            game._redo = saved_redo
+            self.store.sync()
+            self.elapsed = time.perf_counter() - self._start
+        return self.store.lookup(game)
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes % self.CHECK_TIME_EVERY == 0:
+            now = time.perf_counter()
+            if now >= self._next_report:
+                self.elapsed = now - self._start
+                self._next_report = now + self.REPORT_EVERY
+                self.store.sync()
+                self.report(self)
+
+    def _solve_exact(self, game):
+        """Returns the exact value of a position near the start of the
+        solve, from the store or by searching it with a full window (and
+        storing the result).
+        """
+        entry = self.store.lookup(game)
+        if entry is not None:
+            return entry[0]
+
+        best_value = None
+        best_col = None
+        for col in self._ordered_moves(game, None):
+            game.play(col)
+            try:
+                if game.empty_squares == 0:
+                    value = -self._difference(game)
+                elif game.empty_squares >= self._store_until:
+                    value = -self._solve_exact(game)
+                else:
+                    value = -self._negamax(game, -ai.INFINITY,
+                                           ai.INFINITY)
+            finally:
+                game.undo()
+            if best_value is None or value > best_value:
+                best_value = value
+                best_col = col
+
+        self.store.store(game, best_value, best_col)
+        self.stored += 1
+        return best_value
+
+    def _difference(self, game):
+        player = game.current_player
+        return game.scores[player-1] - game.scores[2-player]
+
+    def _ordered_moves(self, game, first_col):
+        heights = game._heights
+        height = game.height
+        moves = [col for col in self._centre_order if heights[col-1] < height]
+        if first_col in moves:
+            moves.remove(first_col)
+            moves.insert(0, first_col)
+        return moves
+
+    def _negamax(self, game, alpha, beta):
+        """Returns the final score difference for the current player, exact
+        if it's between alpha and beta, otherwise only a bound.
+        """
+        self._tick()
+
+        player = game.current_player
+        value = self._difference(game)
+        if game.empty_squares == 0:
+            return value
+
+        #how far the difference could still move either way
+        upper = value + game.max_gain(player)
+        if upper <= alpha:
+            return upper
+        lower = value - game.max_gain(3 - player)
+        if lower >= beta:
+            return lower
+
+        stored = game.empty_squares >= self.min_store_squares
+        if stored:
+            entry = self.store.lookup(game)
+            if entry is not None:
+                return entry[0]
+
+        key = game.canonical_key()
+        mirrored = game.is_mirrored()
+        entry = self.transpositions.get(key)
+        first_col = None
+        if entry is not None:
+            entry_depth, entry_value, bound, first_col = entry
+            if first_col is not None and mirrored:
+                first_col = game.mirror_col(first_col)
+            if bound == ai.EXACT:
+                return entry_value
+            elif bound == ai.LOWER_BOUND:
+                alpha = max(alpha, entry_value)
+            else:
+                beta = min(beta, entry_value)
+            if alpha >= beta:
+                return entry_value
+
+        original_alpha = alpha
+        best_value = None
+        best_col = None
+        for col in self._ordered_moves(game, first_col):
+            game.play(col)
+            try:
+                value = -self._negamax(game, -beta, -alpha)
+            finally:
+                game.undo()
+            if best_value is None or value > best_value:
+                best_value = value
+                best_col = col
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            bound = ai.UPPER_BOUND
+        elif best_value >= beta:
+            bound = ai.LOWER_BOUND
+        else:
+            bound = ai.EXACT
+            if stored:
+                self.store.store(game, best_value, best_col)
+                self.stored += 1
+        if mirrored:
+            best_col = game.mirror_col(best_col)
+        #every search here goes to the end of the game, so the depth is just
+        #used to keep the entries for the biggest subtrees
+        self.transpositions[key] = (game.empty_squares, best_value, bound,
+                                    best_col)
+        return best_value
+
+
+def print_progress(solver):
+    print("%10.0fs %14d nodes %10d nodes/sec %8d positions stored" % (
+        solver.elapsed, solver.nodes, solver.nodes_per_second, solver.stored))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python strong_solver.py store_file [column ...]")
+        sys.exit(1)
+
+    game = gl.ConnectMore(2)
+    for col in sys.argv[2:]:
+        game.play(int(col))
+
+    with PositionStore(sys.argv[1]) as store:
+        solver = StrongSolver(store)
+        try:
+            value, col = solver.solve(game)
+        except KeyboardInterrupt:
+            print("Stopped, run again to carry on from here")
+            sys.exit(1)
+        print_progress(solver)
+        print("Best move: %d, final score difference: %d" % (col, value))
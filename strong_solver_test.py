@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+import endgame
+import game_logic as gl
+import strong_solver as ss
+
+
+def late_position():
+    """Returns a 2 player game with 10 empty squares left."""
+    game = gl.ConnectMore(2)
+    for col in [3, 4, 3, 4, 2, 5, 1, 6, 3, 4, 2, 5, 1, 6, 3, 4, 2, 5,
+                1, 6, 6, 2, 5, 1, 1, 4]:
+        game.play(col)
+    return game
+
+
+class TestStrongSolver(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "positions")
+        self.reports = []
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_solve(self):
+        """It should find the exact final score difference and best move,
+        and leave the game as it found it.
+        """
+        game = late_position()
+        expected = game.clone()
+        col, scores = endgame.EndgameSolver().solve(game)
+
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store)
+            value, best_col = solver.solve(game)
+            self.assertEqual(
+                endgame.final_value(scores, game.current_player), value)
+            game.play(best_col)
+            self.assertEqual(-value, store.lookup(game)[0])
+            game.undo()
+            self.assertGreater(solver.nodes, 0)
+            self.assertEqual(expected, game)
+            self.assertEqual(expected._moves, game._moves)
+
+    def test_store(self):
+        """It should save exact values for the first few moves, which are
+        looked up (not searched again) by later solves and can be used as
+        hints, including for mirror images of the positions.
+        """
+        game = late_position()
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store, store_plies=1,
+                                     min_store_squares=11)
+            value, col = solver.solve(game)
+            self.assertEqual(1 + len(game.legal_moves()), len(store))
+
+        mirrored = gl.ConnectMore(2)
+        for move in game._moves:
+            mirrored.play(mirrored.mirror_col(move[0] + 1))
+
+        with ss.PositionStore(self.path, "r") as store:
+            self.assertEqual(col, store.best_move(game))
+            self.assertEqual(mirrored.mirror_col(col),
+                             store.best_move(mirrored))
+            self.assertIsNone(store.best_move(gl.ConnectMore(2)))
+
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store)
+            self.assertEqual((value, col), solver.solve(game))
+            self.assertEqual(0, solver.nodes)
+
+    def test_store_deeper(self):
+        """It should also store the exact values it finds deeper in the
+        search, so they can be looked up later.
+        """
+        game = late_position()
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store, min_store_squares=6)
+            solver.solve(game)
+            self.assertGreater(len(store), 1 + len(game.legal_moves()))
+
+            #check every stored position along each of the first moves
+            #against the endgame solver
+            checked = 0
+            solver = endgame.EndgameSolver()
+            positions = [game.clone()]
+            while positions:
+                position = positions.pop()
+                entry = store.lookup(position)
+                if entry is None:
+                    continue
+                checked += 1
+                col, scores = solver.solve(position)
+                self.assertEqual(endgame.final_value(
+                    scores, position.current_player), entry[0])
+                if position.empty_squares > 6:
+                    for col in position.legal_moves():
+                        child = position.clone()
+                        child.play(col)
+                        positions.append(child)
+            self.assertGreater(checked, 1 + len(game.legal_moves()))
+
+    def test_variants(self):
+        """It should keep positions from variants with the same board apart,
+        since their position keys match.
+        """
+        game = late_position()
+        variant = gl.Variant(6, 6, 2, chain_scores=range(7))
+        linear = variant.new_game()
+        for move in game._moves:
+            linear.play(move[0] + 1)
+        self.assertEqual(game.canonical_key(), linear.canonical_key())
+
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store)
+            solver.solve(game)
+            self.assertIsNone(store.lookup(linear))
+            self.assertRaises(ValueError, solver.solve, linear)
+
+        self.assertRaises(ValueError, ss.PositionStore, self.path, "c",
+                          variant)
+        other_path = os.path.join(self.folder, "linear")
+        with ss.PositionStore(other_path, variant=variant) as store:
+            value, col = ss.StrongSolver(store).solve(linear)
+            self.assertEqual(value, store.lookup(linear)[0])
+            self.assertIsNone(store.lookup(game))
+        with ss.PositionStore(other_path, "r", variant) as store:
+            self.assertEqual((value, col), store.lookup(linear))
+
+    def test_invalid_games(self):
+        """It should only solve 2 player games that aren't over."""
+        with ss.PositionStore(self.path) as store:
+            solver = ss.StrongSolver(store)
+            self.assertRaises(ValueError, solver.solve, gl.ConnectMore(3))
+            game = gl.ConnectMore(2)
+            while game.empty_squares > 0:
+                game.play(game.legal_moves()[0])
+            self.assertRaises(gl.GameOverError, solver.solve, game)
+
+if __name__ == '__main__':
+    unittest.main()
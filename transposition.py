@@ -0,0 +1,148 @@
+"""A transposition table with a fixed memory size, for the search players.
+
+A dict of every position searched just keeps growing during a long search
+(e.g. on the 12x9 six player board), so TranspositionTable stores its
+entries in a preallocated array instead, and makes room for new positions
+by replacing old ones.
+
+Each entry is packed into one 64 bit word (see pack()), and the table is
+split into 'buckets' of 2 entries each. A position can only go in the bucket
+its key picks, which holds:
+  the depth-preferred entry: only replaced by a search at least as deep (or
+    of the same position), so the expensive results near the root stay put
+  the always-replace entry: takes whatever the depth-preferred entry turned
+    away, or the entry it pushed out, so recent positions are kept too
+"""
+import array
+
+#the packed entry layout (bits 0-31 of a word, see pack/unpack):
+#  bits 0-15:  value + 32768 (values are score differences, so they're small)
+#  bits 16-22: depth
+#  bits 23-24: bound (EXACT/LOWER_BOUND/UPPER_BOUND) + 1, so a used entry is
+#              never 0
+#  bits 25-28: best column (0 for none)
+#  bits 29-31: player making the best move, for moves that need one (the
+#              other players' moves in ai.BestReplyPlayer), else 0
+VALUE_OFFSET = 1 << 15
+MAX_VALUE = VALUE_OFFSET - 1
+MAX_DEPTH = 0x7f
+
+
+def pack(entry):
+    """Packs a (depth, value, bound, move) entry into a 32 bit int."""
+    depth, value, bound, move = entry
+    player = 0
+    col = move
+    if isinstance(move, tuple):
+        player, col = move
+    value = max(-MAX_VALUE, min(MAX_VALUE, int(value)))
+    return ((value + VALUE_OFFSET) | min(depth, MAX_DEPTH) << 16 |
+            (bound + 1) << 23 | (col or 0) << 25 | player << 29)
+
+
+def unpack(data):
+    """Turns a packed entry back into (depth, value, bound, move)."""
+    value = (data & 0xffff) - VALUE_OFFSET
+    depth = data >> 16 & 0x7f
+    bound = (data >> 23 & 0x3) - 1
+    col = data >> 25 & 0xf
+    player = data >> 29 & 0x7
+    if player:
+        move = (player, col)
+    else:
+        move = col or None
+    return depth, value, bound, move
+
+
+class TranspositionTable:
+    """A fixed size transposition table, which behaves like the dict the
+    players in ai.py used to use: entry = table.get(key) and
+    table[key] = entry, where entry is (depth, value, bound, move).
+
+    The memory used is set by size_mb and never grows. Each word holds the
+    top 32 bits of the position's key (to check it's the right position,
+    since the bottom bits are used to pick the bucket) and the packed entry.
+    Two positions can very occasionally match on both, which makes the
+    search a tiny bit less accurate, but never makes it crash.
+
+    Counts since the last clear():
+      hits:       get() found the position
+      misses:     get() didn't find the position
+      collisions: get() didn't find the position, but found other positions
+                  in its bucket
+      overwrites: storing an entry pushed out one for a different position
+    """
+
+    #bytes per word of the array ('Q' is an unsigned 64 bit int)
+    WORD_BYTES = 8
+
+    #entries per bucket: depth-preferred, then always-replace
+    BUCKET_WORDS = 2
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) //
+                           (self.WORD_BYTES * self.BUCKET_WORDS))
+        self._words = array.array(
+            "Q", bytes(self.buckets * self.BUCKET_WORDS * self.WORD_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+    def clear(self):
+        """Empties the table and resets the counters."""
+        self._words = array.array("Q", bytes(len(self._words) *
+                                             self.WORD_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+    def __len__(self):
+        """The number of entries in use."""
+        return len(self._words) - self._words.count(0)
+
+    def get(self, key, default=None):
+        index = (key % self.buckets) << 1
+        check = key >> 32 & 0xffffffff
+        words = self._words
+
+        word = words[index]
+        if word >> 32 == check and word:
+            self.hits += 1
+            return unpack(word & 0xffffffff)
+        other = words[index + 1]
+        if other >> 32 == check and other:
+            self.hits += 1
+            return unpack(other & 0xffffffff)
+
+        self.misses += 1
+        if word or other:
+            self.collisions += 1
+        return default
+
+    def __setitem__(self, key, entry):
+        index = (key % self.buckets) << 1
+        check = key >> 32 & 0xffffffff
+        new_word = check << 32 | pack(entry)
+        words = self._words
+
+        deep = words[index]
+        if (not deep or deep >> 32 == check or
+                entry[0] >= (deep >> 16 & MAX_DEPTH)):
+            replaced = words[index + 1]
+            if deep and deep >> 32 != check:
+                #move the old depth-preferred entry down to the other slot
+                if replaced and replaced >> 32 != check:
+                    self.overwrites += 1
+                words[index + 1] = deep
+            elif replaced >> 32 == check and replaced:
+                #drop the older copy of this position
+                words[index + 1] = 0
+            words[index] = new_word
+        else:
+            replaced = words[index + 1]
+            if replaced and replaced >> 32 != check:
+                self.overwrites += 1
+            words[index + 1] = new_word
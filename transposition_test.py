@@ -0,0 +1,100 @@
+import unittest
+import ai
+import game_logic as gl
+import transposition as tt
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def setUp(self):
+        #a tiny table, so it's easy to fill buckets
+        self.table = tt.TranspositionTable(0.001)
+
+    def key(self, bucket, check):
+        """Returns a key that goes in the given bucket."""
+        return (check << 32) + (bucket - (check << 32)) % self.table.buckets
+
+    def test_pack(self):
+        """It should pack entries into 32 bits and back."""
+        entries = [
+            (0, 0, ai.EXACT, None),
+            (5, -12, ai.LOWER_BOUND, 4),
+            (108, 3000, ai.UPPER_BOUND, 12),
+            (3, -1, ai.EXACT, (6, 9)),
+        ]
+        for entry in entries:
+            data = tt.pack(entry)
+            self.assertLess(data, 1 << 32)
+            self.assertNotEqual(0, data)
+            self.assertEqual(entry, tt.unpack(data))
+
+    def test_pack_widest_board(self):
+        """It should pack every column of the widest board allowed, for
+        each player, without mixing them up.
+        """
+        width = gl.Variant.MAX_WIDTH
+        gl.Variant(width, 4, 6)
+        self.assertRaises(ValueError, gl.Variant, width + 1, 4, 2)
+        for col in range(1, width + 1):
+            for move in [col] + [(player, col) for player in range(1, 7)]:
+                for value in [-gl.Variant.MAX_SCORE, gl.Variant.MAX_SCORE]:
+                    entry = (9, value, ai.EXACT, move)
+                    self.assertEqual(entry, tt.unpack(tt.pack(entry)))
+
+    def test_get_and_set(self):
+        """It should store and return entries like a dict."""
+        key = 0x123456789abcdef0
+        self.assertIsNone(self.table.get(key))
+        self.table[key] = (7, -12, ai.LOWER_BOUND, 4)
+        self.assertEqual((7, -12, ai.LOWER_BOUND, 4), self.table.get(key))
+        self.table[key] = (3, 5, ai.EXACT, (3, 9))
+        self.assertEqual((3, 5, ai.EXACT, (3, 9)), self.table.get(key))
+        self.assertEqual(1, len(self.table))
+        self.assertEqual(2, self.table.hits)
+        self.assertEqual(1, self.table.misses)
+
+    def test_replacement(self):
+        """It should keep the deepest entry in each bucket, and the latest of
+        the others.
+        """
+        deep = self.key(5, 1)
+        shallow = self.key(5, 2)
+        latest = self.key(5, 3)
+
+        self.table[shallow] = (2, 1, ai.EXACT, 1)
+        self.table[deep] = (6, 2, ai.EXACT, 2)
+        #the deeper search takes the depth-preferred slot, moving the
+        #shallow one to the always-replace slot
+        self.assertEqual((2, 1, ai.EXACT, 1), self.table.get(shallow))
+        self.assertEqual((6, 2, ai.EXACT, 2), self.table.get(deep))
+        self.assertEqual(0, self.table.overwrites)
+
+        self.table[latest] = (3, 3, ai.EXACT, 3)
+        self.assertIsNone(self.table.get(shallow))
+        self.assertEqual((6, 2, ai.EXACT, 2), self.table.get(deep))
+        self.assertEqual((3, 3, ai.EXACT, 3), self.table.get(latest))
+        self.assertEqual(1, self.table.overwrites)
+        self.assertEqual(1, self.table.collisions)
+
+        #a shallower search of the deep position still replaces it
+        self.table[deep] = (1, 4, ai.EXACT, 4)
+        self.assertEqual((1, 4, ai.EXACT, 4), self.table.get(deep))
+        self.assertEqual(2, len(self.table))
+
+    def test_fixed_size(self):
+        """It should never use more memory than it was given."""
+        size = len(self.table._words)
+        self.assertLessEqual(size * self.table.WORD_BYTES, 0.001 * 1024 * 1024)
+        for key in range(10000):
+            self.table[key * 0x9e3779b97f4a7c15 % (1 << 64)] = (
+                key % 20, key, ai.EXACT, None)
+        self.assertEqual(size, len(self.table._words))
+        self.assertEqual(size, len(self.table))
+        self.assertGreater(self.table.overwrites, 0)
+
+        self.table.clear()
+        self.assertEqual(0, len(self.table))
+        self.assertEqual(0, self.table.overwrites)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
 import game_logic as gl
+import ai
+
+#how long the computer gets to think about each move, in seconds
+AI_TIME_LIMIT = 2.0
 
 def run():
     """
@@ -20,11 +24,16 @@ def run():
 
         try:
             prompt = "\nPlayer #" + str(game.current_player) + \
-                " - please enter the column number to play in (u to undo): "
+                " - please enter the column number to play in" + \
+                " (u to undo, r to redo, c to let the computer play): "
             input_move = input(prompt)
 
             if input_move.lower() == "u":
                 game.undo()
+            elif input_move.lower() == "r":
+                game.redo()
+            elif input_move.lower() == "c":
+                game.play(ai.choose_move(game, AI_TIME_LIMIT))
             else:
                 col = int(input_move)
                 if 1 <= col <= game.width:
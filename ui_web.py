@@ -1,4 +1,7 @@
+import json
 import game_logic as gl
+import ai
+import search_api
 from bottle import route, run, static_file
 
 #this is kinda bad using a global like this, BUT...
@@ -9,6 +12,14 @@ from bottle import route, run, static_file
 # so this is sufficient for the current purpose
 game = None
 
+#how long the computer gets to think about each move, in seconds. Keep this
+#well under the time the browser will wait for a response
+AI_TIME_LIMIT = 2.0
+
+#stats from the computer's last search (see search_api.SearchResult), for
+#/ai_stats
+last_search = None
+
 @route('/')
 def index():
     return static_file("game.html", root="./web")
@@ -50,4 +61,26 @@ def play(col_num):
     except:
         return '{"error": "Unknown error occured. Sorry about that."}'
 
+@route('/ai_play')
+def ai_play():
+    global game, last_search
+    try:
+        #the deadline starts now, so the whole request stays within the limit
+        request = search_api.SearchRequest(game, AI_TIME_LIMIT)
+        last_search = ai.search(request)
+        game.play(last_search.col)
+        return game.to_json()
+    except gl.GameOverError:
+        return '{"error": "Game is already over"}'
+    except ValueError:
+        return '{"error": "The computer can\'t play this game"}'
+    except:
+        return '{"error": "Unknown error occured. Sorry about that."}'
+
+@route('/ai_stats')
+def ai_stats():
+    if last_search is None:
+        return '{"error": "The computer hasn\'t played yet"}'
+    return json.dumps(last_search.to_dict())
+
 print("PLEASE OPEN YOUR BROWSER TO THE PROVIDED URL TO PLAY!!!")
@@ -84,3 +84,8 @@ function play(colnum){
   url = "/play/" + colnum;
   $.get(url, drawGame);
 }
+
+function computerPlay(){
+  url = "/ai_play";
+  $.get(url, drawGame);
+}